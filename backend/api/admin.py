@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+import os
+import re
+
+from models.admin import ProfilerSettings
+from services.profiler import profiler
+
+# Operations endpoints are off unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+MIN_PROFILER_INTERVAL_MS = 1.0
+
+router = APIRouter(prefix="/admin", tags=["Admin"], include_in_schema=False)
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the configured X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+@router.get("/profiler", dependencies=[Depends(require_admin)])
+async def get_profiler():
+    """Profiler settings and counters of the worker serving this request."""
+    return profiler.stats()
+
+@router.put("/profiler", dependencies=[Depends(require_admin)])
+async def configure_profiler(settings: ProfilerSettings):
+    """Change profiler settings at runtime; omitted fields keep their value."""
+    if settings.sample_rate is not None and not 0 <= settings.sample_rate <= 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sample_rate must be between 0 and 1")
+    if settings.interval_ms is not None and settings.interval_ms < MIN_PROFILER_INTERVAL_MS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"interval_ms must be at least {MIN_PROFILER_INTERVAL_MS}"
+        )
+    if settings.route_pattern:
+        try:
+            re.compile(settings.route_pattern)
+        except re.error as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid route_pattern: {exc}")
+    
+    profiler.configure(
+        enabled=settings.enabled,
+        sample_rate=settings.sample_rate,
+        route_pattern=settings.route_pattern,
+        interval_ms=settings.interval_ms
+    )
+    return profiler.stats()
+
+@router.get("/profiler/stacks", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def get_profiler_stacks(route: Optional[str] = None):
+    """Collapsed stacks for flamegraph.pl / speedscope, optionally only routes containing `route`."""
+    return PlainTextResponse(profiler.collapsed(route))
+
+@router.delete("/profiler/stacks", dependencies=[Depends(require_admin)])
+async def reset_profiler_stacks():
+    """Drop the samples collected so far."""
+    profiler.reset()
+    return profiler.stats()
@@ -3,11 +3,17 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import uuid
 import os
 
+from database import get_db
 from models.user import User, UserCreate, UserLogin, AuthResponse, UserResponse
+from services.password_hashing import PasswordHashingBusy, PasswordHashingPool
+from services.token_cache import TokenCache
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -16,11 +22,21 @@ SECRET_KEY = os.getenv("SECRET_KEY", "mubitt-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs here instead of on the event loop
+password_pool = PasswordHashingPool(workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE)
+
+# Verified access tokens; drivers re-send the same token with every location ping
+token_cache = TokenCache(max_size=TOKEN_CACHE_SIZE)
+
 def hash_password(password: str) -> str:
     """Hash a password for storing."""
     return pwd_context.hash(password)
@@ -29,6 +45,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a stored password against provided password."""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def _run_password_work(fn, *args):
+    try:
+        return await password_pool.run(fn, *args)
+    except PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress. Please try again.",
+            headers={"Retry-After": "1"},
+        )
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password without blocking the event loop."""
+    return await _run_password_work(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop."""
+    return await _run_password_work(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token."""
     to_encode = data.copy()
@@ -49,8 +83,12 @@ def create_refresh_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token."""
+def authenticate_token(token: str) -> dict:
+    """Principal ({"id", "email"}) for a valid access token; raises 401 otherwise."""
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -58,39 +96,72 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    # In a real app, fetch user from database
-    # For now, return mock user
-    return {"id": user_id, "email": payload.get("email")}
+    # Token claims are enough to identify the caller; handlers load the
+    # user row only when they need it
+    principal = {"id": user_id, "email": payload.get("email")}
+    if "exp" in payload:
+        token_cache.put(token, principal, float(payload["exp"]))
+    return principal
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get current user from JWT token."""
+    return authenticate_token(credentials.credentials)
+
+async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Current user when a bearer token is sent, None for anonymous requests."""
+    if credentials is None:
+        return None
+    return authenticate_token(credentials.credentials)
 
 @router.post("/register", response_model=AuthResponse)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
-    # In a real app, check if user exists and save to database
     
-    # Simulate user creation
+    existing = await db.scalar(
+        select(User.id).where(
+            or_(User.email == user_data.email, User.phone_number == user_data.phone_number)
+        )
+    )
+    if existing is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or phone number already registered"
+        )
+    
     user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     
-    # Create mock user response
-    user = UserResponse(
+    now = datetime.utcnow()
+    user = User(
         id=user_id,
         name=user_data.name,
         email=user_data.email,
         phone_number=user_data.phone_number,
-        profile_picture_url=None,
+        password_hash=hashed_password,
+        device_token=user_data.device_token,
         rating=5.0,
         trip_count=0,
         is_verified=False,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
+        created_at=now,
+        updated_at=now
     )
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent registration for the same email/phone
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or phone number already registered"
+        )
     
     # Create tokens
     access_token = create_access_token(
@@ -101,52 +172,44 @@ async def register(user_data: UserCreate):
     )
     
     return AuthResponse(
-        user=user,
+        user=UserResponse.model_validate(user),
         access_token=access_token,
         refresh_token=refresh_token,
         expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
     )
 
 @router.post("/login", response_model=AuthResponse)
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login user."""
-    # In a real app, validate credentials against database
     
-    # Mock validation
     if not login_data.email and not login_data.phone_number:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email or phone number is required"
         )
     
-    # Simulate user lookup and password verification
-    user_id = str(uuid.uuid4())
-    email = login_data.email or "mock@example.com"
+    if login_data.email:
+        query = select(User).where(User.email == login_data.email)
+    else:
+        query = select(User).where(User.phone_number == login_data.phone_number)
+    user = await db.scalar(query)
     
-    # Create mock user response
-    user = UserResponse(
-        id=user_id,
-        name="Usuario San Juan",
-        email=email,
-        phone_number=login_data.phone_number or "+54 264 123-4567",
-        profile_picture_url=None,
-        rating=4.8,
-        trip_count=15,
-        is_verified=True,
-        created_at=datetime.utcnow() - timedelta(days=30),
-        updated_at=datetime.utcnow()
-    )
+    if user is None or not await verify_password_async(login_data.password, user.password_hash):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials"
+        )
     
     # Create tokens
     access_token = create_access_token(
-        data={"sub": user_id, "email": email}
+        data={"sub": user.id, "email": user.email}
     )
     refresh_token = create_refresh_token(
-        data={"sub": user_id, "email": email}
+        data={"sub": user.id, "email": user.email}
     )
     
     return AuthResponse(
-        user=user,
+        user=UserResponse.model_validate(user),
         access_token=access_token,
         refresh_token=refresh_token,
         expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
@@ -196,18 +259,15 @@ async def verify_phone(phone_number: str, verification_code: str):
         )
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user = Depends(get_current_user)):
+async def get_current_user_profile(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Get current user profile."""
-    # In a real app, fetch from database
-    return UserResponse(
-        id=current_user["id"],
-        name="Usuario San Juan",
-        email=current_user["email"],
-        phone_number="+54 264 123-4567",
-        profile_picture_url=None,
-        rating=4.8,
-        trip_count=15,
-        is_verified=True,
-        created_at=datetime.utcnow() - timedelta(days=30),
-        updated_at=datetime.utcnow()
-    )
\ No newline at end of file
+    user = await db.get(User, current_user["id"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return UserResponse.model_validate(user)
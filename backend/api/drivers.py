@@ -1,26 +1,79 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+import math
+import os
+import time
 import uuid
 from datetime import datetime, timedelta
-import random
 
-from models.driver import DriverCreate, DriverResponse, DriverLocationUpdate
+from database import get_db
+from models.driver import Driver, DriverCreate, DriverResponse, DriverLocationUpdate
+from models.trip import Trip, TripStatus, VehicleType
+from models.user import User
 from api.auth import get_current_user
+from services import earnings
+from services.fleet_index import DRIVER_EN_ROUTE, DRIVER_IDLE, DRIVER_IN_TRIP, DRIVER_OFFLINE, fleet_index
+from services.geo import haversine_distance
+from services.location_ingest import location_ingest
+from services.ping_cadence import ping_cadence
+from services.trip_events import trip_events
+from services.trip_state import ACTIVE_STATUSES, DriverUnavailable, TransitionConflict, TripNotFound, transition_trip
+from services.ttl_cache import TTLCache
+from services.zones import resolve_zone
 
 router = APIRouter(prefix="/drivers", tags=["Drivers"])
 
+# Average urban speed in San Juan (km/h), used for ETAs
+AVERAGE_SPEED_KMH = 30
+
+MAX_EARNINGS_DAYS = 90
+
+# Location pings are the hottest write path, so drivers found online are
+# remembered for a while instead of being looked up on every ping. Going
+# offline needs no invalidation: the fleet index ignores their pings anyway.
+ACTIVE_DRIVER_CACHE_SECONDS = float(os.getenv("ACTIVE_DRIVER_CACHE_SECONDS", 60))
+active_drivers = TTLCache(max_size=int(os.getenv("ACTIVE_DRIVER_CACHE_SIZE", 20000)))
+
+async def get_driver_for_user(db: AsyncSession, user_id: str) -> Driver:
+    """Driver profile of the authenticated user, or 404."""
+    driver = await db.scalar(select(Driver).where(Driver.user_id == user_id))
+    if driver is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Driver profile not found"
+        )
+    return driver
+
+async def is_active_driver(db: AsyncSession, user_id: str) -> bool:
+    """Whether the user's driver profile is online; 404 for users who aren't drivers."""
+    if active_drivers.get(user_id):
+        return True
+    driver = await get_driver_for_user(db, user_id)
+    if driver.is_active:
+        active_drivers.put(user_id, True, time.time() + ACTIVE_DRIVER_CACHE_SECONDS)
+    return bool(driver.is_active)
+
 @router.post("/register", response_model=DriverResponse)
 async def register_driver(
     driver_data: DriverCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Register as a driver."""
     
-    driver_id = str(uuid.uuid4())
+    try:
+        vehicle_type = VehicleType(driver_data.vehicle_type.lower())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle type"
+        )
     
-    # Mock driver registration
-    driver = DriverResponse(
-        id=driver_id,
+    driver = Driver(
+        id=str(uuid.uuid4()),
         user_id=current_user["id"],
         license_number=driver_data.license_number,
         vehicle_make=driver_data.vehicle_make,
@@ -28,6 +81,7 @@ async def register_driver(
         vehicle_color=driver_data.vehicle_color,
         vehicle_year=driver_data.vehicle_year,
         license_plate=driver_data.license_plate,
+        vehicle_type=vehicle_type,
         rating=5.0,
         trip_count=0,
         is_active=False,  # Needs verification first
@@ -36,40 +90,35 @@ async def register_driver(
         current_longitude=None,
         created_at=datetime.utcnow()
     )
+    db.add(driver)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Driver already registered, or license number/plate already in use"
+        )
     
-    return driver
+    return DriverResponse.model_validate(driver)
 
 @router.get("/profile", response_model=DriverResponse)
-async def get_driver_profile(current_user = Depends(get_current_user)):
+async def get_driver_profile(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Get driver profile."""
     
-    # Mock driver profile
-    driver = DriverResponse(
-        id=str(uuid.uuid4()),
-        user_id=current_user["id"],
-        license_number="SJ123456",
-        vehicle_make="Toyota",
-        vehicle_model="Corolla",
-        vehicle_color="Blanco",
-        vehicle_year=2020,
-        license_plate="SJU 123",
-        rating=4.8,
-        trip_count=145,
-        is_active=True,
-        is_verified=True,
-        current_latitude=-31.5375,
-        current_longitude=-68.5364,
-        created_at=datetime.utcnow() - timedelta(days=180)
-    )
-    
-    return driver
+    driver = await get_driver_for_user(db, current_user["id"])
+    return DriverResponse.model_validate(driver)
 
 @router.put("/location")
 async def update_location(
     location_data: DriverLocationUpdate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Update driver's current location."""
+    """Update driver's current location; the response says when to report next."""
     
     # Validate San Juan coordinates (rough bounds)
     if not (-32.0 <= location_data.latitude <= -31.0):
@@ -84,83 +133,206 @@ async def update_location(
             detail="Location outside San Juan area"
         )
     
+    zone_id = resolve_zone(location_data.latitude, location_data.longitude)
+    position = None
+    if await is_active_driver(db, current_user["id"]):
+        driver_state = fleet_index.state(current_user["id"])
+        position = fleet_index.update(
+            current_user["id"],
+            location_data.latitude,
+            location_data.longitude,
+            zone_id=zone_id
+        )
+    else:
+        # Registered but never went online: not searchable yet
+        driver_state = DRIVER_OFFLINE
+    if position is not None:
+        trip_events.publish_driver_position(current_user["id"], location_data.latitude, location_data.longitude)
+        # Persisted in bulk by the write-behind flusher
+        location_ingest.submit(current_user["id"], location_data.latitude, location_data.longitude)
+        message = "Location updated successfully"
+    elif driver_state == DRIVER_OFFLINE:
+        message = "Location ignored: driver is offline"
+    else:
+        message = "Location ignored: fleet table is full"
+
+    # Report less often when idle in quiet zones or when ingest is backed up
+    cadence = ping_cadence.advise(driver_state, zone_id)
+
     return {
-        "message": "Location updated successfully",
+        "message": message,
+        "accepted": position is not None,
         "latitude": location_data.latitude,
         "longitude": location_data.longitude,
-        "updated_at": datetime.utcnow()
+        "updated_at": datetime.utcnow(),
+        "driver_state": driver_state,
+        "next_report_in_seconds": cadence.next_report_in_seconds,
+        "min_displacement_meters": cadence.min_displacement_meters
     }
 
 @router.put("/status")
 async def toggle_driver_status(
     is_active: bool,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Toggle driver online/offline status."""
     
+    driver = await get_driver_for_user(db, current_user["id"])
+    now = datetime.utcnow()
+    
+    # Online sessions feed hours_online in the earnings rollups
+    if is_active:
+        await earnings.go_online(db, driver.id, now)
+    else:
+        await earnings.go_offline(db, driver.id, now)
+    driver.is_active = is_active
+    await db.commit()
+    
     status_text = "online" if is_active else "offline"
     
+    # Offline drivers must stop showing up in search-drivers right away
+    if not is_active:
+        fleet_index.remove(current_user["id"])
+    elif fleet_index.state(current_user["id"]) == DRIVER_OFFLINE:
+        fleet_index.set_state(current_user["id"], DRIVER_IDLE)
+    
     return {
         "message": f"Driver status changed to {status_text}",
         "is_active": is_active,
-        "updated_at": datetime.utcnow()
+        "updated_at": now
     }
 
 @router.get("/earnings")
 async def get_driver_earnings(
     current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
     days: int = 7
 ):
     """Get driver earnings summary."""
     
-    # Mock earnings data
-    daily_earnings = []
-    total_earnings = 0
+    if not 1 <= days <= MAX_EARNINGS_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days must be between 1 and {MAX_EARNINGS_DAYS}"
+        )
+    
+    driver = await get_driver_for_user(db, current_user["id"])
+    now = datetime.utcnow()
+    last_day = earnings.local_day(now)
+    first_day = last_day - timedelta(days=days - 1)
     
+    # At most `days` rollup rows; no trip scan
+    rollups = await earnings.read_range(db, driver.id, first_day, last_day)
+    
+    # The open session hasn't been credited yet
+    live_seconds = {}
+    if driver.online_since is not None:
+        live_seconds = dict(earnings.split_by_day(driver.online_since, now))
+    
+    daily_earnings = []
     for i in range(days):
-        daily_amount = random.uniform(800, 2500) if random.random() > 0.2 else 0
-        total_earnings += daily_amount
-        
+        day = first_day + timedelta(days=i)
+        rollup = rollups.get(day)
+        online_seconds = (rollup.online_seconds if rollup else 0) + live_seconds.get(day, 0)
         daily_earnings.append({
-            "date": (datetime.utcnow() - timedelta(days=i)).strftime("%Y-%m-%d"),
-            "trips": random.randint(0, 12) if daily_amount > 0 else 0,
-            "earnings": round(daily_amount, 2),
-            "hours_online": random.uniform(2, 10) if daily_amount > 0 else 0
+            "date": day.strftime("%Y-%m-%d"),
+            "trips": rollup.trips if rollup else 0,
+            "earnings": round(rollup.gross_fare, 2) if rollup else 0.0,
+            "hours_online": round(online_seconds / 3600, 2)
         })
     
+    total_earnings = sum(day["earnings"] for day in daily_earnings)
+    
     return {
         "period_days": days,
         "total_earnings": round(total_earnings, 2),
         "average_per_day": round(total_earnings / days, 2),
         "total_trips": sum(day["trips"] for day in daily_earnings),
-        "daily_breakdown": daily_earnings[::-1]  # Reverse to show oldest first
+        "daily_breakdown": daily_earnings  # Oldest first
     }
 
+async def _transition(db: AsyncSession, trip_id: str, target: TripStatus, **kwargs):
+    """Run a trip transition, mapping losers to 404/409."""
+    try:
+        await transition_trip(db, trip_id, target, **kwargs)
+    except TripNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trip not found"
+        )
+    except (TransitionConflict, DriverUnavailable) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc)
+        )
+
+async def _assigned_trip(db: AsyncSession, trip_id: str, driver: Driver) -> Trip:
+    """Trip assigned to this driver, or 404."""
+    trip = await db.get(Trip, trip_id)
+    if trip is None or trip.driver_id != driver.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trip not found"
+        )
+    return trip
+
 @router.get("/trips/active")
-async def get_active_trip(current_user = Depends(get_current_user)):
+async def get_active_trip(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Get driver's currently active trip."""
     
-    # Mock active trip
-    if random.random() > 0.7:  # 30% chance of having active trip
-        return {
-            "trip_id": str(uuid.uuid4()),
-            "passenger_name": "María González",
-            "pickup_address": "Hospital Rawson, San Juan",
-            "dropoff_address": "UNSJ, San Juan",
-            "status": "driver_arriving",
-            "estimated_fare": 850.50,
-            "distance_to_pickup": 1.2,
-            "eta_to_pickup": 4
-        }
-    else:
+    driver = await get_driver_for_user(db, current_user["id"])
+    row = (await db.execute(
+        select(Trip, User.name)
+        .join(User, User.id == Trip.passenger_id)
+        .where(Trip.driver_id == driver.id, Trip.status.in_(ACTIVE_STATUSES))
+        .order_by(Trip.created_at.desc())
+        .limit(1)
+    )).first()
+    if row is None:
         return None
+    
+    trip, passenger_name = row
+    active = {
+        "trip_id": trip.id,
+        "passenger_name": passenger_name,
+        "pickup_address": trip.pickup_location.address,
+        "dropoff_address": trip.dropoff_location.address,
+        "status": trip.status.value,
+        "estimated_fare": trip.estimated_fare,
+        "distance_to_pickup": None,
+        "eta_to_pickup": None
+    }
+    
+    position = fleet_index.get(current_user["id"])
+    if position is not None and trip.status != TripStatus.IN_PROGRESS:
+        distance_km = haversine_distance(
+            position.latitude, position.longitude,
+            trip.pickup_location.latitude, trip.pickup_location.longitude
+        )
+        active["distance_to_pickup"] = round(distance_km, 2)
+        active["eta_to_pickup"] = max(1, math.ceil(distance_km / AVERAGE_SPEED_KMH * 60))
+    
+    return active
 
 @router.put("/trips/{trip_id}/accept")
 async def accept_trip(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Accept a trip request."""
+    """Accept a trip request. Exactly one driver wins; the rest get 409, as do drivers offline or on another trip."""
+    
+    driver = await get_driver_for_user(db, current_user["id"])
+    await _transition(db, trip_id, TripStatus.DRIVER_ASSIGNED, driver_id=driver.id, assign_driver=True)
+    await db.commit()
+    
+    fleet_index.set_state(current_user["id"], DRIVER_EN_ROUTE)
+    trip_events.assign_driver(trip_id, current_user["id"])
+    trip_events.publish_status(trip_id, TripStatus.DRIVER_ASSIGNED.value, driver_id=driver.id)
     
     return {
         "message": "Trip accepted successfully",
@@ -171,10 +343,18 @@ async def accept_trip(
 @router.put("/trips/{trip_id}/arrive")
 async def arrive_at_pickup(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark arrival at pickup location."""
     
+    driver = await get_driver_for_user(db, current_user["id"])
+    await _assigned_trip(db, trip_id, driver)
+    await _transition(db, trip_id, TripStatus.DRIVER_ARRIVING, driver_id=driver.id)
+    await db.commit()
+    
+    trip_events.publish_status(trip_id, TripStatus.DRIVER_ARRIVING.value)
+    
     return {
         "message": "Arrived at pickup location",
         "trip_id": trip_id,
@@ -184,27 +364,67 @@ async def arrive_at_pickup(
 @router.put("/trips/{trip_id}/start")
 async def start_trip(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Start the trip."""
     
+    driver = await get_driver_for_user(db, current_user["id"])
+    await _assigned_trip(db, trip_id, driver)
+    started_at = datetime.utcnow()
+    await _transition(db, trip_id, TripStatus.IN_PROGRESS, driver_id=driver.id, started_at=started_at)
+    await db.commit()
+    
+    fleet_index.set_state(current_user["id"], DRIVER_IN_TRIP)
+    trip_events.publish_status(trip_id, TripStatus.IN_PROGRESS.value)
+    
     return {
         "message": "Trip started successfully",
         "trip_id": trip_id,
-        "started_at": datetime.utcnow()
+        "started_at": started_at
     }
 
 @router.put("/trips/{trip_id}/complete")
 async def complete_trip(
     trip_id: str,
     final_fare: float,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Complete the trip."""
     
+    if final_fare < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Final fare cannot be negative"
+        )
+    
+    driver = await get_driver_for_user(db, current_user["id"])
+    trip = await _assigned_trip(db, trip_id, driver)
+    completed_at = datetime.utcnow()
+    actual_duration = None
+    if trip.started_at is not None:
+        actual_duration = max(1, round((completed_at - trip.started_at).total_seconds() / 60))
+    
+    # Status change, driver stats and earnings rollup commit together
+    await _transition(
+        db, trip_id, TripStatus.COMPLETED,
+        driver_id=driver.id,
+        completed_at=completed_at,
+        actual_fare=final_fare,
+        actual_duration=actual_duration
+    )
+    driver.trip_count = Driver.trip_count + 1
+    await earnings.record_trip(db, driver.id, completed_at, final_fare)
+    await db.commit()
+    
+    fleet_index.set_state(current_user["id"], DRIVER_IDLE)
+    trip_events.publish_status(trip_id, TripStatus.COMPLETED.value, final_fare=final_fare)
+    trip_events.release_trip(trip_id)
+    
     return {
         "message": "Trip completed successfully",
         "trip_id": trip_id,
         "final_fare": final_fare,
-        "completed_at": datetime.utcnow()
-    }
\ No newline at end of file
+        "completed_at": completed_at
+    }
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from typing import List, Optional
+
+from models.place import PlaceSuggestion
+from api.auth import get_current_user
+from services.places import place_index
+
+router = APIRouter(prefix="/places", tags=["Places"])
+
+MAX_SUGGESTIONS = 20
+
+@router.get("/autocomplete", response_model=List[PlaceSuggestion])
+async def autocomplete_places(
+    q: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    limit: int = 8,
+    current_user = Depends(get_current_user)
+):
+    """Type-ahead search over San Juan landmarks and past trip addresses."""
+    
+    results = place_index.search(
+        q,
+        latitude=latitude,
+        longitude=longitude,
+        limit=max(1, min(limit, MAX_SUGGESTIONS)),
+        user_id=current_user["id"]
+    )
+    
+    return [
+        PlaceSuggestion(
+            name=place.name,
+            address=place.address,
+            reference=place.reference_for(current_user["id"]),
+            latitude=place.latitude,
+            longitude=place.longitude,
+            category=place.category,
+            source=place.source,
+            distance_km=round(distance, 2) if distance is not None else None
+        )
+        for place, distance in results
+    ]
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+import asyncio
+from typing import Optional
+
+from database import SessionLocal
+from api.auth import authenticate_token
+from api.trips import get_trip_for_user
+from services.trip_events import trip_events
+
+router = APIRouter(prefix="/ws", tags=["Realtime"])
+
+def _bearer_token(websocket: WebSocket, token: Optional[str]) -> Optional[str]:
+    """Token from the `token` query param or an `Authorization: Bearer` header."""
+    if token:
+        return token
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return None
+
+async def _send_events(websocket: WebSocket, subscription):
+    while True:
+        event = await subscription.queue.get()
+        await websocket.send_json(event)
+
+async def _drain_client(websocket: WebSocket):
+    # Clients only send keep-alives; reading is how a disconnect is noticed
+    while True:
+        await websocket.receive_text()
+
+@router.websocket("/trips/{trip_id}")
+async def trip_updates(websocket: WebSocket, trip_id: str, token: Optional[str] = None):
+    """Push trip status transitions and the assigned driver's position."""
+
+    bearer = _bearer_token(websocket, token)
+    if bearer is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Subscribe before reading the trip, so no transition published in
+    # between is lost; one in flight may arrive again after the snapshot
+    subscription = trip_events.subscribe(trip_id)
+    sender = receiver = None
+    try:
+        try:
+            current_user = authenticate_token(bearer)
+            # Short-lived session: the connection must not pin a pooled DB connection
+            async with SessionLocal() as db:
+                trip = await get_trip_for_user(db, trip_id, current_user["id"])
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+        await websocket.accept()
+        # Current state first, so the app never waits for the next transition
+        await websocket.send_json({
+            "type": "trip_status",
+            "trip_id": trip_id,
+            "status": trip.status.value,
+            "driver_id": trip.driver_id
+        })
+        sender = asyncio.create_task(_send_events(websocket, subscription))
+        receiver = asyncio.create_task(_drain_client(websocket))
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        trip_events.unsubscribe(subscription)
+        tasks = [task for task in (sender, receiver) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
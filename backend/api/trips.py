@@ -1,17 +1,72 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi.responses import ORJSONResponse
+from jose import JWTError, jwt
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import List, Optional, Tuple
+import base64
+import binascii
+import hashlib
+import json
+import math
+import os
 import uuid
 from datetime import datetime, timedelta
-import random
 
+import numpy as np
+
+from database import get_db
+from models.driver import Driver
 from models.trip import (
-    TripCreate, TripSearch, TripResponse, LocationModel, 
-    DriverMatch, FareEstimate, VehicleInfo
+    Location, Trip, TripStatus, VehicleType,
+    TripCreate, TripSearch, TripResponse, TripPage, LocationModel, 
+    DriverMatch, FareEstimate, VehicleInfo, FareBatchRequest, FareTable
 )
-from api.auth import get_current_user
+from models.user import User
+from api.auth import ALGORITHM, SECRET_KEY, get_current_user, get_optional_user
+from services.fleet_index import DRIVER_IDLE, fleet_index
+from services.matching import CandidateBatch, candidate_record, rank_candidates, score_candidates
+from services.places import place_index
+from services.route_cache import route_cache
+from services.routing import route_provider
+from services.surge import surge_engine
+from services.trip_events import trip_events
+from services.trip_state import TransitionConflict, transition_trip
+from services.zones import resolve_zone, resolve_zones
 
 router = APIRouter(prefix="/trips", tags=["Trips"])
 
+# Average urban speed in San Juan (km/h), used for ETAs and duration estimates
+AVERAGE_SPEED_KMH = 30
+
+# Straight-line distance estimate
+ROUGH_KM_PER_DEGREE = 111
+MIN_DISTANCE_KM = 1.0
+MIN_DURATION_MINUTES = 5
+
+# Fares (ARS)
+BASE_FARES = {
+    "economy": 400.0,
+    "comfort": 500.0,
+    "xl": 650.0
+}
+DEFAULT_BASE_FARE = 400.0
+PER_KM_RATE = 120.0
+PER_MINUTE_RATE = 18.0
+
+# Surge from an estimate is honoured at booking for this long
+FARE_QUOTE_TTL_SECONDS = int(os.getenv("FARE_QUOTE_TTL_SECONDS", 120))
+# Separate key, so a fare quote can never pass as an access token
+FARE_QUOTE_KEY = hashlib.sha256(b"mubitt-fare-quote:" + SECRET_KEY.encode()).hexdigest()
+
+MAX_FARE_BATCH_ROUTES = 50
+MAX_TRIP_PAGE_SIZE = 50
+
+# Driver search limits
+MAX_SEARCH_RADIUS_KM = 15.0
+MAX_DRIVER_MATCHES = 10
+
 # Mock data for San Juan references
 SAN_JUAN_LOCATIONS = [
     {
@@ -40,28 +95,17 @@ SAN_JUAN_LOCATIONS = [
     }
 ]
 
-def calculate_fare_san_juan(distance_km: float, duration_minutes: int, vehicle_type: str) -> FareEstimate:
+def calculate_fare_san_juan(
+    distance_km: float,
+    duration_minutes: int,
+    vehicle_type: str,
+    surge_factor: float = 1.0
+) -> FareEstimate:
     """Calculate fare using San Juan specific algorithm."""
     
-    # Base fares by vehicle type (ARS)
-    base_fares = {
-        "economy": 400.0,
-        "comfort": 500.0,
-        "xl": 650.0
-    }
-    
-    # Per km rate (ARS)
-    per_km_rate = 120.0
-    
-    # Per minute rate (ARS)
-    per_minute_rate = 18.0
-    
-    # Surge factor (max 1.5x vs 3x of Uber)
-    surge_factor = random.uniform(1.0, 1.5)
-    
-    base_fare = base_fares.get(vehicle_type.lower(), 400.0)
-    distance_fare = distance_km * per_km_rate
-    time_fare = duration_minutes * per_minute_rate
+    base_fare = BASE_FARES.get(vehicle_type.lower(), DEFAULT_BASE_FARE)
+    distance_fare = distance_km * PER_KM_RATE
+    time_fare = duration_minutes * PER_MINUTE_RATE
     
     subtotal = base_fare + distance_fare + time_fare
     total_fare = subtotal * surge_factor
@@ -74,242 +118,542 @@ def calculate_fare_san_juan(distance_km: float, duration_minutes: int, vehicle_t
         total_fare=round(total_fare, 2)
     )
 
-def find_nearby_drivers(pickup_location: LocationModel, radius_km: float = 5.0) -> List[DriverMatch]:
-    """Find nearby drivers in San Juan."""
+def calculate_fares_san_juan(
+    distance_km: np.ndarray,
+    duration_minutes: np.ndarray,
+    vehicle_types: List[str],
+    surge_factors: np.ndarray
+) -> np.ndarray:
+    """Vectorized calculate_fare_san_juan: total fares as a (routes x vehicle types) matrix."""
     
-    # Mock drivers data
-    mock_drivers = [
-        {
-            "driver_id": str(uuid.uuid4()),
-            "name": "Carlos Rodríguez",
-            "rating": 4.8,
-            "vehicle_info": VehicleInfo(
-                make="Toyota",
-                model="Corolla",
-                color="Blanco",
-                license_plate="SJU 123",
-                year=2020
-            ),
-            "distance": random.uniform(0.5, 3.0),
-            "estimated_arrival": random.randint(3, 12)
-        },
-        {
-            "driver_id": str(uuid.uuid4()),
-            "name": "María González",
-            "rating": 4.9,
-            "vehicle_info": VehicleInfo(
-                make="Chevrolet",
-                model="Onix",
-                color="Gris",
-                license_plate="SJU 456",
-                year=2021
-            ),
-            "distance": random.uniform(0.3, 2.5),
-            "estimated_arrival": random.randint(2, 8)
-        },
-        {
-            "driver_id": str(uuid.uuid4()),
-            "name": "Juan Martínez",
-            "rating": 4.7,
-            "vehicle_info": VehicleInfo(
-                make="Ford",
-                model="Ka",
-                color="Azul",
-                license_plate="SJU 789",
-                year=2019
-            ),
-            "distance": random.uniform(1.0, 4.0),
-            "estimated_arrival": random.randint(5, 15)
-        }
-    ]
+    base_fares = np.array([BASE_FARES.get(v.lower(), DEFAULT_BASE_FARE) for v in vehicle_types])
+    subtotal = (distance_km * PER_KM_RATE + duration_minutes * PER_MINUTE_RATE)[:, None] + base_fares[None, :]
+    return np.round(subtotal * np.reshape(surge_factors, (-1, 1)), 2)
+
+def estimate_distances_durations(
+    pickup_lats: np.ndarray,
+    pickup_lngs: np.ndarray,
+    dropoff_lats: np.ndarray,
+    dropoff_lngs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Straight-line distance (km) and duration (minutes) for arrays of origin/destination pairs."""
+    
+    # Fallback when the road network isn't loaded or a point is off the map
+    distance_km = np.hypot(pickup_lats - dropoff_lats, pickup_lngs - dropoff_lngs) * ROUGH_KM_PER_DEGREE
+    distance_km = np.maximum(distance_km, MIN_DISTANCE_KM)
+    
+    # Estimate duration (assume 30 km/h average in San Juan)
+    duration_minutes = np.floor(distance_km / AVERAGE_SPEED_KMH * 60).astype(np.int64)
+    duration_minutes = np.maximum(duration_minutes, MIN_DURATION_MINUTES)
+    
+    return distance_km, duration_minutes
+
+async def find_nearby_drivers(
+    db: AsyncSession,
+    pickup_location: LocationModel,
+    radius_km: float = 5.0,
+    vehicle_type: str = None
+) -> List[DriverMatch]:
+    """Find and rank online drivers near the pickup point in San Juan.
+    
+    With `vehicle_type`, only drivers registered for that trip class are returned.
+    """
+    
+    nearby = fleet_index.within_radius(
+        pickup_location.latitude,
+        pickup_location.longitude,
+        min(radius_km, MAX_SEARCH_RADIUS_KM)
+    )
+    if not nearby:
+        return []
+    
+    positions = [position for position, _ in nearby]
+    
+    # One query for every candidate's profile and name
+    rows = await db.execute(
+        select(Driver, User.name)
+        .join(User, User.id == Driver.user_id)
+        .where(Driver.user_id.in_([position.driver_id for position in positions]))
+    )
+    profiles_by_user = {driver.user_id: (driver, name) for driver, name in rows}
+    # Only registered drivers can be offered; pings already require a profile
+    positions = [position for position in positions if position.driver_id in profiles_by_user]
+    if not positions:
+        return []
+    profiles = [profiles_by_user[position.driver_id] for position in positions]
+    
+    # Drivers en route to or on a trip stay in the index but can't be offered
+    batch = CandidateBatch.from_records(
+        candidate_record(position, profile, available=fleet_index.state(position.driver_id) == DRIVER_IDLE)
+        for position, (profile, _) in zip(positions, profiles)
+    )
+    scores = score_candidates(
+        batch,
+        pickup_location.latitude,
+        pickup_location.longitude,
+        vehicle_type=vehicle_type
+    )
     
     drivers = []
-    for driver_data in mock_drivers:
-        # Create mock location near pickup
-        lat_offset = random.uniform(-0.01, 0.01)
-        lng_offset = random.uniform(-0.01, 0.01)
+    for index in rank_candidates(scores, limit=MAX_DRIVER_MATCHES):
+        position = positions[index]
+        profile, name = profiles[index]
+        distance_km = float(scores.distance_km[index])
         
         drivers.append(DriverMatch(
-            driver_id=driver_data["driver_id"],
-            name=driver_data["name"],
-            rating=driver_data["rating"],
-            vehicle_info=driver_data["vehicle_info"],
+            driver_id=profile.id,
+            name=name,
+            rating=profile.rating,
+            vehicle_info=VehicleInfo(
+                make=profile.vehicle_make,
+                model=profile.vehicle_model,
+                color=profile.vehicle_color,
+                license_plate=profile.license_plate,
+                year=profile.vehicle_year
+            ),
             location=LocationModel(
-                latitude=pickup_location.latitude + lat_offset,
-                longitude=pickup_location.longitude + lng_offset,
-                address=f"Ubicación actual - {driver_data['name']}"
+                latitude=position.latitude,
+                longitude=position.longitude,
+                address="Ubicación actual del conductor"
             ),
-            estimated_arrival=driver_data["estimated_arrival"],
-            distance=driver_data["distance"]
+            estimated_arrival=max(1, math.ceil(distance_km / AVERAGE_SPEED_KMH * 60)),
+            distance=round(distance_km, 2),
+            match_score=round(float(scores.total[index]), 4)
         ))
     
     return drivers
 
+def estimate_routes(coordinates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Distance (km) and duration (minutes) for rows of (pickup lat, lng, dropoff lat, lng).
+    
+    Road-network routes (through the route cache) where available,
+    straight-line estimates otherwise.
+    """
+    
+    distance_km, duration_minutes = estimate_distances_durations(*coordinates.T)
+    if route_provider.router is None:
+        return distance_km, duration_minutes
+    
+    for row, (from_lat, from_lng, to_lat, to_lng) in enumerate(coordinates.tolist()):
+        route = route_cache.get_or_compute(from_lat, from_lng, to_lat, to_lng, route_provider.route)
+        if route is not None:
+            distance_km[row] = max(route.distance_km, MIN_DISTANCE_KM)
+            duration_minutes[row] = max(math.ceil(route.duration_seconds / 60), MIN_DURATION_MINUTES)
+    return distance_km, duration_minutes
+
+def warm_route_cache() -> int:
+    """Precompute routes between every pair of San Juan landmarks."""
+    
+    pairs = [
+        (origin["latitude"], origin["longitude"], destination["latitude"], destination["longitude"])
+        for origin in SAN_JUAN_LOCATIONS
+        for destination in SAN_JUAN_LOCATIONS
+        if origin is not destination
+    ]
+    return route_cache.warm(pairs, route_provider.route)
+
+def estimate_route(pickup_location: LocationModel, dropoff_location: LocationModel) -> Tuple[float, int]:
+    """Distance (km) and duration (minutes) of a single trip."""
+    
+    distance_km, duration_minutes = estimate_routes(np.array([[
+        pickup_location.latitude,
+        pickup_location.longitude,
+        dropoff_location.latitude,
+        dropoff_location.longitude
+    ]]))
+    return float(distance_km[0]), int(duration_minutes[0])
+
+def issue_fare_quote(
+    user_id: str,
+    zone_id: str,
+    vehicle_type: str,
+    surge_factor: float,
+    snapshot_id: int
+) -> Tuple[str, datetime]:
+    """Signed quote of a zone's surge for one passenger and vehicle type, and its expiry."""
+    
+    expires_at = datetime.utcnow() + timedelta(seconds=FARE_QUOTE_TTL_SECONDS)
+    token = jwt.encode(
+        {
+            "sub": user_id,
+            "zone": zone_id,
+            "vehicle_type": vehicle_type,
+            "surge_factor": surge_factor,
+            "snapshot_id": snapshot_id,
+            "exp": expires_at
+        },
+        FARE_QUOTE_KEY,
+        algorithm=ALGORITHM
+    )
+    return token, expires_at
+
+def read_fare_quote(
+    token: str,
+    user_id: str,
+    zone_id: str,
+    vehicle_type: str
+) -> Optional[Tuple[float, int]]:
+    """(surge factor, snapshot id) of a valid, unexpired quote issued for exactly this booking, else None."""
+    
+    try:
+        claims = jwt.decode(token, FARE_QUOTE_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if (claims.get("sub"), claims.get("zone"), claims.get("vehicle_type")) != (user_id, zone_id, vehicle_type):
+        return None
+    return float(claims["surge_factor"]), int(claims["snapshot_id"])
+
+def quote_fare(
+    pickup_location: LocationModel,
+    distance_km: float,
+    duration_minutes: int,
+    vehicle_type: str,
+    user_id: Optional[str] = None,
+    fare_quote: Optional[str] = None
+) -> FareEstimate:
+    """Price a route at the latest surge, or at the surge of the user's fare quote if it is still valid."""
+    
+    zone_id = resolve_zone(pickup_location.latitude, pickup_location.longitude)
+    vehicle_type = vehicle_type.lower()
+    quoted = None
+    if fare_quote is not None and user_id is not None:
+        quoted = read_fare_quote(fare_quote, user_id, zone_id, vehicle_type)
+    if quoted is not None:
+        surge_factor, snapshot_id = quoted
+    else:
+        snapshot = surge_engine.snapshot
+        surge_factor, snapshot_id = snapshot.surge_factor(zone_id), snapshot.id
+    
+    fare = calculate_fare_san_juan(distance_km, duration_minutes, vehicle_type, surge_factor)
+    fare.surge_snapshot_id = snapshot_id
+    return fare
+
 @router.post("/estimate-fare", response_model=FareEstimate)
 async def estimate_fare(
     pickup_location: LocationModel,
     dropoff_location: LocationModel,
-    vehicle_type: str = "economy"
+    vehicle_type: str = "economy",
+    current_user = Depends(get_optional_user)
 ):
-    """Estimate fare for a trip in San Juan."""
+    """Estimate fare for a trip in San Juan; signed-in passengers also get a fare quote for booking."""
     
-    # Calculate distance (mock calculation)
-    # In real app, use Google Maps Distance Matrix API
-    lat_diff = abs(pickup_location.latitude - dropoff_location.latitude)
-    lng_diff = abs(pickup_location.longitude - dropoff_location.longitude)
-    distance_km = ((lat_diff ** 2 + lng_diff ** 2) ** 0.5) * 111  # Rough conversion
-    distance_km = max(distance_km, 1.0)  # Minimum 1km
+    distance_km, duration_minutes = estimate_route(pickup_location, dropoff_location)
+    fare = quote_fare(pickup_location, distance_km, duration_minutes, vehicle_type)
+    if current_user is not None:
+        fare.fare_quote, fare.fare_quote_expires_at = issue_fare_quote(
+            current_user["id"],
+            resolve_zone(pickup_location.latitude, pickup_location.longitude),
+            vehicle_type.lower(),
+            fare.surge_factor,
+            fare.surge_snapshot_id
+        )
+    return fare
+
+@router.post("/estimate-fares", response_model=FareTable)
+async def estimate_fares(request: FareBatchRequest):
+    """Estimate fares for several routes and vehicle types in one call."""
     
-    # Estimate duration (assume 30 km/h average in San Juan)
-    duration_minutes = int((distance_km / 30) * 60)
-    duration_minutes = max(duration_minutes, 5)  # Minimum 5 minutes
+    if not request.routes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one route is required"
+        )
+    
+    if len(request.routes) > MAX_FARE_BATCH_ROUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_FARE_BATCH_ROUTES} routes per request"
+        )
+    
+    coordinates = np.array([
+        (
+            route.pickup_location.latitude,
+            route.pickup_location.longitude,
+            route.dropoff_location.latitude,
+            route.dropoff_location.longitude
+        )
+        for route in request.routes
+    ])
+    distance_km, duration_minutes = estimate_routes(coordinates)
+    
+    # Every row is priced against the same snapshot
+    snapshot = surge_engine.snapshot
+    zone_ids = resolve_zones(coordinates[:, 0], coordinates[:, 1])
+    surge_factors = np.array([snapshot.surge_factor(zone_id) for zone_id in zone_ids])
+    total_fares = calculate_fares_san_juan(distance_km, duration_minutes, request.vehicle_types, surge_factors)
     
-    return calculate_fare_san_juan(distance_km, duration_minutes, vehicle_type)
+    return FareTable(
+        vehicle_types=request.vehicle_types,
+        surge_snapshot_id=snapshot.id,
+        surge_factors=surge_factors.tolist(),
+        distance_km=np.round(distance_km, 2).tolist(),
+        duration_minutes=duration_minutes.tolist(),
+        total_fares=total_fares.tolist()
+    )
 
 @router.post("/search-drivers", response_model=List[DriverMatch])
-async def search_drivers(search_data: TripSearch):
+async def search_drivers(search_data: TripSearch, db: AsyncSession = Depends(get_db)):
     """Search for available drivers near pickup location."""
     
-    return find_nearby_drivers(search_data.pickup_location, search_data.radius)
+    try:
+        vehicle_type = VehicleType(search_data.vehicle_type.lower())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle type"
+        )
+    
+    return await find_nearby_drivers(
+        db,
+        search_data.pickup_location,
+        search_data.radius,
+        vehicle_type.value
+    )
+
+def _location_row(location: LocationModel) -> Location:
+    return Location(
+        id=str(uuid.uuid4()),
+        latitude=location.latitude,
+        longitude=location.longitude,
+        address=location.address,
+        reference=location.reference,
+        postal_code=location.postal_code
+    )
+
+def _location_payload(location: Location) -> dict:
+    return {
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+        "address": location.address,
+        "reference": location.reference,
+        "postal_code": location.postal_code
+    }
+
+def trip_payload(trip: Trip) -> dict:
+    """TripResponse-shaped dict straight from a trip row (locations already loaded).
+    
+    Columns are already typed by the database, so nothing is validated again.
+    """
+    return {
+        "id": trip.id,
+        "passenger_id": trip.passenger_id,
+        "driver_id": trip.driver_id,
+        "pickup_location": _location_payload(trip.pickup_location),
+        "dropoff_location": _location_payload(trip.dropoff_location),
+        "status": trip.status.value,
+        "vehicle_type": trip.vehicle_type.value,
+        "estimated_fare": trip.estimated_fare,
+        "actual_fare": trip.actual_fare,
+        "distance": trip.distance,
+        "estimated_duration": trip.estimated_duration,
+        "actual_duration": trip.actual_duration,
+        "scheduled_time": trip.scheduled_time,
+        "created_at": trip.created_at,
+        "started_at": trip.started_at,
+        "completed_at": trip.completed_at,
+        "cancelled_at": trip.cancelled_at,
+        "rating": trip.rating,
+        "feedback": trip.feedback
+    }
+
+def trip_to_response(trip: Trip) -> ORJSONResponse:
+    """Encoded trip; returning a Response skips response_model re-validation."""
+    return ORJSONResponse(trip_payload(trip))
+
+async def get_trip_for_user(db: AsyncSession, trip_id: str, user_id: str) -> Trip:
+    """Trip visible to the user (its passenger or assigned driver), or 404."""
+    trip = await db.get(Trip, trip_id)
+    if trip is not None and trip.passenger_id != user_id:
+        driver_id = await db.scalar(select(Driver.id).where(Driver.user_id == user_id))
+        if driver_id is None or trip.driver_id != driver_id:
+            trip = None
+    
+    if trip is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trip not found"
+        )
+    return trip
 
 @router.post("/create", response_model=TripResponse)
 async def create_trip(
     trip_data: TripCreate,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new trip request."""
     
-    trip_id = str(uuid.uuid4())
+    try:
+        vehicle_type = VehicleType(trip_data.vehicle_type.lower())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid vehicle type"
+        )
+    
+    surge_engine.record_request(
+        resolve_zone(trip_data.pickup_location.latitude, trip_data.pickup_location.longitude)
+    )
     
-    # Calculate fare
-    fare_estimate = await estimate_fare(
+    # Calculate fare with the surge the passenger was quoted
+    distance_km, duration_minutes = estimate_route(trip_data.pickup_location, trip_data.dropoff_location)
+    fare_estimate = quote_fare(
         trip_data.pickup_location,
-        trip_data.dropoff_location,
-        trip_data.vehicle_type
+        distance_km,
+        duration_minutes,
+        vehicle_type.value,
+        user_id=current_user["id"],
+        fare_quote=trip_data.fare_quote
     )
     
-    # Create trip response
-    trip = TripResponse(
-        id=trip_id,
+    # Locations and trip are inserted together in one unit of work
+    pickup = _location_row(trip_data.pickup_location)
+    dropoff = _location_row(trip_data.dropoff_location)
+    trip = Trip(
+        id=str(uuid.uuid4()),
         passenger_id=current_user["id"],
         driver_id=None,  # Will be assigned when driver accepts
-        pickup_location=trip_data.pickup_location,
-        dropoff_location=trip_data.dropoff_location,
-        status="pending",
-        vehicle_type=trip_data.vehicle_type,
+        pickup_location_id=pickup.id,
+        dropoff_location_id=dropoff.id,
+        pickup_location=pickup,
+        dropoff_location=dropoff,
+        status=TripStatus.PENDING,
+        vehicle_type=vehicle_type,
         estimated_fare=fare_estimate.total_fare,
-        actual_fare=None,
-        distance=5.2,  # Mock distance
-        estimated_duration=15,  # Mock duration
-        actual_duration=None,
+        distance=round(distance_km, 2),
+        estimated_duration=duration_minutes,
         scheduled_time=trip_data.scheduled_time,
         created_at=datetime.utcnow(),
-        started_at=None,
-        completed_at=None,
-        cancelled_at=None,
-        rating=None,
-        feedback=None
+        notes=trip_data.notes,
+        payment_method_id=trip_data.payment_method_id
     )
+    db.add_all([pickup, dropoff, trip])
+    await db.commit()
     
-    return trip
+    # New addresses become searchable right away
+    for location in (pickup, dropoff):
+        place_index.add(
+            location.address, location.address, location.latitude, location.longitude,
+            reference=location.reference, user_id=current_user["id"]
+        )
+    
+    return trip_to_response(trip)
 
 @router.get("/{trip_id}", response_model=TripResponse)
 async def get_trip(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get trip details by ID."""
     
-    # Mock trip data
-    trip = TripResponse(
-        id=trip_id,
-        passenger_id=current_user["id"],
-        driver_id=str(uuid.uuid4()),
-        pickup_location=LocationModel(
-            latitude=-31.5375,
-            longitude=-68.5364,
-            address="Hospital Rawson, San Juan",
-            reference="Frente al hospital"
-        ),
-        dropoff_location=LocationModel(
-            latitude=-31.5441,
-            longitude=-68.5504,
-            address="UNSJ, San Juan",
-            reference="Campus universitario"
-        ),
-        status="driver_assigned",
-        vehicle_type="economy",
-        estimated_fare=850.50,
-        actual_fare=None,
-        distance=3.2,
-        estimated_duration=12,
-        actual_duration=None,
-        scheduled_time=None,
-        created_at=datetime.utcnow() - timedelta(minutes=5),
-        started_at=None,
-        completed_at=None,
-        cancelled_at=None,
-        rating=None,
-        feedback=None
-    )
-    
-    return trip
+    trip = await get_trip_for_user(db, trip_id, current_user["id"])
+    return trip_to_response(trip)
+
+def encode_trip_cursor(created_at: datetime, trip_id: str) -> str:
+    """Opaque cursor for the position just after (created_at, id)."""
+    raw = json.dumps([created_at.isoformat(), trip_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-@router.get("/", response_model=List[TripResponse])
+def decode_trip_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_trip_cursor; 400 on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, trip_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(trip_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/", response_model=TripPage)
 async def get_user_trips(
     current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
     limit: int = 10,
-    offset: int = 0
+    cursor: Optional[str] = None
 ):
-    """Get user's trip history."""
-    
-    # Mock trip history
-    trips = []
-    for i in range(min(limit, 5)):  # Return up to 5 mock trips
-        trip = TripResponse(
-            id=str(uuid.uuid4()),
-            passenger_id=current_user["id"],
-            driver_id=str(uuid.uuid4()),
-            pickup_location=LocationModel(
-                latitude=-31.5375 + random.uniform(-0.01, 0.01),
-                longitude=-68.5364 + random.uniform(-0.01, 0.01),
-                address=f"Ubicación {i+1}, San Juan"
-            ),
-            dropoff_location=LocationModel(
-                latitude=-31.5441 + random.uniform(-0.01, 0.01),
-                longitude=-68.5504 + random.uniform(-0.01, 0.01),
-                address=f"Destino {i+1}, San Juan"
-            ),
-            status="completed" if i > 0 else "in_progress",
-            vehicle_type=random.choice(["economy", "comfort", "xl"]),
-            estimated_fare=random.uniform(400, 1200),
-            actual_fare=random.uniform(400, 1200) if i > 0 else None,
-            distance=random.uniform(1.0, 8.0),
-            estimated_duration=random.randint(5, 25),
-            actual_duration=random.randint(5, 30) if i > 0 else None,
-            scheduled_time=None,
-            created_at=datetime.utcnow() - timedelta(days=i+1),
-            started_at=datetime.utcnow() - timedelta(days=i+1, minutes=5) if i > 0 else None,
-            completed_at=datetime.utcnow() - timedelta(days=i+1, minutes=20) if i > 0 else None,
-            cancelled_at=None,
-            rating=random.randint(4, 5) if i > 0 else None,
-            feedback="Excelente servicio" if i > 0 else None
+    """Get user's trip history, newest first, one page per cursor."""
+    
+    page_size = max(1, min(limit, MAX_TRIP_PAGE_SIZE))
+    pickup = aliased(Location)
+    dropoff = aliased(Location)
+    
+    # Only the summary columns; seeks ix_trips_passenger_created_id instead of skipping rows
+    query = (
+        select(
+            Trip.id, Trip.status, Trip.vehicle_type,
+            pickup.address, dropoff.address,
+            Trip.estimated_fare, Trip.actual_fare,
+            Trip.created_at, Trip.completed_at
         )
-        trips.append(trip)
+        .join(pickup, pickup.id == Trip.pickup_location_id)
+        .join(dropoff, dropoff.id == Trip.dropoff_location_id)
+        .where(Trip.passenger_id == current_user["id"])
+        .order_by(Trip.created_at.desc(), Trip.id.desc())
+        .limit(page_size + 1)
+    )
+    if cursor:
+        query = query.where(tuple_(Trip.created_at, Trip.id) < decode_trip_cursor(cursor))
     
-    return trips
+    rows = (await db.execute(query)).all()
+    items = [
+        {
+            "id": row[0],
+            "status": row[1].value,
+            "vehicle_type": row[2].value,
+            "pickup_address": row[3],
+            "dropoff_address": row[4],
+            "estimated_fare": row[5],
+            "actual_fare": row[6],
+            "created_at": row[7],
+            "completed_at": row[8]
+        }
+        for row in rows[:page_size]
+    ]
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_trip_cursor(last["created_at"], last["id"])
+    
+    # Shaped like TripPage; encoded directly rather than validated again
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @router.put("/{trip_id}/cancel")
 async def cancel_trip(
     trip_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Cancel a trip."""
     
+    await get_trip_for_user(db, trip_id, current_user["id"])
+    cancelled_at = datetime.utcnow()
+    try:
+        # Driver as of the cancel itself: one may have accepted since the load above
+        driver_id = await transition_trip(db, trip_id, TripStatus.CANCELLED, cancelled_at=cancelled_at)
+    except TransitionConflict as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc)
+        )
+    await db.commit()
+    
+    # The assigned driver, if any, is free again
+    if driver_id is not None:
+        driver_user_id = await db.scalar(select(Driver.user_id).where(Driver.id == driver_id))
+        if driver_user_id is not None:
+            fleet_index.set_state(driver_user_id, DRIVER_IDLE)
+    
+    trip_events.publish_status(trip_id, TripStatus.CANCELLED.value)
+    trip_events.release_trip(trip_id)
+    
     return {
         "message": "Trip cancelled successfully",
         "trip_id": trip_id,
-        "cancelled_at": datetime.utcnow()
+        "cancelled_at": cancelled_at
     }
 
 @router.put("/{trip_id}/rate")
@@ -317,7 +661,8 @@ async def rate_trip(
     trip_id: str,
     rating: int,
     feedback: str = None,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Rate a completed trip."""
     
@@ -327,9 +672,20 @@ async def rate_trip(
             detail="Rating must be between 1 and 5"
         )
     
+    trip = await get_trip_for_user(db, trip_id, current_user["id"])
+    if trip.passenger_id != current_user["id"] or trip.status != TripStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only the passenger of a completed trip can rate it"
+        )
+    
+    trip.rating = rating
+    trip.feedback = feedback
+    await db.commit()
+    
     return {
         "message": "Trip rated successfully",
         "trip_id": trip_id,
         "rating": rating,
         "feedback": feedback
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Mubitt Earnings Backfill
+Rebuilds the per-day trip counts and gross fares in driver_daily_earnings
+from completed trips, a chunk of drivers per transaction
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from database import close_db, init_db
+from services.earnings import BACKFILL_CHUNK_SIZE, rebuild_trip_rollups
+
+async def run(chunk_size: int, driver_id: str):
+    await init_db()
+    start = time.perf_counter()
+    try:
+        processed = await rebuild_trip_rollups(chunk_size=chunk_size, driver_id=driver_id)
+    finally:
+        await close_db()
+    print(f"✅ Rebuilt rollups for {processed} drivers in {time.perf_counter() - start:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE,
+                        help="drivers per transaction")
+    parser.add_argument("--driver-id", default=None, help="only rebuild this driver")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print("📊 Mubitt Earnings Backfill")
+    print("⚠️  Online hours are not derivable from trips and are kept as recorded")
+    asyncio.run(run(args.chunk_size, args.driver_id))
+
+if __name__ == "__main__":
+    main()
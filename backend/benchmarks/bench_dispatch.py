@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Mubitt Batched Dispatch Benchmark
+Assigns 500 peak-hour trips among 2000 idle drivers with the sparse optimal
+solver and with greedy nearest-driver matching, comparing total pickup time
+and latency. Small problems are checked against brute force first.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.dispatch import (
+    DISPATCH_CANDIDATES, DISPATCH_MAX_PICKUP_KM, PICKUP_SPEED_KMH, plan_assignment, solve_assignment,
+)
+from services.geo import haversine_distance_array
+from services.matching import CandidateBatch
+
+TRIPS = 500
+DRIVERS = 2000
+ROUNDS = 5
+
+def random_drivers(rng, count):
+    return CandidateBatch(
+        [f"driver-{i}" for i in range(count)],
+        latitude=-31.54 + rng.normal(0, 0.06, count),
+        longitude=-68.53 + rng.normal(0, 0.06, count),
+        rating=rng.uniform(4.0, 5.0, count),
+        trips_completed=rng.integers(0, 2000, count),
+        last_active_at=time.time() - rng.uniform(0, 600, count),
+    )
+
+def random_pickups(rng, count):
+    # Peak demand concentrates downtown
+    return -31.537 + rng.normal(0, 0.015, count), -68.526 + rng.normal(0, 0.015, count)
+
+def greedy_assignment(latitudes, longitudes, drivers: CandidateBatch):
+    """Each trip, in arrival order, takes the nearest free driver (what find_nearby_drivers implies).
+
+    Returns (driver index per trip or -1, pickup minutes per assigned trip).
+    """
+    free = np.ones(len(drivers), dtype=bool)
+    choice = np.full(len(latitudes), -1, dtype=np.int64)
+    minutes = []
+    for trip, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+        distance = haversine_distance_array(latitude, longitude, drivers.latitude, drivers.longitude)
+        distance[~free | (distance > DISPATCH_MAX_PICKUP_KM)] = np.inf
+        driver = int(np.argmin(distance))
+        if np.isfinite(distance[driver]):
+            free[driver] = False
+            choice[trip] = driver
+            minutes.append(distance[driver] / PICKUP_SPEED_KMH * 60)
+    return choice, np.array(minutes)
+
+def brute_force(mask, costs, row=0, used=frozenset()):
+    """(-assigned, cost) of the best partial assignment: most rows first, then cheapest."""
+    if row == len(mask):
+        return (0, 0.0)
+    best = brute_force(mask, costs, row + 1, used)
+    for col in np.flatnonzero(mask[row]):
+        if col not in used:
+            count, cost = brute_force(mask, costs, row + 1, used | {col})
+            best = min(best, (count - 1, cost + costs[row, col]))
+    return best
+
+def check_against_brute_force(rng, problems):
+    """Random sparse 5x7 problems (negative costs included) against exhaustive search."""
+    for _ in range(problems):
+        mask = rng.random((5, 7)) < 0.4
+        costs = rng.uniform(-3, 10, (5, 7))
+        rows, cols = np.nonzero(mask)
+        choice = solve_assignment(5, 7, rows, cols, costs[rows, cols])
+        assigned = [(row, col) for row, col in enumerate(choice) if col >= 0]
+        expected_count, expected_cost = brute_force(mask, costs)
+        if -len(assigned) != expected_count or abs(sum(costs[r, c] for r, c in assigned) - expected_cost) > 1e-9:
+            return False
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batched dispatch benchmark: sparse optimal vs greedy matching")
+    parser.add_argument(
+        "per_trip", nargs="?", type=int, default=DISPATCH_CANDIDATES,
+        help=f"Candidate drivers per trip (default: {DISPATCH_CANDIDATES})"
+    )
+    args = parser.parse_args()
+    if args.per_trip < 1:
+        parser.error("per_trip must be at least 1")
+    return args
+
+def main(per_trip):
+    print("🚕 Mubitt Batched Dispatch Benchmark")
+    print("=" * 50)
+    rng = np.random.default_rng(19)
+
+    print(f"🎯 Brute-force check (5x7): {'ok' if check_against_brute_force(rng, 300) else 'MISMATCH'}")
+
+    optimal_ms, greedy_ms, edges, rounds = [], [], [], []
+    optimal_minutes, greedy_minutes = [], []
+    for _ in range(ROUNDS):
+        drivers = random_drivers(rng, DRIVERS)
+        latitudes, longitudes = random_pickups(rng, TRIPS)
+
+        start = time.perf_counter()
+        plan = plan_assignment(latitudes, longitudes, drivers, per_trip=per_trip)
+        optimal_ms.append((time.perf_counter() - start) * 1000)
+        optimal_minutes.append(plan.eta_minutes[plan.drivers >= 0])
+        edges.append(plan.candidate_edges)
+        rounds.append(plan.rounds)
+
+        start = time.perf_counter()
+        greedy_minutes.append(greedy_assignment(latitudes, longitudes, drivers)[1])
+        greedy_ms.append((time.perf_counter() - start) * 1000)
+
+    print(f"📦 {TRIPS} trips x {DRIVERS} drivers, {per_trip} candidates per trip, "
+          f"{statistics.mean(edges):.0f} edges over {statistics.mean(rounds):.1f} rounds")
+    for label, latencies, minutes in (
+        ("✅ Batched optimal", optimal_ms, optimal_minutes),
+        ("⛔ Greedy nearest ", greedy_ms, greedy_minutes),
+    ):
+        assigned = statistics.mean(len(m) for m in minutes)
+        total = statistics.mean(float(m.sum()) for m in minutes)
+        print(f"{label}: {statistics.median(latencies):6.1f} ms, assigned {assigned:.0f}, "
+              f"pickup {total:.0f} min total ({total / assigned:.2f} min/trip, "
+              f"worst {max(float(m.max()) for m in minutes):.1f} min)")
+
+if __name__ == "__main__":
+    main(parse_args().per_trip)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Mubitt Matching Benchmark
+Times the vectorized driver scoring engine against a per-driver Python loop
+"""
+
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from services.geo import haversine_distance
+from services.matching import (
+    CandidateBatch, UserPreferences, rank_candidates, score_candidates,
+    PROXIMITY_EDGES_KM, PROXIMITY_SCORES
+)
+
+PICKUP = (-31.5375, -68.5364)  # Hospital Rawson
+CANDIDATES = 5000
+ROUNDS = 50
+
+def build_batch(size: int) -> CandidateBatch:
+    rng = np.random.default_rng(42)
+    now = time.time()
+    return CandidateBatch(
+        [f"driver-{i}" for i in range(size)],
+        latitude=PICKUP[0] + rng.uniform(-0.12, 0.12, size),
+        longitude=PICKUP[1] + rng.uniform(-0.12, 0.12, size),
+        rating=rng.uniform(3.5, 5.0, size),
+        experience_months=rng.uniform(0, 60, size),
+        trips_completed=rng.integers(0, 3000, size),
+        san_juan_experience_months=rng.uniform(0, 60, size),
+        san_juan_trips_completed=rng.integers(0, 1500, size),
+        street_knowledge_rating=rng.uniform(3.0, 5.0, size),
+        last_active_at=now - rng.uniform(0, 1800, size),
+        acceptance_rate=rng.uniform(0.5, 1.0, size),
+        cancellation_rate=rng.uniform(0.0, 0.3, size),
+        active_hours_mask=rng.integers(0, 1 << 24, size),
+        vehicle_type=rng.integers(0, 3, size),
+        gender=rng.integers(1, 3, size),
+        languages=rng.integers(1, 8, size),
+    )
+
+def python_loop(batch: CandidateBatch, now: float):
+    """Reference per-driver loop in the style of the spec (proximity + quality only)."""
+    scored = []
+    for i in range(len(batch)):
+        distance = haversine_distance(PICKUP[0], PICKUP[1], batch.latitude[i], batch.longitude[i])
+        proximity = PROXIMITY_SCORES[np.searchsorted(PROXIMITY_EDGES_KM, distance, side="right")] * 0.35
+        quality = (batch.rating[i] / 5.0 * 0.6
+                   + min(batch.experience_months[i] / 24.0, 1.0) * 0.25
+                   + min(batch.trips_completed[i] / 1000.0, 1.0) * 0.15) * 0.25
+        scored.append((proximity + quality, i))
+    scored.sort(reverse=True)
+    return scored[:10]
+
+def timed(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+def main():
+    print("🚗 Mubitt Matching Benchmark")
+    print("=" * 50)
+    
+    batch = build_batch(CANDIDATES)
+    now = time.time()
+    preferences = UserPreferences(
+        favorite_drivers={f"driver-{random.randrange(CANDIDATES)}" for _ in range(5)},
+        preferred_vehicle_types={"comfort"},
+        preferred_language="en",
+    )
+    
+    def vectorized():
+        scores = score_candidates(batch, *PICKUP, now=now, preferences=preferences)
+        rank_candidates(scores, limit=10)
+    
+    median_ms, worst_ms = timed(vectorized, ROUNDS)
+    print(f"📊 Vectorized, {CANDIDATES} candidates: median {median_ms:.2f} ms, max {worst_ms:.2f} ms")
+    
+    median_ms, worst_ms = timed(lambda: python_loop(batch, now), 5)
+    print(f"🐢 Python loop (2 of 5 factors): median {median_ms:.2f} ms, max {worst_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
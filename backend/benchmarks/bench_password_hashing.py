@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Mubitt Password Hashing Benchmark
+Measures event-loop latency while a burst of logins hashes passwords,
+first inline on the loop and then through the bounded bcrypt pool
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.auth import hash_password, verify_password, password_pool
+
+CONCURRENT_LOGINS = 16
+PROBE_INTERVAL = 0.005  # seconds
+
+async def probe_loop_lag(samples: list, stop: asyncio.Event):
+    """Record how late a 5 ms sleep wakes up, i.e. how long the loop was blocked."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+async def inline_login(hashed: str):
+    verify_password("testpassword123", hashed)
+
+async def pooled_login(hashed: str):
+    await password_pool.run(verify_password, "testpassword123", hashed)
+
+async def run_scenario(name: str, login, hashed: str):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(samples, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(login(hashed) for _ in range(CONCURRENT_LOGINS)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await probe
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name}: {CONCURRENT_LOGINS} logins in {elapsed * 1000:.0f} ms | "
+          f"loop lag p50 {statistics.median(samples):.1f} ms, p99 {p99:.1f} ms, max {samples[-1]:.1f} ms")
+
+async def main():
+    print("🔐 Mubitt Password Hashing Benchmark")
+    print("=" * 50)
+    hashed = hash_password("testpassword123")
+    await run_scenario("⛔ Inline bcrypt ", inline_login, hashed)
+    await run_scenario("✅ Pooled bcrypt ", pooled_login, hashed)
+    print(f"📊 Pool: {password_pool.stats()}")
+    password_pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Mubitt Places Autocomplete Benchmark
+Indexes synthetic San Juan addresses and times type-ahead lookups against a
+linear accent-folded substring scan (what LIKE '%q%' does)
+"""
+
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.places import PlaceIndex, fold
+
+PLACES = 20000
+STREETS = [
+    "Av. Libertador San Martín", "Av. José Ignacio de la Roza", "Av. Córdoba", "Av. Rioja",
+    "Calle Mendoza", "Calle Tucumán", "Calle General Acha", "Calle Laprida", "Calle Güemes",
+    "Av. España", "Calle Santa Fe", "Calle Entre Ríos", "Av. Rawson", "Calle Aberastain",
+    "Av. Benavídez", "Calle Salta", "Calle Jujuy", "Av. Circunvalación", "Calle Sarmiento",
+]
+DEPARTMENTS = ["Capital", "Rivadavia", "Chimbas", "Rawson", "Santa Lucía", "Pocito", "Rivadavia"]
+QUERIES = ["san mar", "guemes 12", "ignacio", "rawson", "cordob", "av esp", "sarmi", "tucuman 3", "laprid", "circunv"]
+ROUNDS = 200
+
+def main():
+    print("🔎 Mubitt Places Autocomplete Benchmark")
+    print("=" * 50)
+    rng = random.Random(3)
+    index = PlaceIndex()
+    start = time.perf_counter()
+    for i in range(PLACES):
+        address = f"{rng.choice(STREETS)} {rng.randint(1, 4000)}, {rng.choice(DEPARTMENTS)}"
+        index.add(address, address, -31.54 + rng.uniform(-0.08, 0.08), -68.53 + rng.uniform(-0.08, 0.08),
+                  user_id=f"user-{i % 500}", uses=rng.randint(1, 20))
+    print(f"🏗️  Indexed {len(index)} places in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    latencies = []
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            index.search(query, latitude=-31.5375, longitude=-68.5364, user_id="user-1")
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"✅ Indexed search : p50 {statistics.median(latencies):.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+
+    texts = [fold(place.address) for place in index._places]
+    start = time.perf_counter()
+    for query in QUERIES:
+        needle = fold(query)
+        [text for text in texts if needle in text]
+    scan_ms = (time.perf_counter() - start) * 1000 / len(QUERIES)
+    print(f"⛔ Substring scan : {scan_ms:.3f} ms per query (no ranking)")
+
+if __name__ == "__main__":
+    main()
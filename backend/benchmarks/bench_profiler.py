@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Mubitt Profiler Benchmark
+Calls a CPU-bound FastAPI route directly as an ASGI app (no HTTP) with the
+ProfilerMiddleware disabled, enabled but sampling nothing, and profiling
+every request, then checks the collapsed stacks point at the busy function
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.profiler import ProfilerMiddleware, SamplingProfiler
+
+PING_REQUESTS = 20000
+BUSY_REQUESTS = 100
+BUSY_SECONDS = 0.005
+ROUNDS = 5
+
+def busy_work():
+    start = time.perf_counter()
+    total = 0
+    while time.perf_counter() - start < BUSY_SECONDS:
+        total += sum(range(500))
+    return total
+
+def build_app():
+    app = FastAPI()
+
+    @app.put("/drivers/location")
+    async def ping():
+        return {}
+
+    @app.post("/trips/search-drivers")
+    async def search_drivers():
+        return {"total": busy_work()}
+
+    return app
+
+async def drive(app, method: str, path: str, requests: int, headers=()) -> float:
+    """Seconds to push `requests` requests through `app`."""
+    body = {"type": "http.request", "body": b"", "more_body": False}
+
+    async def receive():
+        return body
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": list(headers),
+            "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return time.perf_counter() - start
+
+def best_us(app, method: str, path: str, requests: int) -> float:
+    best = min(asyncio.run(drive(app, method, path, requests)) for _ in range(ROUNDS))
+    return best * 1e6 / requests
+
+def main():
+    print("🔬 Mubitt Profiler Benchmark")
+    print("=" * 50)
+    app = build_app()
+    profiler = SamplingProfiler(enabled=False, sample_rate=0.0, header_token="bench-token")
+    wrapped = ProfilerMiddleware(app, profiler)
+
+    plain_us = best_us(app, "PUT", "/drivers/location", PING_REQUESTS)
+    disabled_us = best_us(wrapped, "PUT", "/drivers/location", PING_REQUESTS)
+    profiler.configure(enabled=True)
+    idle_us = best_us(wrapped, "PUT", "/drivers/location", PING_REQUESTS)
+    print(f"⛔ Ping, no middleware   : {plain_us:.2f} µs per request")
+    print(f"💤 Ping, profiler off    : {disabled_us:.2f} µs per request")
+    print(f"🎲 Ping, on, not sampled : {idle_us:.2f} µs per request")
+
+    busy_plain_ms = asyncio.run(drive(app, "POST", "/trips/search-drivers", BUSY_REQUESTS)) * 1000 / BUSY_REQUESTS
+    profiler.configure(sample_rate=1.0, route_pattern="^/trips/search-drivers")
+    busy_profiled_ms = asyncio.run(drive(wrapped, "POST", "/trips/search-drivers", BUSY_REQUESTS)) * 1000 / BUSY_REQUESTS
+    print(f"🐢 Busy route, plain     : {busy_plain_ms:.3f} ms per request")
+    print(f"🔥 Busy route, profiled  : {busy_profiled_ms:.3f} ms per request")
+
+    stacks = profiler.collapsed()
+    busy_samples = sum(int(line.rsplit(" ", 1)[1]) for line in stacks.splitlines() if "busy_work" in line)
+    print(f"🎯 Samples in busy_work  : {busy_samples}/{profiler.samples} ({profiler.snapshots} snapshots)")
+    if stacks:
+        print(f"📄 Heaviest stack        : {stacks.splitlines()[0][-120:]}")
+    if not profiler.samples or busy_samples < profiler.samples * 0.9:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Mubitt Routing Benchmark
+Builds the road router from a synthetic Gran San Juan street grid (OSM XML),
+checks contraction-hierarchy answers against plain Dijkstra and times
+point-to-point queries including snapping
+"""
+
+import heapq
+import math
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.routing import RoadRouter, directed_edges
+
+CENTER = (-31.5375, -68.5364)
+GRID = 90            # intersections per side
+SPACING_DEG = 0.0011  # ~120 m blocks
+SHAPE_NODES = 2      # extra nodes per block, as real OSM ways have
+QUERIES = 1000
+VERIFY = 200
+
+def write_grid_osm(path: str):
+    """Street grid: avenues every 10 blocks, alternating one-way streets in between."""
+    rng = random.Random(7)
+    origin_lat = CENTER[0] - GRID / 2 * SPACING_DEG
+    origin_lng = CENTER[1] - GRID / 2 * SPACING_DEG
+    step = SHAPE_NODES + 1
+    size = (GRID - 1) * step + 1
+
+    def node_id(i, j):
+        return i * size + j + 1
+
+    with open(path, "w") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for i in range(size):
+            for j in range(size):
+                if i % step and j % step:
+                    continue
+                lat = origin_lat + i / step * SPACING_DEG + rng.uniform(-1e-5, 1e-5)
+                lng = origin_lng + j / step * SPACING_DEG + rng.uniform(-1e-5, 1e-5)
+                out.write(f'  <node id="{node_id(i, j)}" lat="{lat:.7f}" lon="{lng:.7f}"/>\n')
+
+        way_id = 1
+        for line in range(GRID):
+            for horizontal in (True, False):
+                refs = [node_id(line * step, k) if horizontal else node_id(k, line * step) for k in range(size)]
+                tags = {"highway": "primary"} if line % 10 == 0 else {"highway": "residential"}
+                if line % 10:
+                    tags["oneway"] = "yes" if line % 2 else "-1"
+                out.write(f'  <way id="{way_id}">\n')
+                out.writelines(f'    <nd ref="{ref}"/>\n' for ref in refs)
+                out.writelines(f'    <tag k="{k}" v="{v}"/>\n' for k, v in tags.items())
+                out.write('  </way>\n')
+                way_id += 1
+        out.write('</osm>\n')
+
+def dijkstra(adjacency, source, target):
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node == target:
+            return d
+        if d > dist[node]:
+            continue
+        for neighbour, seconds in adjacency[node]:
+            nd = d + seconds
+            if nd < dist.get(neighbour, math.inf):
+                dist[neighbour] = nd
+                heapq.heappush(heap, (nd, neighbour))
+    return math.inf
+
+def main():
+    print("🗺️  Mubitt Routing Benchmark")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        osm_path = f"{tmp}/grid.osm"
+        write_grid_osm(osm_path)
+
+        start = time.perf_counter()
+        router = RoadRouter.load_or_build(osm_path)
+        print(f"🏗️  Preprocessed {router.node_count} junctions in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        RoadRouter.load_or_build(osm_path)
+        print(f"💾 Reloaded from .npz cache in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(42)
+    src, dst, seconds, _ = directed_edges(router.arrays)
+    adjacency = [[] for _ in range(router.node_count)]
+    for u, v, t in zip(src.tolist(), dst.tolist(), seconds.tolist()):
+        adjacency[u].append((v, t))
+
+    mismatches = 0
+    for _ in range(VERIFY):
+        s, t = rng.randrange(router.node_count), rng.randrange(router.node_count)
+        expected = dijkstra(adjacency, s, t)
+        found, _ = router._query([(s, 0.0, 0.0)], [(t, 0.0, 0.0)])
+        if not math.isclose(found, expected, rel_tol=1e-9, abs_tol=1e-6):
+            mismatches += 1
+    print(f"{'✅' if mismatches == 0 else '❌'} {VERIFY - mismatches}/{VERIFY} node-to-node times match Dijkstra")
+
+    half = GRID / 2 * SPACING_DEG
+    points = [
+        (CENTER[0] + rng.uniform(-half, half), CENTER[1] + rng.uniform(-half, half),
+         CENTER[0] + rng.uniform(-half, half), CENTER[1] + rng.uniform(-half, half))
+        for _ in range(QUERIES)
+    ]
+    latencies = []
+    routes = []
+    for point in points:
+        start = time.perf_counter()
+        routes.append(router.route(*point))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    found = [route for route in routes if route is not None]
+    print(f"⚡ route() incl. snapping: p50 {statistics.median(latencies):.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms over {QUERIES} queries")
+    print(f"📏 Mean route {statistics.mean(r.distance_km for r in found):.2f} km, "
+          f"{statistics.mean(r.duration_seconds for r in found) / 60:.1f} min ({len(found)} routed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Mubitt Shared Fleet Benchmark
+Forked writer processes move drivers in a SharedFleetTable while this process
+reads it. Every write keeps longitude and timestamp derived from latitude, so
+a read mixing two writes is detectable: the seqlock must never return one,
+while unprotected reads of the same columns are counted for comparison.
+Also times updates and radius queries against the per-process FleetIndex
+"""
+
+import multiprocessing
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.fleet_index import FleetIndex
+from services.shared_fleet import SharedFleetTable
+
+DRIVERS = 5000
+WRITERS = 2
+READ_SECONDS = 3.0
+QUERIES = 2000
+RADIUS_KM = 3.0
+SMALL_RADIUS_KM = 0.3
+BASE_TIME = 1.7e9
+
+def coupled(latitude):
+    """Longitude and timestamp that belong with `latitude` in the same write."""
+    return -68.5 - (latitude + 31.55) * 0.75, BASE_TIME + (latitude + 31.55) * 1e4
+
+def writer(table, driver_ids, seed, stop):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        for _ in range(1000):
+            latitude = rng.uniform(-31.62, -31.48)
+            longitude, timestamp = coupled(latitude)
+            table.update(rng.choice(driver_ids), latitude, longitude, timestamp)
+
+def main():
+    print("🛰️  Mubitt Shared Fleet Benchmark")
+    print("=" * 50)
+    rng = random.Random(24)
+    driver_ids = [str(uuid.uuid4()) for _ in range(DRIVERS)]
+    table = SharedFleetTable.create(slots=2 * DRIVERS, stale_after_seconds=1e12)
+    local = FleetIndex(stale_after_seconds=1e12)
+
+    start = time.perf_counter()
+    for driver_id in driver_ids:
+        latitude = rng.uniform(-31.62, -31.48)
+        longitude, timestamp = coupled(latitude)
+        table.update(driver_id, latitude, longitude, timestamp)
+    insert_us = (time.perf_counter() - start) * 1e6 / DRIVERS
+    pings = []
+    for driver_id in driver_ids:
+        latitude = rng.uniform(-31.62, -31.48)
+        pings.append((driver_id, latitude) + coupled(latitude))
+    start = time.perf_counter()
+    for ping in pings:
+        local.update(*ping)
+    local_update_us = (time.perf_counter() - start) * 1e6 / DRIVERS
+    start = time.perf_counter()
+    for ping in pings:
+        table.update(*ping)
+    update_us = (time.perf_counter() - start) * 1e6 / DRIVERS
+    print(f"✍️  Shared insert      : {insert_us:.2f} µs per new driver")
+    print(f"✍️  Local update       : {local_update_us:.2f} µs per ping")
+    print(f"✍️  Shared update      : {update_us:.2f} µs per ping")
+
+    points = [(rng.uniform(-31.58, -31.52), rng.uniform(-68.56, -68.49)) for _ in range(QUERIES)]
+    start = time.perf_counter()
+    local_found = sum(len(local.within_radius(lat, lng, RADIUS_KM)) for lat, lng in points)
+    local_us = (time.perf_counter() - start) * 1e6 / QUERIES
+    start = time.perf_counter()
+    shared_found = sum(len(table.within_radius(lat, lng, RADIUS_KM)) for lat, lng in points)
+    shared_us = (time.perf_counter() - start) * 1e6 / QUERIES
+    print(f"⛔ Local radius query  : {local_us:.1f} µs ({local_found / QUERIES:.0f} drivers within {RADIUS_KM} km)")
+    print(f"✅ Shared radius query : {shared_us:.1f} µs ({shared_found / QUERIES:.0f} drivers within {RADIUS_KM} km)")
+    # Cost should follow the drivers near the pickup, not the fleet size
+    start = time.perf_counter()
+    small_found = sum(len(table.within_radius(lat, lng, SMALL_RADIUS_KM)) for lat, lng in points)
+    small_us = (time.perf_counter() - start) * 1e6 / QUERIES
+    print(f"✅ Shared small query  : {small_us:.1f} µs ({small_found / QUERIES:.0f} drivers within {SMALL_RADIUS_KM} km)")
+
+    context = multiprocessing.get_context("fork")
+    stop = context.Event()
+    writers = [context.Process(target=writer, args=(table, driver_ids, seed, stop)) for seed in range(WRITERS)]
+    for process in writers:
+        process.start()
+
+    rows = np.arange(DRIVERS)
+    reads = inconsistent = raw_inconsistent = 0
+    deadline = time.perf_counter() + READ_SECONDS
+    while time.perf_counter() < deadline:
+        latitudes, longitudes, timestamps, _, _ = table._read(rows)
+        expected_lng, expected_ts = coupled(latitudes)
+        inconsistent += int(np.count_nonzero((longitudes != expected_lng) | (timestamps != expected_ts)))
+        # Same columns without the sequence check
+        latitudes = table._latitude[rows]
+        longitudes = table._longitude[rows]
+        timestamps = table._updated_at[rows]
+        expected_lng, expected_ts = coupled(latitudes)
+        raw_inconsistent += int(np.count_nonzero((longitudes != expected_lng) | (timestamps != expected_ts)))
+        reads += DRIVERS
+
+    stop.set()
+    for process in writers:
+        process.join()
+    written = int(table._seq[:DRIVERS].sum() // 2)
+
+    print(f"🔁 Concurrent writes   : {written - 2 * DRIVERS} by {WRITERS} processes")
+    print(f"👀 Rows read           : {reads} ({table.torn_reads} retried)")
+    print(f"🧪 Unprotected reads   : {raw_inconsistent} mixed rows")
+    print(f"🎯 Seqlock reads       : {inconsistent} mixed rows")
+    table.close()
+    if inconsistent:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
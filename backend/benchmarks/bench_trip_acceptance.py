@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Mubitt Trip Acceptance Benchmark
+Fires hundreds of simultaneous accepts, first at a single trip and then
+spread over many trips, and checks that every trip gets exactly one driver
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Throwaway database, configured before the engine is created
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmpdir.name}/bench_trips.db"
+
+from sqlalchemy import func, select
+
+from database import SessionLocal, close_db, init_db
+from models.driver import Driver
+from models.trip import Location, Trip, TripStatus, VehicleType
+from models.user import User
+from services.trip_state import DriverUnavailable, TransitionConflict, transition_trip
+
+DRIVERS = 300
+TRIPS = 100
+
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+async def seed():
+    """One passenger, DRIVERS drivers, TRIPS pending trips."""
+    async with SessionLocal() as db:
+        passenger = User(id=_new_id(), name="Pasajero", email="p@bench.ar",
+                         phone_number="+5426400000", password_hash="x")
+        pickup = Location(id=_new_id(), latitude=-31.5375, longitude=-68.5364, address="Plaza 25 de Mayo")
+        dropoff = Location(id=_new_id(), latitude=-31.5450, longitude=-68.5200, address="Terminal")
+        db.add_all([passenger, pickup, dropoff])
+
+        users = [
+            User(id=_new_id(), name=f"Conductor {i}", email=f"d{i}@bench.ar",
+                 phone_number=f"+5426410{i:04d}", password_hash="x")
+            for i in range(DRIVERS)
+        ]
+        db.add_all(users)
+        # No ORM relationships between these models, so parents are flushed first
+        await db.flush()
+
+        driver_ids = []
+        for i, user in enumerate(users):
+            driver = Driver(id=_new_id(), user_id=user.id, license_number=f"LIC{i}",
+                            vehicle_make="Fiat", vehicle_model="Cronos", vehicle_color="Blanco",
+                            vehicle_year=2020, license_plate=f"AB{i:04d}CD", is_active=True)
+            db.add(driver)
+            driver_ids.append(driver.id)
+        await db.flush()
+
+        trip_ids = []
+        for _ in range(TRIPS):
+            trip = Trip(id=_new_id(), passenger_id=passenger.id, pickup_location_id=pickup.id,
+                        dropoff_location_id=dropoff.id, status=TripStatus.PENDING,
+                        vehicle_type=VehicleType.ECONOMY, estimated_fare=1500.0, distance=3.0,
+                        estimated_duration=8, payment_method_id="cash")
+            db.add(trip)
+            trip_ids.append(trip.id)
+        await db.commit()
+    return driver_ids, trip_ids
+
+async def accept(trip_id: str, driver_id: str) -> bool:
+    """Same unit of work as PUT /drivers/trips/{trip_id}/accept."""
+    async with SessionLocal() as db:
+        try:
+            await transition_trip(db, trip_id, TripStatus.DRIVER_ASSIGNED,
+                                  driver_id=driver_id, assign_driver=True)
+        except (TransitionConflict, DriverUnavailable):
+            return False
+        await db.commit()
+        return True
+
+async def run_scenario(name: str, attempts):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(accept(trip_id, driver_id) for trip_id, driver_id in attempts))
+    elapsed = time.perf_counter() - start
+
+    trip_ids = {trip_id for trip_id, _ in attempts}
+    async with SessionLocal() as db:
+        assigned = await db.scalar(
+            select(func.count()).select_from(Trip)
+            .where(Trip.id.in_(trip_ids), Trip.driver_id.is_not(None), Trip.version == 2)
+        )
+    wins = sum(results)
+    correct = wins == len(trip_ids) == assigned
+    print(f"{name}: {len(attempts)} accepts in {elapsed * 1000:.0f} ms "
+          f"({len(attempts) / elapsed:.0f}/s) | winners {wins}/{len(trip_ids)} trips, "
+          f"409s {len(attempts) - wins} | {'✅ exactly one winner each' if correct else '❌ INCONSISTENT'}")
+    return correct
+
+async def main():
+    print("🚕 Mubitt Trip Acceptance Benchmark")
+    print("=" * 50)
+    await init_db()
+    driver_ids, trip_ids = await seed()
+
+    # Every driver grabs the same trip
+    hot_trip = trip_ids[0]
+    ok_single = await run_scenario("🔥 One trip   ", [(hot_trip, driver_id) for driver_id in driver_ids])
+
+    # Each remaining trip offered to three drivers at once
+    spread = [
+        (trip_id, driver_ids[(i * 3 + k) % DRIVERS])
+        for i, trip_id in enumerate(trip_ids[1:])
+        for k in range(3)
+    ]
+    ok_spread = await run_scenario("🗺️  Many trips ", spread)
+
+    await close_db()
+    _tmpdir.cleanup()
+    sys.exit(0 if ok_single and ok_spread else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Mubitt Trip Serialization Benchmark
+Cost of turning 100 trip rows into a response body: the previous
+TripResponse + response_model + stdlib json path versus the direct
+dict + orjson path used by the trip endpoints now
+"""
+
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import TypeAdapter
+from fastapi.responses import ORJSONResponse
+
+from api.trips import trip_payload
+from models.trip import Location, LocationModel, Trip, TripResponse, TripStatus, VehicleType
+
+TRIPS_PER_RESPONSE = 100
+ROUNDS = 300
+
+def make_trips(count: int) -> List[Trip]:
+    now = datetime.utcnow()
+    trips = []
+    for i in range(count):
+        pickup = Location(id=str(uuid.uuid4()), latitude=-31.5375, longitude=-68.5364,
+                          address="Av. Ignacio de la Roza 130, San Juan", reference="Frente al hospital")
+        dropoff = Location(id=str(uuid.uuid4()), latitude=-31.5441, longitude=-68.5504,
+                           address="Av. Libertador San Martín, San Juan")
+        trips.append(Trip(
+            id=str(uuid.uuid4()), passenger_id=str(uuid.uuid4()), driver_id=str(uuid.uuid4()),
+            pickup_location=pickup, dropoff_location=dropoff,
+            status=TripStatus.COMPLETED, vehicle_type=VehicleType.ECONOMY,
+            estimated_fare=1480.5, actual_fare=1520.0, distance=4.3,
+            estimated_duration=12, actual_duration=14,
+            created_at=now - timedelta(hours=i), started_at=now, completed_at=now,
+            rating=5, feedback="Excelente"
+        ))
+    return trips
+
+response_adapter = TypeAdapter(List[TripResponse])
+
+def previous_path(trips: List[Trip]) -> bytes:
+    """Build models, re-validate them as response_model, encode with json."""
+    models = [
+        TripResponse(
+            id=trip.id, passenger_id=trip.passenger_id, driver_id=trip.driver_id,
+            pickup_location=LocationModel.model_validate(trip.pickup_location),
+            dropoff_location=LocationModel.model_validate(trip.dropoff_location),
+            status=trip.status.value, vehicle_type=trip.vehicle_type.value,
+            estimated_fare=trip.estimated_fare, actual_fare=trip.actual_fare,
+            distance=trip.distance, estimated_duration=trip.estimated_duration,
+            actual_duration=trip.actual_duration, scheduled_time=trip.scheduled_time,
+            created_at=trip.created_at, started_at=trip.started_at,
+            completed_at=trip.completed_at, cancelled_at=trip.cancelled_at,
+            rating=trip.rating, feedback=trip.feedback
+        )
+        for trip in trips
+    ]
+    validated = response_adapter.validate_python(models, from_attributes=True)
+    content = response_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def fast_path(trips: List[Trip]) -> bytes:
+    return ORJSONResponse([trip_payload(trip) for trip in trips]).body
+
+def measure(fn, trips) -> float:
+    fn(trips)  # warm-up
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(trips)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+def main():
+    print("📦 Mubitt Trip Serialization Benchmark")
+    print("=" * 50)
+    trips = make_trips(TRIPS_PER_RESPONSE)
+
+    # Both paths must produce the same document
+    assert json.loads(previous_path(trips)) == json.loads(fast_path(trips))
+
+    before = measure(previous_path, trips)
+    after = measure(fast_path, trips)
+    print(f"⛔ pydantic + json : {before:.3f} ms per {TRIPS_PER_RESPONSE} trips")
+    print(f"✅ dict + orjson   : {after:.3f} ms per {TRIPS_PER_RESPONSE} trips")
+    print(f"🚀 Speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Mubitt Zone Resolver Benchmark
+Resolves random Gran San Juan coordinates through the raster grid (single and
+bulk) and checks every answer against exact point-in-polygon tests
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.zones import OUTSIDE, points_in_polygon, zone_resolver
+
+POINTS = 100000
+SINGLE_LOOKUPS = 20000
+
+def exact_indices(lats, lngs):
+    """Reference answer: every point against every polygon, then nearest reference."""
+    result = np.full(len(lats), OUTSIDE, dtype=np.int64)
+    for zone_index, ring in zone_resolver._rings:
+        inside = (result == OUTSIDE) & points_in_polygon(lats, lngs, ring)
+        result[inside] = zone_index
+    outside = np.flatnonzero(result == OUTSIDE)
+    result[outside] = zone_resolver._nearest_reference(lats[outside], lngs[outside])
+    return result
+
+def main():
+    print("🗺️  Mubitt Zone Resolver Benchmark")
+    print("=" * 50)
+    print(f"📐 {zone_resolver.stats()}")
+    rng = np.random.default_rng(18)
+    lats = rng.uniform(-31.70, -31.44, POINTS)
+    lngs = rng.uniform(-68.66, -68.46, POINTS)
+
+    start = time.perf_counter()
+    expected = exact_indices(lats, lngs)
+    exact_ms = (time.perf_counter() - start) * 1000
+    print(f"⛔ Exact polygons : {exact_ms:.1f} ms for {POINTS} points")
+
+    start = time.perf_counter()
+    resolved = zone_resolver.resolve_indices(lats, lngs)
+    bulk_ms = (time.perf_counter() - start) * 1000
+    print(f"✅ Bulk raster    : {bulk_ms:.1f} ms for {POINTS} points")
+
+    mismatches = int((resolved != expected).sum())
+    print(f"🎯 Agreement      : {POINTS - mismatches}/{POINTS}")
+
+    singles = list(zip(lats[:SINGLE_LOOKUPS].tolist(), lngs[:SINGLE_LOOKUPS].tolist()))
+    start = time.perf_counter()
+    single = [zone_resolver.resolve(lat, lng) for lat, lng in singles]
+    single_us = (time.perf_counter() - start) * 1e6 / SINGLE_LOOKUPS
+    print(f"⚡ Single lookup  : {single_us:.2f} µs per point")
+    mismatches += sum(
+        zone_id != zone_resolver.zone_ids[index] for zone_id, index in zip(single, expected[:SINGLE_LOOKUPS])
+    )
+
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
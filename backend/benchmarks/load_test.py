@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Mubitt Load Test
+Simulates a fleet of drivers pinging their location and passengers quoting,
+searching, booking, polling and cancelling trips, all concurrently, against
+a running server (--base-url) or the app in-process through an ASGI
+transport. Reports throughput and p50/p95/p99 latency per route and writes
+the results as JSON so runs can be compared (--baseline).
+
+In-process runs share one event loop between the simulated clients and the
+app, so absolute numbers are lower than against a real server; compare
+in-process runs with in-process runs.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Plaza 25 de Mayo; simulated activity stays within a few km of it
+CENTER_LATITUDE = -31.5375
+CENTER_LONGITUDE = -68.5364
+SPREAD_DEG = 0.03
+
+PASSWORD = "loadtest-password"
+
+
+class RouteStats:
+    """Latencies and status codes per route template."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, latency_ms: float, status: str):
+        self.latencies.setdefault(route, []).append(latency_ms)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    @staticmethod
+    def percentile(ordered: List[float], fraction: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        if not ordered:
+            return 0.0
+        rank = max(1, int(round(fraction * len(ordered) + 0.5)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def summary(self, duration_seconds: float) -> Dict[str, Dict]:
+        routes = {}
+        for route in sorted(self.latencies):
+            ordered = sorted(self.latencies[route])
+            statuses = self.statuses[route]
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            routes[route] = {
+                "requests": len(ordered),
+                "errors": errors,
+                "error_rate": round(errors / len(ordered), 4),
+                "throughput_rps": round(len(ordered) / duration_seconds, 2),
+                "p50_ms": round(self.percentile(ordered, 0.50), 2),
+                "p95_ms": round(self.percentile(ordered, 0.95), 2),
+                "p99_ms": round(self.percentile(ordered, 0.99), 2),
+                "max_ms": round(ordered[-1], 2),
+                "statuses": dict(sorted(statuses.items())),
+            }
+        return routes
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.stats = RouteStats()
+        self.rng = random.Random(args.seed)
+        self.recording = False
+        self.trips_created = 0
+
+    async def call(self, route: str, method: str, url: str, token: Optional[str] = None, **kwargs):
+        """Send one request, timing it under `route` (the path template) while recording."""
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as exc:
+            response, status = None, type(exc).__name__
+        if self.recording:
+            self.stats.record(route, (time.perf_counter() - start) * 1000, status)
+        return response
+
+    def random_point(self):
+        return (
+            CENTER_LATITUDE + self.rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+            CENTER_LONGITUDE + self.rng.uniform(-SPREAD_DEG, SPREAD_DEG),
+        )
+
+    async def register_user(self, role: str, index: int) -> str:
+        response = await self.call("POST /auth/register", "POST", "/auth/register", json={
+            "name": f"Load {role} {index}",
+            "email": f"load-{self.args.run_id}-{role}-{index}@loadtest.mubitt.com.ar",
+            "phone_number": f"+54{self.args.run_id:05d}{role[0]}{index:06d}",
+            "password": PASSWORD,
+        })
+        if response is None or response.status_code != 200:
+            detail = response.text[:200] if response is not None else "no response"
+            raise RuntimeError(f"Could not register {role} {index}: {detail}")
+        return response.json()["access_token"]
+
+    async def setup_driver(self, index: int) -> str:
+        token = await self.register_user("driver", index)
+        await self.call("POST /drivers/register", "POST", "/drivers/register", token, json={
+            "license_number": f"LT{self.args.run_id}-{index}",
+            "vehicle_make": "Fiat",
+            "vehicle_model": "Cronos",
+            "vehicle_color": "Blanco",
+            "vehicle_year": 2020,
+            "license_plate": f"LT{self.args.run_id % 100000}{index:05d}",
+        })
+        await self.call("PUT /drivers/status", "PUT", "/drivers/status", token, params={"is_active": True})
+        return token
+
+    async def setup(self):
+        """Register every simulated user (not part of the measured window)."""
+        limit = asyncio.Semaphore(self.args.setup_concurrency)
+
+        async def bounded(coroutine):
+            async with limit:
+                return await coroutine
+
+        self.driver_tokens = await asyncio.gather(*(
+            bounded(self.setup_driver(i)) for i in range(self.args.drivers)
+        ))
+        self.passenger_tokens = await asyncio.gather(*(
+            bounded(self.register_user("passenger", i)) for i in range(self.args.passengers)
+        ))
+
+    async def driver(self, token: str):
+        """Ping the location every --ping-interval seconds, wandering around the city."""
+        latitude, longitude = self.random_point()
+        await asyncio.sleep(self.rng.uniform(0, self.args.ping_interval))
+        while True:
+            latitude += self.rng.gauss(0, 0.0005)
+            longitude += self.rng.gauss(0, 0.0005)
+            await self.call("PUT /drivers/location", "PUT", "/drivers/location", token,
+                            json={"latitude": latitude, "longitude": longitude})
+            await asyncio.sleep(self.args.ping_interval)
+
+    async def passenger(self, token: str):
+        """Quote, search, book, poll and cancel trips until cancelled."""
+        await asyncio.sleep(self.rng.uniform(0, self.args.think_time))
+        while True:
+            pickup, dropoff = self.random_point(), self.random_point()
+            pickup_location = {"latitude": pickup[0], "longitude": pickup[1], "address": "Origen"}
+            dropoff_location = {"latitude": dropoff[0], "longitude": dropoff[1], "address": "Destino"}
+
+            await self.call("POST /trips/estimate-fare", "POST", "/trips/estimate-fare",
+                            json={"pickup_location": pickup_location, "dropoff_location": dropoff_location})
+            await self.call("POST /trips/search-drivers", "POST", "/trips/search-drivers",
+                            json={"pickup_location": pickup_location, "radius": 5.0, "vehicle_type": "economy"})
+            response = await self.call("POST /trips/create", "POST", "/trips/create", token, json={
+                "pickup_location": pickup_location,
+                "dropoff_location": dropoff_location,
+                "vehicle_type": "economy",
+                "payment_method_id": "cash",
+            })
+            if response is not None and response.status_code == 200:
+                self.trips_created += 1
+                trip_id = response.json()["id"]
+                for _ in range(self.args.polls):
+                    await asyncio.sleep(self.args.poll_interval)
+                    await self.call("GET /trips/{trip_id}", "GET", f"/trips/{trip_id}", token)
+                await self.call("PUT /trips/{trip_id}/cancel", "PUT", f"/trips/{trip_id}/cancel", token)
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    async def run(self) -> float:
+        """Run every simulated user for --duration seconds; returns the measured seconds."""
+        self.recording = True
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(self.driver(token)) for token in self.driver_tokens]
+        tasks += [asyncio.create_task(self.passenger(token)) for token in self.passenger_tokens]
+        await asyncio.sleep(self.args.duration)
+        # Requests still in flight at the deadline are dropped, not recorded
+        self.recording = False
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failures = [result for result in results if not isinstance(result, (asyncio.CancelledError, type(None)))]
+        if failures:
+            raise failures[0]
+        return elapsed
+
+
+def print_report(routes: Dict[str, Dict], duration_seconds: float):
+    print(f"\n📊 Results over {duration_seconds:.1f} s")
+    print(f"{'route':<32} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for route, row in routes.items():
+        print(f"{route:<32} {row['requests']:>7} {row['throughput_rps']:>8.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['error_rate'] * 100:>6.2f}")
+
+
+def print_comparison(routes: Dict[str, Dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as source:
+        baseline = json.load(source)["routes"]
+    print(f"\n📈 Against {baseline_path} (positive = slower / fewer requests)")
+    print(f"{'route':<32} {'Δ rps':>8} {'Δ p50':>8} {'Δ p95':>8} {'Δ p99':>8}")
+    for route, row in routes.items():
+        before = baseline.get(route)
+        if before is None:
+            print(f"{route:<32} {'new':>8}")
+            continue
+
+        def change(key, invert=False):
+            if not before[key]:
+                return "n/a"
+            delta = (row[key] - before[key]) / before[key] * 100
+            return f"{-delta if invert else delta:+.1f}%"
+
+        print(f"{route:<32} {change('throughput_rps', invert=True):>8} {change('p50_ms'):>8} "
+              f"{change('p95_ms'):>8} {change('p99_ms'):>8}")
+
+
+async def run_load_test(args) -> Dict:
+    if args.base_url:
+        limits = httpx.Limits(max_connections=args.drivers + args.passengers)
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits)
+        app = None
+    else:
+        # Throwaway database, configured before the engine is created
+        tmpdir = tempfile.mkdtemp(prefix="mubitt-load-")
+        # Always: a DATABASE_URL left in the shell must not receive the load users and trips
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmpdir}/load_test.db"
+        from main import app
+        await app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://mubitt.test", timeout=args.timeout
+        )
+
+    try:
+        test = LoadTest(client, args)
+        print(f"👥 Registering {args.drivers} drivers and {args.passengers} passengers...")
+        setup_start = time.perf_counter()
+        await test.setup()
+        print(f"   done in {time.perf_counter() - setup_start:.1f} s")
+
+        print(f"🚦 Running for {args.duration:.0f} s against {args.base_url or 'the in-process app'}...")
+        duration_seconds = await test.run()
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    routes = test.stats.summary(duration_seconds)
+    total_requests = sum(row["requests"] for row in routes.values())
+    total_errors = sum(row["errors"] for row in routes.values())
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "target": args.base_url or "in-process",
+        "python": platform.python_version(),
+        "config": {
+            "drivers": args.drivers,
+            "passengers": args.passengers,
+            "duration_seconds": args.duration,
+            "ping_interval_seconds": args.ping_interval,
+            "think_time_seconds": args.think_time,
+            "polls": args.polls,
+            "poll_interval_seconds": args.poll_interval,
+            "seed": args.seed,
+        },
+        "duration_seconds": round(duration_seconds, 2),
+        "trips_created": test.trips_created,
+        "totals": {
+            "requests": total_requests,
+            "errors": total_errors,
+            "throughput_rps": round(total_requests / duration_seconds, 2),
+        },
+        "routes": routes,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Mubitt API")
+    parser.add_argument("--base-url", help="Server to load (default: the app in-process over ASGI)")
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--passengers", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--ping-interval", type=float, default=4.0, help="Seconds between driver pings")
+    parser.add_argument("--think-time", type=float, default=3.0, help="Mean seconds between a passenger's trips")
+    parser.add_argument("--polls", type=int, default=3, help="Trip status polls before cancelling")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--setup-concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="load_test_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+    # Keeps emails, phones and plates unique when loading a long-lived server repeatedly
+    args.run_id = int(time.time()) % 100000
+    return args
+
+
+def main():
+    args = parse_args()
+    print("🏋️  Mubitt Load Test")
+    print("=" * 50)
+    results = asyncio.run(run_load_test(args))
+
+    print_report(results["routes"], results["duration_seconds"])
+    print(f"\n✅ {results['totals']['requests']} requests, {results['totals']['throughput_rps']} req/s, "
+          f"{results['totals']['errors']} errors, {results['trips_created']} trips created")
+
+    with open(args.output, "w", encoding="utf-8") as target:
+        json.dump(results, target, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        print_comparison(results["routes"], args.baseline)
+
+
+if __name__ == "__main__":
+    main()
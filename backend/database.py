@@ -0,0 +1,96 @@
+"""
+Database engine, shared metadata and per-request sessions.
+
+Uses SQLite through aiosqlite locally; set DATABASE_URL to any async DSN
+(e.g. postgresql+asyncpg://...) in production.
+"""
+
+import os
+from typing import AsyncIterator, Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./mubitt.db")
+
+# Pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+
+def _async_url(url: str) -> str:
+    """Map plain postgres URLs (as Railway provides them) to the asyncpg driver."""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+DATABASE_URL = _async_url(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=not IS_SQLITE,
+    echo=DB_ECHO,
+    connect_args={"timeout": 30} if IS_SQLITE else {},
+)
+
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a write is in progress
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+# Single metadata shared by every model
+Base = declarative_base()
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: one session (unit of work) per request."""
+    async with SessionLocal() as session:
+        yield session
+
+
+async def init_db():
+    """Create missing tables."""
+    # Register every model on the shared metadata
+    import models.user, models.driver, models.trip  # noqa: F401
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db():
+    await engine.dispose()
+
+
+def pool_stats() -> Dict:
+    """Connection pool usage."""
+    pool = engine.pool
+    capacity = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "utilization": round(checked_out / capacity, 4) if capacity else 0.0,
+    }
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 from datetime import datetime
 
@@ -8,6 +9,25 @@ from datetime import datetime
 from api.auth import router as auth_router
 from api.trips import router as trips_router
 from api.drivers import router as drivers_router
+from api.realtime import router as realtime_router
+from api.places import router as places_router
+from api.admin import router as admin_router
+from api.trips import SAN_JUAN_LOCATIONS, warm_route_cache
+from api.auth import password_pool, token_cache
+from database import close_db, init_db, pool_stats
+from services.dispatch import dispatcher
+from services.fleet_index import fleet_index
+from services.location_ingest import location_ingest
+from services.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, metrics
+from services.ping_cadence import ping_cadence
+from services.places import load_trip_history, place_index
+from services.profiler import ProfilerMiddleware
+from services.route_cache import route_cache, seconds_until_bucket_end
+from services.routing import route_provider
+from services.trip_events import trip_events
+from services.cached_json import EncodedPayload, VersionedPayload
+from services.surge import SURGE_TICK_SECONDS, surge_engine
+from services.zones import SAN_JUAN_ZONES, zone_resolver
 
 app = FastAPI(
     title="Mubitt API",
@@ -26,10 +46,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sampled requests only; inside the metrics middleware so its cost is measured too
+app.add_middleware(ProfilerMiddleware)
+
+# Outermost of our middleware, so CORS preflights and errors are counted too
+app.add_middleware(MetricsMiddleware)
+
 # Include API routers
 app.include_router(auth_router)
 app.include_router(trips_router)
 app.include_router(drivers_router)
+app.include_router(realtime_router)
+app.include_router(places_router)
+app.include_router(admin_router)
+
+# Background tasks running for the lifetime of the process
+background_tasks = []
+
+# Set once places are indexed; start_server does it before forking workers
+places_loaded = False
+
+async def load_places():
+    """Autocomplete: landmarks first, then addresses from recent trips."""
+    global places_loaded
+    if places_loaded:
+        return
+    place_index.add_many(SAN_JUAN_REFERENCES, source="landmark")
+    place_index.add_many(SAN_JUAN_LOCATIONS, source="landmark")
+    await load_trip_history()
+    places_loaded = True
+
+async def load_routing():
+    """Load the road network unless preloaded, then keep landmark routes warm in every traffic bucket."""
+    if route_provider.state == "pending":
+        await route_provider.load()
+    if route_provider.router is None:
+        return
+    while True:
+        warm_route_cache()
+        await asyncio.sleep(seconds_until_bucket_end() + 1)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await init_db()
+    zones_payload.current()
+    await load_places()
+    background_tasks.append(asyncio.create_task(surge_engine.run()))
+    background_tasks.append(asyncio.create_task(location_ingest.run()))
+    if dispatcher.enabled:
+        background_tasks.append(asyncio.create_task(dispatcher.run()))
+    # Straight-line estimates are used until the road network is ready
+    background_tasks.append(asyncio.create_task(load_routing()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # Last pings received before shutdown
+    await location_ingest.flush()
+    password_pool.shutdown()
+    await close_db()
 
 @app.get("/")
 async def root():
@@ -42,119 +120,136 @@ async def root():
         "redoc": "/redoc"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request metrics of this worker in Prometheus text format."""
+    return Response(content=metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy", 
         "service": "mubitt-api",
         "timestamp": datetime.utcnow().isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "token_cache": token_cache.stats(),
+        "password_hashing": password_pool.stats(),
+        "database_pool": pool_stats(),
+        "trip_events": trip_events.stats(),
+        "location_ingest": location_ingest.stats(),
+        "location_cadence": ping_cadence.stats(),
+        "routing": route_provider.stats(),
+        "route_cache": route_cache.stats(),
+        "places": place_index.stats(),
+        "zones": zone_resolver.stats(),
+        "dispatch": dispatcher.stats(),
+        "surge": surge_engine.stats(),
+        "fleet": fleet_index.stats()
     }
 
 # San Juan specific endpoints
-@app.get("/san-juan/references")
-async def get_san_juan_references():
-    """Get popular location references in San Juan."""
-    return {
-        "references": [
-            {
-                "id": "hospital_rawson",
-                "name": "Hospital Rawson",
-                "address": "Av. Ignacio de la Roza 130, San Juan",
-                "latitude": -31.5375,
-                "longitude": -68.5364,
-                "category": "hospital"
-            },
-            {
-                "id": "unsj",
-                "name": "Universidad Nacional de San Juan (UNSJ)",
-                "address": "Av. Libertador San Martín, San Juan",
-                "latitude": -31.5441,
-                "longitude": -68.5504,
-                "category": "university"
-            },
-            {
-                "id": "plaza_25_mayo",
-                "name": "Plaza 25 de Mayo",
-                "address": "Plaza 25 de Mayo, Centro, San Juan",
-                "latitude": -31.5375,
-                "longitude": -68.5289,
-                "category": "landmark"
-            },
-            {
-                "id": "shopping_del_sol",
-                "name": "Shopping del Sol",
-                "address": "Av. José Ignacio de la Roza, San Juan",
-                "latitude": -31.5203,
-                "longitude": -68.5289,
-                "category": "shopping"
-            },
-            {
-                "id": "terminal_bus",
-                "name": "Terminal de Ómnibus",
-                "address": "Estados Unidos, San Juan",
-                "latitude": -31.5344,
-                "longitude": -68.5197,
-                "category": "transport"
-            },
-            {
-                "id": "aeropuerto",
-                "name": "Aeropuerto Domingo Faustino Sarmiento",
-                "address": "Pocito, San Juan",
-                "latitude": -31.5714,
-                "longitude": -68.4182,
-                "category": "airport"
-            }
-        ]
+SAN_JUAN_REFERENCES = [
+    {
+        "id": "hospital_rawson",
+        "name": "Hospital Rawson",
+        "address": "Av. Ignacio de la Roza 130, San Juan",
+        "latitude": -31.5375,
+        "longitude": -68.5364,
+        "category": "hospital"
+    },
+    {
+        "id": "unsj",
+        "name": "Universidad Nacional de San Juan (UNSJ)",
+        "address": "Av. Libertador San Martín, San Juan",
+        "latitude": -31.5441,
+        "longitude": -68.5504,
+        "category": "university"
+    },
+    {
+        "id": "plaza_25_mayo",
+        "name": "Plaza 25 de Mayo",
+        "address": "Plaza 25 de Mayo, Centro, San Juan",
+        "latitude": -31.5375,
+        "longitude": -68.5289,
+        "category": "landmark"
+    },
+    {
+        "id": "shopping_del_sol",
+        "name": "Shopping del Sol",
+        "address": "Av. José Ignacio de la Roza, San Juan",
+        "latitude": -31.5203,
+        "longitude": -68.5289,
+        "category": "shopping"
+    },
+    {
+        "id": "terminal_bus",
+        "name": "Terminal de Ómnibus",
+        "address": "Estados Unidos, San Juan",
+        "latitude": -31.5344,
+        "longitude": -68.5197,
+        "category": "transport"
+    },
+    {
+        "id": "aeropuerto",
+        "name": "Aeropuerto Domingo Faustino Sarmiento",
+        "address": "Pocito, San Juan",
+        "latitude": -31.5714,
+        "longitude": -68.4182,
+        "category": "airport"
     }
+]
 
-@app.get("/san-juan/zones")
-async def get_san_juan_zones():
-    """Get zones/districts in San Juan with surge pricing info."""
+# Static for the life of the process
+references_payload = EncodedPayload(
+    {"references": SAN_JUAN_REFERENCES},
+    cache_control="public, max-age=86400"
+)
+
+def _zone_surge_key():
+    snapshot = surge_engine.snapshot
+    return tuple(
+        (zone.id, snapshot.zones[zone.id].surge_factor, snapshot.zones[zone.id].demand)
+        for zone in SAN_JUAN_ZONES
+    )
+
+def _zones_content():
+    # Nothing here may change without changing _zone_surge_key (no snapshot
+    # id or timestamp), or clients would keep a stale body under a valid ETag
+    snapshot = surge_engine.snapshot
     return {
         "zones": [
             {
-                "id": "centro",
-                "name": "Centro",
-                "surge_factor": 1.0,
-                "demand": "medium"
-            },
-            {
-                "id": "desamparados",
-                "name": "Desamparados",
-                "surge_factor": 1.1,
-                "demand": "high"
-            },
-            {
-                "id": "rivadavia",
-                "name": "Rivadavia",
-                "surge_factor": 1.0,
-                "demand": "low"
-            },
-            {
-                "id": "chimbas",
-                "name": "Chimbas",
-                "surge_factor": 1.2,
-                "demand": "medium"
-            },
-            {
-                "id": "rawson",
-                "name": "Rawson",
-                "surge_factor": 1.0,
-                "demand": "low"
-            },
-            {
-                "id": "pocito",
-                "name": "Pocito",
-                "surge_factor": 1.3,
-                "demand": "high"
+                "id": zone.id,
+                "name": zone.name,
+                "surge_factor": snapshot.zones[zone.id].surge_factor,
+                "demand": snapshot.zones[zone.id].demand
             }
+            for zone in SAN_JUAN_ZONES
         ]
     }
 
+# Re-encoded only when a zone's surge or demand level changes, not on every
+# tick, so clients keep getting 304s while prices are stable
+zones_payload = VersionedPayload(
+    _zones_content,
+    version=_zone_surge_key,
+    cache_control=f"public, max-age={int(SURGE_TICK_SECONDS)}"
+)
+
+@app.get("/san-juan/references")
+async def get_san_juan_references(request: Request):
+    """Get popular location references in San Juan."""
+    return references_payload.respond(request)
+
+@app.get("/san-juan/zones")
+async def get_san_juan_zones(request: Request):
+    """Get zones/districts in San Juan with surge pricing info."""
+    return zones_payload.respond(request)
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
+    metrics.count_unhandled(exc)
     return JSONResponse(
         status_code=500,
         content={
@@ -165,10 +260,11 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
+    # Single process, no reload; start_server.py handles development reload
+    # and multi-worker production
     uvicorn.run(
         app, 
         host="0.0.0.0", 
         port=8000,
-        reload=True,  # For development
         log_level="info"
     )
\ No newline at end of file
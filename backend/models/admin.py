@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# Pydantic models
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None  # 0..1
+    route_pattern: Optional[str] = None  # regex on the path, "" for all paths
+    interval_ms: Optional[float] = None
@@ -1,23 +1,23 @@
-from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, String, Float, Integer, Boolean, Date, DateTime, Text, ForeignKey, Enum
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from database import Base
 from pydantic import BaseModel
 from typing import Optional
-
-Base = declarative_base()
+from models.trip import VehicleType
 
 class Driver(Base):
     __tablename__ = "drivers"
     
     id = Column(String, primary_key=True)
-    user_id = Column(String, ForeignKey('users.id'), nullable=False)
+    user_id = Column(String, ForeignKey('users.id'), unique=True, nullable=False)
     license_number = Column(String(50), unique=True, nullable=False)
     vehicle_make = Column(String(50), nullable=False)
     vehicle_model = Column(String(50), nullable=False)
     vehicle_color = Column(String(30), nullable=False)
     vehicle_year = Column(Integer, nullable=False)
     license_plate = Column(String(20), unique=True, nullable=False)
+    vehicle_type = Column(Enum(VehicleType), nullable=False, default=VehicleType.ECONOMY)  # trip class served
     rating = Column(Float, default=5.0)
     trip_count = Column(Integer, default=0)
     is_active = Column(Boolean, default=False)
@@ -25,8 +25,19 @@ class Driver(Base):
     current_latitude = Column(Float, nullable=True)
     current_longitude = Column(Float, nullable=True)
     last_location_update = Column(DateTime, nullable=True)
+    online_since = Column(DateTime, nullable=True)  # start of the current online session
     created_at = Column(DateTime, default=datetime.utcnow)
     
+class DriverDailyEarnings(Base):
+    """Per-driver, per-day totals (San Juan local date), kept up to date incrementally."""
+    __tablename__ = "driver_daily_earnings"
+    
+    driver_id = Column(String, ForeignKey('drivers.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    trips = Column(Integer, nullable=False, default=0)
+    gross_fare = Column(Float, nullable=False, default=0.0)
+    online_seconds = Column(Integer, nullable=False, default=0)
+    
 class DriverDocument(Base):
     __tablename__ = "driver_documents"
     
@@ -45,6 +56,7 @@ class DriverCreate(BaseModel):
     vehicle_color: str
     vehicle_year: int
     license_plate: str
+    vehicle_type: str = "economy"
 
 class DriverLocationUpdate(BaseModel):
     latitude: float
@@ -59,6 +71,7 @@ class DriverResponse(BaseModel):
     vehicle_color: str
     vehicle_year: int
     license_plate: str
+    vehicle_type: VehicleType
     rating: float
     trip_count: int
     is_active: bool
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# Pydantic models
+class PlaceSuggestion(BaseModel):
+    name: str
+    address: str
+    reference: Optional[str] = None
+    latitude: float
+    longitude: float
+    category: Optional[str] = None
+    source: str  # landmark | history
+    distance_km: Optional[float] = None
@@ -1,13 +1,11 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, Text, ForeignKey, Enum
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, String, Float, Integer, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from database import Base
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import enum
 
-Base = declarative_base()
-
 class TripStatus(enum.Enum):
     PENDING = "pending"
     DRIVER_ASSIGNED = "driver_assigned"
@@ -16,6 +14,13 @@ class TripStatus(enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+# A driver is serving the trip
+ACTIVE_STATUSES = {
+    TripStatus.DRIVER_ASSIGNED,
+    TripStatus.DRIVER_ARRIVING,
+    TripStatus.IN_PROGRESS,
+}
+
 class VehicleType(enum.Enum):
     ECONOMY = "economy"
     COMFORT = "comfort"
@@ -40,6 +45,7 @@ class Trip(Base):
     pickup_location_id = Column(String, ForeignKey('locations.id'), nullable=False)
     dropoff_location_id = Column(String, ForeignKey('locations.id'), nullable=False)
     status = Column(Enum(TripStatus), default=TripStatus.PENDING)
+    version = Column(Integer, nullable=False, default=1)  # bumped by every status transition
     vehicle_type = Column(Enum(VehicleType), nullable=False)
     estimated_fare = Column(Float, nullable=False)
     actual_fare = Column(Float, nullable=True)
@@ -56,9 +62,21 @@ class Trip(Base):
     notes = Column(Text, nullable=True)
     payment_method_id = Column(String, nullable=False)
     
-    # Relationships
-    pickup_location = relationship("Location", foreign_keys=[pickup_location_id])
-    dropoff_location = relationship("Location", foreign_keys=[dropoff_location_id])
+    # Relationships (selectin: one extra query per batch of trips, never per trip)
+    pickup_location = relationship("Location", foreign_keys=[pickup_location_id], lazy="selectin")
+    dropoff_location = relationship("Location", foreign_keys=[dropoff_location_id], lazy="selectin")
+    
+    __table_args__ = (
+        # Trip history: keyset pagination walks this index newest-first
+        Index("ix_trips_passenger_created_id", "passenger_id", "created_at", "id"),
+        # At most one active trip per driver, whoever claims it
+        Index(
+            "uq_trips_driver_active", "driver_id",
+            unique=True,
+            postgresql_where=status.in_(ACTIVE_STATUSES),
+            sqlite_where=status.in_(ACTIVE_STATUSES),
+        ),
+    )
 
 # Pydantic models
 class LocationModel(BaseModel):
@@ -68,6 +86,9 @@ class LocationModel(BaseModel):
     reference: Optional[str] = None
     postal_code: Optional[str] = None
 
+    class Config:
+        from_attributes = True
+
 class TripCreate(BaseModel):
     pickup_location: LocationModel
     dropoff_location: LocationModel
@@ -75,6 +96,7 @@ class TripCreate(BaseModel):
     scheduled_time: Optional[datetime] = None
     notes: Optional[str] = None
     payment_method_id: str
+    fare_quote: Optional[str] = None  # from /trips/estimate-fare, keeps the quoted surge
 
 class TripSearch(BaseModel):
     pickup_location: LocationModel
@@ -96,6 +118,7 @@ class DriverMatch(BaseModel):
     location: LocationModel
     estimated_arrival: int  # minutes
     distance: float  # km to pickup
+    match_score: Optional[float] = None  # 0-1, see docs/ALGORITHMS_SPECIFICATION.md
 
 class FareEstimate(BaseModel):
     base_fare: float
@@ -104,6 +127,44 @@ class FareEstimate(BaseModel):
     surge_factor: float
     total_fare: float
     currency: str = "ARS"
+    surge_snapshot_id: Optional[int] = None
+    # Only for signed-in passengers; send with /trips/create before it expires
+    fare_quote: Optional[str] = None
+    fare_quote_expires_at: Optional[datetime] = None
+
+class RoutePair(BaseModel):
+    pickup_location: LocationModel
+    dropoff_location: LocationModel
+
+class FareBatchRequest(BaseModel):
+    routes: List[RoutePair]
+    vehicle_types: List[str] = ["economy", "comfort", "xl"]
+
+class FareTable(BaseModel):
+    # Row i is routes[i]; total_fares[i][j] is the fare for vehicle_types[j]
+    vehicle_types: List[str]
+    surge_snapshot_id: int
+    surge_factors: List[float]
+    distance_km: List[float]
+    duration_minutes: List[int]
+    total_fares: List[List[float]]
+    currency: str = "ARS"
+
+class TripSummary(BaseModel):
+    # List-view projection; fetch /trips/{id} for the full TripResponse
+    id: str
+    status: str
+    vehicle_type: str
+    pickup_address: str
+    dropoff_address: str
+    estimated_fare: float
+    actual_fare: Optional[float]
+    created_at: datetime
+    completed_at: Optional[datetime]
+
+class TripPage(BaseModel):
+    items: List[TripSummary]
+    next_cursor: Optional[str] = None  # opaque; pass back as ?cursor= for the next page
 
 class TripResponse(BaseModel):
     id: str
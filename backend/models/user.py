@@ -1,11 +1,9 @@
 from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+from database import Base
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 
-Base = declarative_base()
-
 class User(Base):
     __tablename__ = "users"
     
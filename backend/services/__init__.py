@@ -0,0 +1 @@
+# Services Package
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Pre-encoded JSON responses with strong ETags.
+
+Read-mostly payloads (San Juan references, zone surge) are serialized once
+and kept as bytes together with their ETag. A request whose If-None-Match
+matches gets an empty 304; everything else gets the stored bytes as-is.
+Versioned payloads are rebuilt only when their version key changes.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def encode_json(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class EncodedPayload:
+    """One JSON body, serialized up front."""
+
+    def __init__(self, content: Any, cache_control: str):
+        self.body = encode_json(content)
+        self.etag = strong_etag(self.body)
+        self.cache_control = cache_control
+
+    def respond(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+class VersionedPayload:
+    """EncodedPayload that is rebuilt whenever `version()` returns a new key."""
+
+    def __init__(
+        self,
+        build: Callable[[], Any],
+        version: Callable[[], Hashable],
+        cache_control: str,
+    ):
+        self._build = build
+        self._version = version
+        self.cache_control = cache_control
+        self._key: Optional[Hashable] = None
+        self._payload: Optional[EncodedPayload] = None
+        self.rebuilds = 0
+
+    def current(self) -> EncodedPayload:
+        key = self._version()
+        if self._payload is None or key != self._key:
+            self._payload = EncodedPayload(self._build(), self.cache_control)
+            self._key = key
+            self.rebuilds += 1
+        return self._payload
+
+    def respond(self, request: Request) -> Response:
+        return self.current().respond(request)
@@ -0,0 +1,436 @@
+"""
+Batched dispatch: assign pending trips to idle drivers together.
+
+Offering each request to its nearest driver as it arrives makes poor
+city-wide choices at peak (an early trip takes the only driver a later one
+could have used). In batched mode the dispatcher collects pending trips and
+idle drivers over a short window and solves one minimum-cost assignment.
+
+Each trip only considers its DISPATCH_CANDIDATES nearest drivers, so the
+cost matrix is sparse. Pair cost is the pickup ETA in minutes minus
+DISPATCH_SCORE_MINUTES times the matching score, so a better rated, more
+local driver is worth a few extra minutes of pickup.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import or_, select
+
+from database import SessionLocal
+from models.driver import Driver
+from models.trip import Location, Trip, TripStatus
+from services.fleet_index import DRIVER_EN_ROUTE, FleetIndex, fleet_index
+from services.geo import haversine_distance_array
+from services.matching import UNKNOWN_CODE, VEHICLE_TYPE_CODES, CandidateBatch, candidate_record, score_candidates
+from services.trip_events import trip_events
+from services.trip_state import ACTIVE_STATUSES, DriverUnavailable, TransitionConflict, TripNotFound, transition_trip
+
+logger = logging.getLogger(__name__)
+
+# "offer": drivers accept trips themselves; "batched": the dispatcher assigns them
+DISPATCH_MODE = os.getenv("DISPATCH_MODE", "offer")
+DISPATCH_WINDOW_SECONDS = float(os.getenv("DISPATCH_WINDOW_SECONDS", 2.0))
+DISPATCH_CANDIDATES = int(os.getenv("DISPATCH_CANDIDATES", 12))
+DISPATCH_MAX_ROUNDS = int(os.getenv("DISPATCH_MAX_ROUNDS", 4))
+DISPATCH_MAX_PICKUP_KM = float(os.getenv("DISPATCH_MAX_PICKUP_KM", 10.0))
+DISPATCH_MAX_BATCH_TRIPS = int(os.getenv("DISPATCH_MAX_BATCH_TRIPS", 1000))
+
+# Minutes of pickup time a perfect matching score is worth
+DISPATCH_SCORE_MINUTES = float(os.getenv("DISPATCH_SCORE_MINUTES", 4.0))
+
+PICKUP_SPEED_KMH = 30
+
+
+@dataclass
+class CandidateEdges:
+    """Sparse (trip, driver) pairs, sorted by trip."""
+    trips: np.ndarray
+    drivers: np.ndarray
+    eta_minutes: np.ndarray
+    score: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.trips)
+
+    @property
+    def cost(self) -> np.ndarray:
+        return self.eta_minutes - DISPATCH_SCORE_MINUTES * self.score
+
+
+def _k_smallest(distance: np.ndarray, k: int):
+    """(row, column) of the `k` smallest finite entries of every row."""
+    k = min(k, distance.shape[1])
+    if not k:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if k < distance.shape[1]:
+        columns = np.argpartition(distance, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(k), distance.shape)
+    reachable = np.isfinite(np.take_along_axis(distance, columns, axis=1))
+    rows = np.broadcast_to(np.arange(len(distance))[:, None], columns.shape)
+    return rows[reachable], columns[reachable]
+
+
+def build_candidates(
+    pickup_latitudes: np.ndarray,
+    pickup_longitudes: np.ndarray,
+    drivers: CandidateBatch,
+    per_trip: int = DISPATCH_CANDIDATES,
+    max_pickup_km: float = DISPATCH_MAX_PICKUP_KM,
+    now: Optional[float] = None,
+    vehicle_types: Optional[np.ndarray] = None,
+) -> CandidateEdges:
+    """The `per_trip` nearest available drivers of every trip, with pickup ETA and matching score.
+
+    `vehicle_types` holds each trip's VEHICLE_TYPE_CODES entry; trips then
+    only get drivers of their class.
+    """
+    pickup_latitudes = np.asarray(pickup_latitudes, dtype=np.float64)
+    pickup_longitudes = np.asarray(pickup_longitudes, dtype=np.float64)
+    available = np.flatnonzero(drivers.available)
+    latitudes, longitudes = drivers.latitude[available], drivers.longitude[available]
+
+    distance = haversine_distance_array(
+        pickup_latitudes[:, None], pickup_longitudes[:, None], latitudes[None, :], longitudes[None, :]
+    )
+    distance[distance > max_pickup_km] = np.inf
+    if vehicle_types is not None:
+        distance[np.asarray(vehicle_types)[:, None] != drivers.vehicle_type[available][None, :]] = np.inf
+    trips, columns = _k_smallest(distance, per_trip)
+    nearest = available[columns]
+
+    # One scoring pass over every edge
+    scored = score_candidates(
+        drivers.take(nearest), pickup_latitudes[trips], pickup_longitudes[trips],
+        now=now, max_distance_km=max_pickup_km,
+    )
+    return CandidateEdges(
+        trips=trips,
+        drivers=nearest,
+        eta_minutes=scored.distance_km / PICKUP_SPEED_KMH * 60,
+        score=scored.total,
+    )
+
+
+def solve_assignment(n_rows: int, n_cols: int, rows: np.ndarray, cols: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """Minimum-cost assignment over sparse (row, col, cost) edges.
+
+    Hungarian method in its shortest-augmenting-path form (Jonker-Volgenant):
+    each row is added with a Dijkstra search over reduced costs that only
+    follows candidate edges and stops at the first free column reached.
+    Every row also gets a private "unassigned" column costing more than any
+    full set of real edges, so as many rows as possible are assigned and
+    the cheapest such assignment wins. Returns the column of every row, or -1.
+    """
+    if not n_rows:
+        return np.zeros(0, dtype=np.int64)
+
+    costs = np.asarray(costs, dtype=np.float64)
+    if len(costs):
+        # Non-negative costs keep the initial zero potentials feasible
+        costs = costs - costs.min()
+        unassigned_cost = (costs.max() + 1.0) * (n_rows + 1)
+    else:
+        unassigned_cost = 1.0
+    all_rows = np.concatenate([np.asarray(rows, dtype=np.int64), np.arange(n_rows)])
+    all_cols = np.concatenate([np.asarray(cols, dtype=np.int64), n_cols + np.arange(n_rows)])
+    all_costs = np.concatenate([costs, np.full(n_rows, unassigned_cost)])
+
+    order = np.argsort(all_rows, kind="stable")
+    edge_costs = all_costs[order].tolist()
+    edge_cols = all_cols[order].tolist()
+    indptr = np.searchsorted(all_rows[order], np.arange(n_rows + 1)).tolist()
+
+    col4row = [-1] * n_rows
+    u = [0.0] * n_rows
+    v = [0.0] * (n_cols + n_rows)
+    row4col = [-1] * (n_cols + n_rows)
+    infinity = math.inf
+
+    # Row reduction: each row's potential starts at its cheapest edge, and
+    # that (tight) edge is matched right away when its column is still free.
+    # Column potentials stay 0 so columns may end up unmatched.
+    if len(costs):
+        by_row = np.lexsort((costs, rows))
+        first = by_row[np.r_[True, np.diff(np.asarray(rows)[by_row]) != 0]]
+        for row, col, cost in zip(np.asarray(rows)[first].tolist(), np.asarray(cols)[first].tolist(), costs[first].tolist()):
+            u[row] = cost
+            if row4col[col] < 0:
+                col4row[row] = col
+                row4col[col] = row
+
+    for current in range(n_rows):
+        if col4row[current] >= 0:
+            continue
+        shortest: Dict[int, float] = {}
+        path: Dict[int, int] = {}
+        settled: Dict[int, float] = {}
+        visited_rows = [current]
+        heap = []
+        row, min_value = current, 0.0
+
+        while True:
+            offset = min_value - u[row]
+            for edge in range(indptr[row], indptr[row + 1]):
+                col = edge_cols[edge]
+                if col in settled:
+                    continue
+                reduced = offset + edge_costs[edge] - v[col]
+                if reduced < shortest.get(col, infinity):
+                    shortest[col] = reduced
+                    path[col] = row
+                    heapq.heappush(heap, (reduced, col))
+
+            # Never empty: the row's own unassigned column is always reachable
+            while True:
+                distance, col = heapq.heappop(heap)
+                if col not in settled and distance <= shortest[col]:
+                    break
+            min_value = distance
+            settled[col] = distance
+            if row4col[col] < 0:
+                sink = col
+                break
+            row = row4col[col]
+            visited_rows.append(row)
+
+        # Update potentials so reduced costs stay non-negative, then augment
+        u[current] += min_value
+        for row in visited_rows[1:]:
+            u[row] += min_value - settled[col4row[row]]
+        for col, distance in settled.items():
+            v[col] -= min_value - distance
+
+        col = sink
+        while True:
+            row = path[col]
+            row4col[col] = row
+            col4row[row], col = col, col4row[row]
+            if row == current:
+                break
+
+    assignment = np.array(col4row, dtype=np.int64)
+    assignment[assignment >= n_cols] = -1
+    return assignment
+
+
+@dataclass
+class DispatchPlan:
+    drivers: np.ndarray  # driver index per trip, -1 if unassigned
+    eta_minutes: np.ndarray  # pickup ETA per trip, nan if unassigned
+    candidate_edges: int
+    rounds: int
+
+
+def plan_assignment(
+    pickup_latitudes: np.ndarray,
+    pickup_longitudes: np.ndarray,
+    drivers: CandidateBatch,
+    per_trip: int = DISPATCH_CANDIDATES,
+    max_rounds: int = DISPATCH_MAX_ROUNDS,
+    now: Optional[float] = None,
+    vehicle_types: Optional[np.ndarray] = None,
+) -> DispatchPlan:
+    """Optimal assignment over sparse candidates, re-solved for what is left.
+
+    Nearest-driver lists overlap inside a demand cluster, so one sparse
+    round can leave trips without a free candidate even though free drivers
+    exist a little farther out. Each further round gives the leftover trips
+    new candidate lists drawn only from drivers still free.
+    """
+    pickup_latitudes = np.asarray(pickup_latitudes, dtype=np.float64)
+    pickup_longitudes = np.asarray(pickup_longitudes, dtype=np.float64)
+    choice = np.full(len(pickup_latitudes), -1, dtype=np.int64)
+    eta_minutes = np.full(len(pickup_latitudes), np.nan)
+    trips_left = np.arange(len(pickup_latitudes))
+    drivers_left = np.flatnonzero(drivers.available)
+    edges_total = rounds = 0
+
+    while rounds < max_rounds and len(trips_left) and len(drivers_left):
+        rounds += 1
+        edges = build_candidates(
+            pickup_latitudes[trips_left], pickup_longitudes[trips_left], drivers.take(drivers_left),
+            per_trip=per_trip, now=now,
+            vehicle_types=None if vehicle_types is None else np.asarray(vehicle_types)[trips_left],
+        )
+        edges_total += len(edges)
+        solved = solve_assignment(len(trips_left), len(drivers_left), edges.trips, edges.drivers, edges.cost)
+        if not (solved >= 0).any():
+            break
+
+        # ETA of each chosen edge
+        edge_of = {(trip, driver): i for i, (trip, driver) in enumerate(zip(edges.trips.tolist(), edges.drivers.tolist()))}
+        for trip, driver in enumerate(solved.tolist()):
+            if driver >= 0:
+                choice[trips_left[trip]] = drivers_left[driver]
+                eta_minutes[trips_left[trip]] = edges.eta_minutes[edge_of[(trip, driver)]]
+        trips_left = trips_left[solved < 0]
+        taken = np.zeros(len(drivers_left), dtype=bool)
+        taken[solved[solved >= 0]] = True
+        drivers_left = drivers_left[~taken]
+
+    return DispatchPlan(choice, eta_minutes, edges_total, rounds)
+
+
+@dataclass
+class PendingTrip:
+    id: str
+    passenger_id: str
+    latitude: float
+    longitude: float
+    vehicle_type: str
+
+
+class BatchDispatcher:
+    def __init__(
+        self,
+        fleet: FleetIndex = fleet_index,
+        window_seconds: float = DISPATCH_WINDOW_SECONDS,
+        candidates_per_trip: int = DISPATCH_CANDIDATES,
+        max_batch_trips: int = DISPATCH_MAX_BATCH_TRIPS,
+        enabled: bool = DISPATCH_MODE == "batched",
+    ):
+        self.fleet = fleet
+        self.window_seconds = window_seconds
+        self.candidates_per_trip = candidates_per_trip
+        self.max_batch_trips = max_batch_trips
+        self.enabled = enabled
+        self.batches = 0
+        self.failed_batches = 0
+        self.trips_seen = 0
+        self.assigned = 0
+        self.conflicts = 0
+        self.last_batch_trips = 0
+        self.last_batch_drivers = 0
+        self.last_solve_ms = 0.0
+        self.last_batch_ms = 0.0
+        self.last_mean_eta_minutes = 0.0
+
+    async def _pending_trips(self, db) -> List[PendingTrip]:
+        now = datetime.utcnow()
+        rows = await db.execute(
+            select(Trip.id, Trip.passenger_id, Location.latitude, Location.longitude, Trip.vehicle_type)
+            .join(Location, Location.id == Trip.pickup_location_id)
+            .where(
+                Trip.status == TripStatus.PENDING,
+                Trip.driver_id.is_(None),
+                or_(Trip.scheduled_time.is_(None), Trip.scheduled_time <= now),
+            )
+            .order_by(Trip.created_at)
+            .limit(self.max_batch_trips)
+        )
+        return [
+            PendingTrip(trip_id, passenger_id, latitude, longitude, vehicle_type.value)
+            for trip_id, passenger_id, latitude, longitude, vehicle_type in rows
+        ]
+
+    async def _idle_drivers(self, db):
+        """(fleet positions, Driver rows) of online drivers without an active trip."""
+        positions = {position.driver_id: position for position in self.fleet.live_positions()}
+        if not positions:
+            return [], []
+        busy = select(Trip.driver_id).where(Trip.status.in_(ACTIVE_STATUSES), Trip.driver_id.is_not(None))
+        profiles = (await db.scalars(
+            select(Driver).where(
+                Driver.user_id.in_(list(positions)),
+                Driver.is_active.is_(True),
+                Driver.id.not_in(busy),
+            )
+        )).all()
+        return [positions[profile.user_id] for profile in profiles], profiles
+
+    async def dispatch_once(self) -> int:
+        """Assign the current batch of pending trips; returns how many were assigned."""
+        start = time.perf_counter()
+        assigned = []
+        async with SessionLocal() as db:
+            trips = await self._pending_trips(db)
+            positions, profiles = await self._idle_drivers(db) if trips else ([], [])
+            if not trips or not profiles:
+                return 0
+            self.last_batch_trips = len(trips)
+            self.last_batch_drivers = len(profiles)
+
+            drivers = CandidateBatch.from_records(
+                candidate_record(position, profile) for position, profile in zip(positions, profiles)
+            )
+            solve_start = time.perf_counter()
+            # CPU-bound; keep the event loop serving requests meanwhile
+            plan = await asyncio.to_thread(
+                plan_assignment,
+                np.array([trip.latitude for trip in trips]),
+                np.array([trip.longitude for trip in trips]),
+                drivers,
+                self.candidates_per_trip,
+                vehicle_types=np.array([VEHICLE_TYPE_CODES.get(trip.vehicle_type, UNKNOWN_CODE) for trip in trips]),
+            )
+            self.last_solve_ms = round((time.perf_counter() - solve_start) * 1000, 2)
+
+            etas = []
+            for trip, driver_index, eta in zip(trips, plan.drivers.tolist(), plan.eta_minutes.tolist()):
+                if driver_index < 0:
+                    continue
+                profile = profiles[driver_index]
+                try:
+                    # Cancelled or accepted by hand since it was read, or the driver
+                    # went offline or took another trip by hand: just skip it
+                    await transition_trip(
+                        db, trip.id, TripStatus.DRIVER_ASSIGNED, driver_id=profile.id, assign_driver=True
+                    )
+                except (TripNotFound, TransitionConflict, DriverUnavailable):
+                    self.conflicts += 1
+                    continue
+                assigned.append((trip, profile))
+                etas.append(eta)
+            await db.commit()
+
+        for trip, profile in assigned:
+            self.fleet.set_state(profile.user_id, DRIVER_EN_ROUTE)
+            trip_events.assign_driver(trip.id, profile.user_id)
+            trip_events.publish_status(trip.id, TripStatus.DRIVER_ASSIGNED.value, driver_id=profile.id)
+
+        self.batches += 1
+        self.trips_seen += len(trips)
+        self.assigned += len(assigned)
+        self.last_mean_eta_minutes = round(float(np.mean(etas)), 2) if etas else 0.0
+        self.last_batch_ms = round((time.perf_counter() - start) * 1000, 2)
+        return len(assigned)
+
+    async def run(self):
+        """Dispatch a batch every window; started as a background task at app startup."""
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            try:
+                await self.dispatch_once()
+            except Exception:
+                self.failed_batches += 1
+                logger.exception("Dispatch batch failed")
+
+    def stats(self) -> Dict:
+        return {
+            "mode": "batched" if self.enabled else "offer",
+            "window_seconds": self.window_seconds,
+            "candidates_per_trip": self.candidates_per_trip,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "trips_seen": self.trips_seen,
+            "assigned": self.assigned,
+            "conflicts": self.conflicts,
+            "last_batch_trips": self.last_batch_trips,
+            "last_batch_drivers": self.last_batch_drivers,
+            "last_solve_ms": self.last_solve_ms,
+            "last_batch_ms": self.last_batch_ms,
+            "last_mean_eta_minutes": self.last_mean_eta_minutes,
+        }
+
+
+dispatcher = BatchDispatcher()
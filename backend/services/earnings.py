@@ -0,0 +1,175 @@
+"""
+Daily earnings rollups.
+
+Each completed trip and each finished online session adds to one
+DriverDailyEarnings row per San Juan calendar day through an upsert in the
+caller's transaction, so the earnings dashboard reads at most `days` rows
+instead of scanning the driver's trips.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import IS_SQLITE, SessionLocal
+from models.driver import Driver, DriverDailyEarnings
+from models.trip import Trip, TripStatus
+from services.geo import SAN_JUAN_TZ
+
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert
+else:
+    from sqlalchemy.dialects.postgresql import insert
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = 200
+
+_rollups = DriverDailyEarnings.__table__
+
+
+def local_day(at: datetime) -> date:
+    """San Juan calendar day of a naive UTC timestamp."""
+    return (at + SAN_JUAN_TZ.utcoffset(None)).date()
+
+
+def split_by_day(start: datetime, end: datetime) -> List[Tuple[date, int]]:
+    """Seconds of [start, end) falling on each San Juan day."""
+    offset = SAN_JUAN_TZ.utcoffset(None)
+    parts = []
+    cursor = start
+    while cursor < end:
+        day = local_day(cursor)
+        next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()) - offset
+        chunk_end = min(end, next_midnight)
+        parts.append((day, int((chunk_end - cursor).total_seconds())))
+        cursor = chunk_end
+    return parts
+
+
+async def add_to_rollup(
+    db: AsyncSession,
+    driver_id: str,
+    day: date,
+    trips: int = 0,
+    gross_fare: float = 0.0,
+    online_seconds: int = 0,
+):
+    """Increment a day's totals, creating the row if needed. The caller commits."""
+    statement = insert(_rollups).values(
+        driver_id=driver_id,
+        day=day,
+        trips=trips,
+        gross_fare=gross_fare,
+        online_seconds=online_seconds,
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[_rollups.c.driver_id, _rollups.c.day],
+        set_={
+            "trips": _rollups.c.trips + statement.excluded.trips,
+            "gross_fare": _rollups.c.gross_fare + statement.excluded.gross_fare,
+            "online_seconds": _rollups.c.online_seconds + statement.excluded.online_seconds,
+        },
+    ))
+
+
+async def record_trip(db: AsyncSession, driver_id: str, completed_at: datetime, fare: float):
+    await add_to_rollup(db, driver_id, local_day(completed_at), trips=1, gross_fare=fare)
+
+
+async def record_online_time(db: AsyncSession, driver_id: str, start: datetime, end: datetime):
+    for day, seconds in split_by_day(start, end):
+        await add_to_rollup(db, driver_id, day, online_seconds=seconds)
+
+
+async def go_online(db: AsyncSession, driver_id: str, at: datetime):
+    """Open an online session unless one is already open. The caller commits."""
+    await db.execute(
+        update(Driver)
+        .where(Driver.id == driver_id, Driver.online_since.is_(None))
+        .values(online_since=at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def go_offline(db: AsyncSession, driver_id: str, at: datetime):
+    """Close the open session and credit its time; no-op if none is open.
+
+    Clearing `online_since` is a compare-and-set on the value that was read,
+    so two concurrent offline toggles cannot both credit the same session.
+    """
+    since = await db.scalar(select(Driver.online_since).where(Driver.id == driver_id))
+    if since is None:
+        return
+    result = await db.execute(
+        update(Driver)
+        .where(Driver.id == driver_id, Driver.online_since == since)
+        .values(online_since=None)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        await record_online_time(db, driver_id, since, at)
+
+
+async def read_range(
+    db: AsyncSession,
+    driver_id: str,
+    first_day: date,
+    last_day: date,
+) -> Dict[date, DriverDailyEarnings]:
+    rows = await db.scalars(
+        select(DriverDailyEarnings)
+        .where(
+            DriverDailyEarnings.driver_id == driver_id,
+            DriverDailyEarnings.day >= first_day,
+            DriverDailyEarnings.day <= last_day,
+        )
+    )
+    return {row.day: row for row in rows}
+
+
+async def rebuild_trip_rollups(chunk_size: int = BACKFILL_CHUNK_SIZE, driver_id: Optional[str] = None) -> int:
+    """Recompute trips and gross fare from the trips table, `chunk_size` drivers per transaction.
+
+    Online time is not derivable from trips and is left untouched.
+    Returns the number of drivers processed.
+    """
+    processed = 0
+    last_driver_id = ""
+    while True:
+        async with SessionLocal() as db:
+            query = select(Driver.id).where(Driver.id > last_driver_id).order_by(Driver.id).limit(chunk_size)
+            if driver_id is not None:
+                query = query.where(Driver.id == driver_id)
+            driver_ids = list(await db.scalars(query))
+            if not driver_ids:
+                return processed
+
+            totals: Dict[Tuple[str, date], List] = {}
+            trips = await db.stream(
+                select(Trip.driver_id, Trip.completed_at, Trip.actual_fare, Trip.estimated_fare)
+                .where(Trip.driver_id.in_(driver_ids), Trip.status == TripStatus.COMPLETED)
+                .execution_options(yield_per=1000)
+            )
+            async for trip_driver_id, completed_at, actual_fare, estimated_fare in trips:
+                if completed_at is None:
+                    continue
+                entry = totals.setdefault((trip_driver_id, local_day(completed_at)), [0, 0.0])
+                entry[0] += 1
+                entry[1] += actual_fare if actual_fare is not None else estimated_fare
+
+            await db.execute(
+                update(DriverDailyEarnings)
+                .where(DriverDailyEarnings.driver_id.in_(driver_ids))
+                .values(trips=0, gross_fare=0.0)
+            )
+            for (rollup_driver_id, day), (trip_count, gross_fare) in totals.items():
+                await add_to_rollup(db, rollup_driver_id, day, trips=trip_count, gross_fare=gross_fare)
+            await db.commit()
+
+        processed += len(driver_ids)
+        last_driver_id = driver_ids[-1]
+        logger.info("Rebuilt earnings rollups for %d drivers", processed)
@@ -0,0 +1,273 @@
+"""
+In-memory spatial index of live driver positions.
+
+Drivers are bucketed into a uniform lat/lng grid so radius and k-nearest
+queries only look at the cells around the pickup point instead of scanning
+the whole fleet.
+"""
+
+import heapq
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services.geo import KM_PER_DEGREE_LAT, haversine_distance, km_per_degree_lng
+
+# ~1.1 km north-south, ~0.95 km east-west at San Juan's latitude
+DEFAULT_CELL_SIZE_DEG = 0.01
+
+# Positions older than this are treated as offline (app killed, no signal)
+DEFAULT_STALE_AFTER_SECONDS = 120.0
+
+# Set by start_server.py when it forks several workers
+FLEET_SHARED = os.getenv("FLEET_SHARED", "false").lower() == "true"
+
+# Driver states tracked next to positions; they set the location reporting cadence
+DRIVER_OFFLINE = "offline"
+DRIVER_IDLE = "idle"
+DRIVER_EN_ROUTE = "en_route"  # assigned, heading to the pickup
+DRIVER_IN_TRIP = "in_trip"
+DRIVER_STATES = (DRIVER_OFFLINE, DRIVER_IDLE, DRIVER_EN_ROUTE, DRIVER_IN_TRIP)
+
+Cell = Tuple[int, int]
+
+
+@dataclass
+class DriverPosition:
+    driver_id: str
+    latitude: float
+    longitude: float
+    updated_at: float
+    cell: Cell
+    zone_id: Optional[str] = None
+
+
+class FleetIndex:
+    """Uniform grid of driver positions answering radius and k-nearest queries."""
+
+    def __init__(
+        self,
+        cell_size_deg: float = DEFAULT_CELL_SIZE_DEG,
+        stale_after_seconds: float = DEFAULT_STALE_AFTER_SECONDS,
+    ):
+        self.cell_size_deg = cell_size_deg
+        self.stale_after_seconds = stale_after_seconds
+        self._positions: Dict[str, DriverPosition] = {}
+        self._cells: Dict[Cell, Dict[str, DriverPosition]] = {}
+        # Drivers never seen in a transition count as idle
+        self._states: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._positions
+
+    def _cell_for(self, latitude: float, longitude: float) -> Cell:
+        return (
+            math.floor(latitude / self.cell_size_deg),
+            math.floor(longitude / self.cell_size_deg),
+        )
+
+    def update(
+        self,
+        driver_id: str,
+        latitude: float,
+        longitude: float,
+        timestamp: Optional[float] = None,
+        zone_id: Optional[str] = None,
+    ) -> Optional[DriverPosition]:
+        """Insert or move a driver. O(1). Ignored (None) for drivers who went offline."""
+        if self._states.get(driver_id) == DRIVER_OFFLINE:
+            return None
+        updated_at = time.time() if timestamp is None else timestamp
+        cell = self._cell_for(latitude, longitude)
+        position = self._positions.get(driver_id)
+
+        if position is None:
+            position = DriverPosition(driver_id, latitude, longitude, updated_at, cell, zone_id)
+            self._positions[driver_id] = position
+            self._cells.setdefault(cell, {})[driver_id] = position
+            return position
+
+        if position.cell != cell:
+            self._discard_from_cell(position)
+            position.cell = cell
+            self._cells.setdefault(cell, {})[driver_id] = position
+
+        position.latitude = latitude
+        position.longitude = longitude
+        position.updated_at = updated_at
+        position.zone_id = zone_id
+        return position
+
+    def remove(self, driver_id: str) -> bool:
+        """Remove a driver from the index (went offline) until set back online."""
+        self._states[driver_id] = DRIVER_OFFLINE
+        return self._evict(driver_id)
+
+    def _evict(self, driver_id: str) -> bool:
+        """Forget a driver's position but not their state; the next ping puts them back."""
+        position = self._positions.pop(driver_id, None)
+        if position is None:
+            return False
+        self._discard_from_cell(position)
+        return True
+
+    def get(self, driver_id: str) -> Optional[DriverPosition]:
+        return self._positions.get(driver_id)
+
+    def state(self, driver_id: str) -> str:
+        return self._states.get(driver_id, DRIVER_IDLE)
+
+    def set_state(self, driver_id: str, state: str):
+        if state == DRIVER_OFFLINE:
+            self.remove(driver_id)
+        else:
+            self._states[driver_id] = state
+
+    def live_positions(self) -> List[DriverPosition]:
+        """Every non-stale position. O(fleet), meant for periodic ticks."""
+        now = time.time()
+        return [position for position in self._positions.values() if not self._is_stale(position, now)]
+
+    def count_by_zone(self) -> Dict[str, int]:
+        """Online (non-stale) drivers per zone. O(fleet), meant for periodic ticks."""
+        now = time.time()
+        counts: Dict[str, int] = {}
+        for position in self._positions.values():
+            if position.zone_id is None or self._is_stale(position, now):
+                continue
+            counts[position.zone_id] = counts.get(position.zone_id, 0) + 1
+        return counts
+
+    def _discard_from_cell(self, position: DriverPosition):
+        bucket = self._cells.get(position.cell)
+        if bucket is None:
+            return
+        bucket.pop(position.driver_id, None)
+        if not bucket:
+            del self._cells[position.cell]
+
+    def _is_stale(self, position: DriverPosition, now: float) -> bool:
+        return now - position.updated_at > self.stale_after_seconds
+
+    def _ring(self, center: Cell, radius: int) -> Iterator[Cell]:
+        """Cells at Chebyshev distance `radius` from `center`."""
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield (ci - radius, j)
+            yield (ci + radius, j)
+        for i in range(ci - radius + 1, ci + radius):
+            yield (i, cj - radius)
+            yield (i, cj + radius)
+
+    def _scan_cells(
+        self,
+        cells,
+        latitude: float,
+        longitude: float,
+        now: float,
+        stale: List[str],
+    ) -> Iterator[Tuple[float, DriverPosition]]:
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if not bucket:
+                continue
+            for position in bucket.values():
+                if self._is_stale(position, now):
+                    stale.append(position.driver_id)
+                    continue
+                distance = haversine_distance(latitude, longitude, position.latitude, position.longitude)
+                yield distance, position
+
+    def _drop(self, driver_ids: List[str]):
+        # Stale is not offline: a late ping from a driver mid-trip must still count
+        for driver_id in driver_ids:
+            self._evict(driver_id)
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[DriverPosition, float]]:
+        """Drivers within `radius_km` of a point, nearest first."""
+        now = time.time()
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / max(km_per_degree_lng(latitude), 1e-6)
+        min_i, min_j = self._cell_for(latitude - lat_span, longitude - lng_span)
+        max_i, max_j = self._cell_for(latitude + lat_span, longitude + lng_span)
+        cells = ((i, j) for i in range(min_i, max_i + 1) for j in range(min_j, max_j + 1))
+
+        stale: List[str] = []
+        matches = [
+            (distance, position)
+            for distance, position in self._scan_cells(cells, latitude, longitude, now, stale)
+            if distance <= radius_km
+        ]
+        self._drop(stale)
+
+        if limit is not None:
+            matches = heapq.nsmallest(limit, matches, key=lambda match: match[0])
+        else:
+            matches.sort(key=lambda match: match[0])
+        return [(position, distance) for distance, position in matches]
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_radius_km: float = 15.0,
+    ) -> List[Tuple[DriverPosition, float]]:
+        """The `k` nearest drivers within `max_radius_km`, nearest first.
+
+        Expands ring by ring around the pickup cell and stops as soon as the
+        k-th candidate is provably closer than anything in the next ring.
+        """
+        if k <= 0:
+            return []
+
+        now = time.time()
+        center = self._cell_for(latitude, longitude)
+        # Smallest cell side in km bounds the distance to the next ring
+        cell_km = self.cell_size_deg * min(KM_PER_DEGREE_LAT, km_per_degree_lng(latitude))
+        max_rings = int(math.ceil(max_radius_km / cell_km)) + 1
+
+        stale: List[str] = []
+        candidates: List[Tuple[float, DriverPosition]] = []
+        for ring in range(max_rings + 1):
+            for distance, position in self._scan_cells(self._ring(center, ring), latitude, longitude, now, stale):
+                if distance <= max_radius_km:
+                    candidates.append((distance, position))
+
+            if len(candidates) >= k:
+                candidates = heapq.nsmallest(k, candidates, key=lambda match: match[0])
+                if candidates[-1][0] <= ring * cell_km:
+                    break
+        self._drop(stale)
+
+        candidates.sort(key=lambda match: match[0])
+        return [(position, distance) for distance, position in candidates[:k]]
+
+    def stats(self) -> Dict:
+        return {"backend": "process", "drivers": len(self)}
+
+
+def _create_fleet_index():
+    if not FLEET_SHARED:
+        return FleetIndex()
+    from services.shared_fleet import SharedFleetTable
+    from services.zones import SAN_JUAN_ZONES
+    return SharedFleetTable.create(zone_ids=[zone.id for zone in SAN_JUAN_ZONES])
+
+
+# Fed by PUT /drivers/location; one table shared by all workers when forked
+fleet_index = _create_fleet_index()
@@ -0,0 +1,42 @@
+import math
+from datetime import timedelta, timezone
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Argentina (ART) has no DST
+SAN_JUAN_TZ = timezone(timedelta(hours=-3))
+
+# Kilometres per degree of latitude (constant) and of longitude at the equator
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in km between two coordinates."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def km_per_degree_lng(latitude: float) -> float:
+    """Kilometres per degree of longitude at the given latitude."""
+    return KM_PER_DEGREE_LAT * math.cos(math.radians(latitude))
+
+
+def haversine_distance_array(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of coordinates.
+
+    `lat`/`lng` may also be arrays, broadcast against `lats`/`lngs`.
+    """
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lngs) - np.radians(lng)
+
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
@@ -0,0 +1,137 @@
+"""
+Write-behind persistence for driver location pings.
+
+PUT /drivers/location updates the live fleet index immediately and hands the
+ping to this pipeline, which keeps only the newest point per driver and
+writes them all with one executemany UPDATE per batch every flush interval.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Tuple
+
+from sqlalchemy import bindparam
+
+from database import SessionLocal
+from models.driver import Driver
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FLUSH_INTERVAL = float(os.getenv("LOCATION_FLUSH_INTERVAL", 2.0))
+LOCATION_FLUSH_BATCH_SIZE = int(os.getenv("LOCATION_FLUSH_BATCH_SIZE", 1000))
+LOCATION_MAX_PENDING = int(os.getenv("LOCATION_MAX_PENDING", 20000))
+
+_drivers = Driver.__table__
+
+UPDATE_DRIVER_LOCATION = (
+    _drivers.update()
+    .where(_drivers.c.user_id == bindparam("b_user_id"))
+    .values(
+        current_latitude=bindparam("b_latitude"),
+        current_longitude=bindparam("b_longitude"),
+        last_location_update=bindparam("b_updated_at"),
+    )
+)
+
+Ping = Tuple[float, float, datetime]
+
+
+class LocationIngest:
+    def __init__(
+        self,
+        flush_interval: float = LOCATION_FLUSH_INTERVAL,
+        batch_size: int = LOCATION_FLUSH_BATCH_SIZE,
+        max_pending: int = LOCATION_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: Dict[str, Ping] = {}
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, driver_user_id: str, latitude: float, longitude: float, at: datetime = None) -> bool:
+        """Queue a ping, replacing any unflushed one from the same driver. O(1)."""
+        self.received += 1
+        if driver_user_id in self._pending:
+            self.coalesced += 1
+        elif len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending[driver_user_id] = (latitude, longitude, at or datetime.utcnow())
+        return True
+
+    def _requeue(self, batch: Dict[str, Ping]):
+        # Keep the batch unless a newer ping arrived meanwhile
+        for user_id, ping in batch.items():
+            self._pending.setdefault(user_id, ping)
+
+    async def flush(self) -> int:
+        """Persist everything pending; returns the number of drivers written."""
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        rows = [
+            {"b_user_id": user_id, "b_latitude": lat, "b_longitude": lng, "b_updated_at": at}
+            for user_id, (lat, lng, at) in batch.items()
+        ]
+
+        start = time.perf_counter()
+        written = 0
+        try:
+            async with SessionLocal() as db:
+                for offset in range(0, len(rows), self.batch_size):
+                    await db.execute(UPDATE_DRIVER_LOCATION, rows[offset:offset + self.batch_size])
+                await db.commit()
+            written = len(rows)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Location flush failed, requeueing %d pings", len(rows))
+            self._requeue(batch)
+        except BaseException:
+            # Cancelled mid-write (shutdown): the final flush() writes it instead
+            self._requeue(batch)
+            raise
+        finally:
+            self.flushes += 1
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        self.written += written
+        return written
+
+    async def run(self):
+        """Flush forever; started as a background task at app startup."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "batch_size": self.batch_size,
+            "max_pending": self.max_pending,
+            "pending": len(self._pending),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+location_ingest = LocationIngest()
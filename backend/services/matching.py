@@ -0,0 +1,261 @@
+"""
+Driver-passenger matching score for San Juan (see docs/ALGORITHMS_SPECIFICATION.md).
+
+Candidate attributes are held column-wise in NumPy arrays so the five
+weighted factors are computed for the whole candidate set in one pass:
+
+    proximity 35% · quality 25% · local knowledge 20% · availability 15% · preferences 5%
+"""
+
+import enum
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+import numpy as np
+
+from services.geo import SAN_JUAN_TZ, haversine_distance_array
+
+# Factor weights
+PROXIMITY_WEIGHT = 0.35
+QUALITY_WEIGHT = 0.25
+LOCAL_KNOWLEDGE_WEIGHT = 0.20
+AVAILABILITY_WEIGHT = 0.15
+PREFERENCE_WEIGHT = 0.05
+
+# Proximity buckets: [0,1) km -> 1.0, [1,2) -> 0.9, ... [12,inf) -> 0.05
+PROXIMITY_EDGES_KM = np.array([1.0, 2.0, 3.0, 5.0, 8.0, 12.0])
+PROXIMITY_SCORES = np.array([1.0, 0.9, 0.8, 0.6, 0.4, 0.2, 0.05])
+
+# Drivers farther than this are never offered the trip
+MAX_MATCH_DISTANCE_KM = 15.0
+
+VEHICLE_TYPE_CODES = {"economy": 0, "comfort": 1, "xl": 2}
+GENDER_CODES = {"female": 1, "male": 2, "other": 3}
+LANGUAGE_BITS = {"es": 1, "en": 2, "pt": 4, "it": 8, "fr": 16}
+
+ALL_HOURS_MASK = (1 << 24) - 1
+UNKNOWN_CODE = -1
+
+
+class UrgencyLevel(enum.Enum):
+    LOW = "low"
+    NORMAL = "normal"
+    HIGH = "high"
+
+
+@dataclass
+class UserPreferences:
+    favorite_drivers: Set[str] = field(default_factory=set)
+    preferred_vehicle_types: Set[str] = field(default_factory=set)
+    preferred_gender: Optional[str] = None
+    preferred_language: Optional[str] = None
+
+
+# Column name -> (dtype, default used when a record omits it)
+CANDIDATE_COLUMNS = {
+    "latitude": (np.float64, np.nan),
+    "longitude": (np.float64, np.nan),
+    "rating": (np.float64, 5.0),
+    "experience_months": (np.float64, 0.0),
+    "trips_completed": (np.float64, 0.0),
+    "san_juan_experience_months": (np.float64, 0.0),
+    "san_juan_trips_completed": (np.float64, 0.0),
+    "street_knowledge_rating": (np.float64, 5.0),
+    "last_active_at": (np.float64, 0.0),
+    "acceptance_rate": (np.float64, 1.0),
+    "cancellation_rate": (np.float64, 0.0),
+    "active_hours_mask": (np.int64, ALL_HOURS_MASK),
+    "vehicle_type": (np.int8, UNKNOWN_CODE),
+    "gender": (np.int8, UNKNOWN_CODE),
+    "languages": (np.int64, LANGUAGE_BITS["es"]),
+    "available": (np.bool_, True),
+}
+
+
+class CandidateBatch:
+    """Column-oriented set of driver candidates.
+
+    `last_active_at` is a Unix timestamp, `active_hours_mask` has bit `h` set
+    when the driver usually works at local hour `h`, and `vehicle_type`,
+    `gender` and `languages` are encoded with the *_CODES / LANGUAGE_BITS maps.
+    """
+
+    def __init__(self, driver_ids, **columns):
+        self.driver_ids = np.asarray(driver_ids, dtype=object)
+        size = len(self.driver_ids)
+        for name, (dtype, default) in CANDIDATE_COLUMNS.items():
+            values = columns.pop(name, None)
+            if values is None:
+                array = np.full(size, default, dtype=dtype)
+            else:
+                array = np.asarray(values, dtype=dtype)
+                if array.shape != (size,):
+                    raise ValueError(f"Column {name} has shape {array.shape}, expected ({size},)")
+            setattr(self, name, array)
+        if columns:
+            raise ValueError(f"Unknown candidate columns: {', '.join(sorted(columns))}")
+
+    def __len__(self) -> int:
+        return len(self.driver_ids)
+
+    def take(self, indices) -> "CandidateBatch":
+        """Sub-batch of the given rows (repeats allowed)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return CandidateBatch(
+            self.driver_ids[indices],
+            **{name: getattr(self, name)[indices] for name in CANDIDATE_COLUMNS},
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "CandidateBatch":
+        """Build a batch from per-driver dicts (must include `driver_id`)."""
+        records = list(records)
+        columns = {}
+        for name, (dtype, default) in CANDIDATE_COLUMNS.items():
+            columns[name] = np.fromiter(
+                (record.get(name, default) for record in records),
+                dtype=dtype,
+                count=len(records),
+            )
+        return cls([record["driver_id"] for record in records], **columns)
+
+
+@dataclass
+class MatchScores:
+    distance_km: np.ndarray
+    proximity: np.ndarray
+    quality: np.ndarray
+    local_knowledge: np.ndarray
+    availability: np.ndarray
+    preferences: np.ndarray
+    total: np.ndarray
+    eligible: np.ndarray
+
+    def breakdown(self, index: int) -> Dict[str, float]:
+        return {
+            "proximity": float(self.proximity[index]),
+            "quality": float(self.quality[index]),
+            "local_knowledge": float(self.local_knowledge[index]),
+            "availability": float(self.availability[index]),
+            "preferences": float(self.preferences[index]),
+        }
+
+
+def candidate_record(position, profile=None, available: bool = True) -> Dict:
+    """Matching attributes for a fleet-index position and its Driver row (if registered).
+
+    `available` is False for drivers already heading to or serving a trip.
+    """
+    record = {
+        "driver_id": position.driver_id,
+        "latitude": position.latitude,
+        "longitude": position.longitude,
+        "last_active_at": position.updated_at,
+        "available": available,
+    }
+    if profile is not None:
+        experience_months = (datetime.utcnow() - profile.created_at).days / 30.0
+        record.update(
+            rating=profile.rating,
+            street_knowledge_rating=profile.rating,
+            experience_months=experience_months,
+            trips_completed=profile.trip_count,
+            san_juan_experience_months=experience_months,
+            san_juan_trips_completed=profile.trip_count,
+            vehicle_type=VEHICLE_TYPE_CODES.get(profile.vehicle_type.value, UNKNOWN_CODE),
+        )
+    return record
+
+
+def score_candidates(
+    batch: CandidateBatch,
+    pickup_latitude: float,
+    pickup_longitude: float,
+    now: Optional[float] = None,
+    preferences: Optional[UserPreferences] = None,
+    urgency: UrgencyLevel = UrgencyLevel.NORMAL,
+    max_distance_km: float = MAX_MATCH_DISTANCE_KM,
+    vehicle_type: Optional[str] = None,
+) -> MatchScores:
+    """Score every candidate in the batch against a pickup point.
+
+    With `vehicle_type`, only drivers of that trip class are eligible.
+    """
+    now = time.time() if now is None else now
+    preferences = preferences or UserPreferences()
+
+    # 1. Proximity (35%)
+    distance_km = haversine_distance_array(pickup_latitude, pickup_longitude, batch.latitude, batch.longitude)
+    bucket = np.searchsorted(PROXIMITY_EDGES_KM, distance_km, side="right")
+    proximity = PROXIMITY_SCORES[bucket] * PROXIMITY_WEIGHT
+
+    # 2. Rating and experience (25%)
+    quality = (
+        (batch.rating / 5.0) * 0.6
+        + np.minimum(batch.experience_months / 24.0, 1.0) * 0.25
+        + np.minimum(batch.trips_completed / 1000.0, 1.0) * 0.15
+    ) * QUALITY_WEIGHT
+
+    # 3. Local San Juan knowledge (20%)
+    local_knowledge = (
+        np.minimum(batch.san_juan_experience_months / 18.0, 1.0) * 0.5
+        + np.minimum(batch.san_juan_trips_completed / 500.0, 1.0) * 0.3
+        + (batch.street_knowledge_rating / 5.0) * 0.2
+    ) * LOCAL_KNOWLEDGE_WEIGHT
+
+    # 4. Availability and patterns (15%)
+    idle_minutes = (now - batch.last_active_at) / 60.0
+    hour = datetime.fromtimestamp(now, SAN_JUAN_TZ).hour
+    typical_time = ((batch.active_hours_mask >> hour) & 1).astype(bool)
+    availability = (
+        np.maximum(0.0, (15.0 - idle_minutes) / 15.0) * 0.4
+        + batch.acceptance_rate * 0.3
+        + np.maximum(0.0, 1.0 - batch.cancellation_rate * 2.0) * 0.2
+        + np.where(typical_time, 1.0, 0.5) * 0.1
+    ) * AVAILABILITY_WEIGHT
+
+    # 5. Passenger preferences (5%)
+    preference = np.zeros(len(batch))
+    if preferences.favorite_drivers:
+        preference += np.isin(batch.driver_ids, list(preferences.favorite_drivers)) * 0.4
+    if preferences.preferred_vehicle_types:
+        codes = [VEHICLE_TYPE_CODES[v] for v in preferences.preferred_vehicle_types if v in VEHICLE_TYPE_CODES]
+        preference += np.isin(batch.vehicle_type, codes) * 0.3
+    if preferences.preferred_gender in GENDER_CODES:
+        preference += (batch.gender == GENDER_CODES[preferences.preferred_gender]) * 0.2
+    if preferences.preferred_language in LANGUAGE_BITS:
+        preference += ((batch.languages & LANGUAGE_BITS[preferences.preferred_language]) != 0) * 0.1
+    preference = np.minimum(preference, 1.0) * PREFERENCE_WEIGHT
+
+    total = proximity + quality + local_knowledge + availability + preference
+    if urgency == UrgencyLevel.HIGH:
+        total = total + proximity * 0.5
+    elif urgency == UrgencyLevel.LOW:
+        total = total + quality * 0.3
+
+    eligible = batch.available & (distance_km <= max_distance_km)
+    if vehicle_type is not None:
+        eligible &= batch.vehicle_type == VEHICLE_TYPE_CODES.get(vehicle_type, UNKNOWN_CODE)
+
+    return MatchScores(
+        distance_km=distance_km,
+        proximity=proximity,
+        quality=quality,
+        local_knowledge=local_knowledge,
+        availability=availability,
+        preferences=preference,
+        total=total,
+        eligible=eligible,
+    )
+
+
+def rank_candidates(scores: MatchScores, limit: Optional[int] = None) -> np.ndarray:
+    """Indices of eligible candidates, best score first."""
+    eligible = np.flatnonzero(scores.eligible)
+    totals = scores.total[eligible]
+    if limit is not None and limit < len(eligible):
+        top = np.argpartition(-totals, limit - 1)[:limit]
+        eligible, totals = eligible[top], totals[top]
+    return eligible[np.argsort(-totals, kind="stable")]
@@ -0,0 +1,186 @@
+"""
+Request metrics in Prometheus text format.
+
+MetricsMiddleware is a plain ASGI middleware that records, per route
+template (`/trips/{trip_id}`, never the raw path) and method, request
+counts by status, 5xx errors and a fixed-bucket latency histogram. The
+route is read from `scope["route"]` after routing ran, so it costs no extra
+matching; requests that match no route are grouped under "unmatched".
+Because the route is only known afterwards, in-flight requests are gauged
+per method.
+
+Counters are plain ints and lists owned by one worker process and only
+touched from its event loop thread, so recording takes no locks. Each
+worker exposes its own series (see `mubitt_worker_info`).
+"""
+
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+# Upper bounds in seconds; location pings sit in the first few buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "unmatched"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _RouteSeries:
+    __slots__ = ("buckets", "total_seconds", "count", "statuses", "errors")
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total_seconds = 0.0
+        self.count = 0
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], _RouteSeries] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.unhandled: Dict[str, int] = {}
+        self.location_reports: Dict[str, int] = {}
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+        self.started_at = time.time()
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        """Record one finished request. A few dict and list operations, no allocation after warm-up."""
+        series = self._routes.get((method, route))
+        if series is None:
+            series = self._routes[(method, route)] = _RouteSeries()
+        series.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.total_seconds += seconds
+        series.count += 1
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        if status >= 500:
+            series.errors += 1
+
+    def count_unhandled(self, exception: BaseException):
+        name = type(exception).__name__
+        self.unhandled[name] = self.unhandled.get(name, 0) + 1
+
+    def count_location_report(self, driver_state: str):
+        self.location_reports[driver_state] = self.location_reports.get(driver_state, 0) + 1
+
+    def add_gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        """Expose a value owned by another service, read at scrape time."""
+        self._gauges.append((name, help_text, read))
+
+    def render(self) -> str:
+        """All series in Prometheus text exposition format."""
+        lines = [
+            "# HELP mubitt_worker_info Worker process serving this scrape.",
+            "# TYPE mubitt_worker_info gauge",
+            f'mubitt_worker_info{{pid="{os.getpid()}"}} 1',
+            "# HELP mubitt_worker_start_time_seconds Unix time the worker started recording.",
+            "# TYPE mubitt_worker_start_time_seconds gauge",
+            f"mubitt_worker_start_time_seconds {self.started_at:.3f}",
+            "# HELP mubitt_http_requests_in_flight Requests being handled, by method.",
+            "# TYPE mubitt_http_requests_in_flight gauge",
+        ]
+        for method, value in sorted(self.in_flight.items()):
+            lines.append(f'mubitt_http_requests_in_flight{{method="{method}"}} {value}')
+
+        routes = sorted(self._routes.items())
+        lines += [
+            "# HELP mubitt_http_requests_total Finished requests by route template, method and status.",
+            "# TYPE mubitt_http_requests_total counter",
+        ]
+        for (method, route), series in routes:
+            labels = f'method="{method}",route="{_escape(route)}"'
+            for status, value in sorted(series.statuses.items()):
+                lines.append(f'mubitt_http_requests_total{{{labels},status="{status}"}} {value}')
+
+        lines += [
+            "# HELP mubitt_http_request_errors_total Requests answered with a 5xx status or an exception.",
+            "# TYPE mubitt_http_request_errors_total counter",
+        ]
+        for (method, route), series in routes:
+            lines.append(f'mubitt_http_request_errors_total{{method="{method}",route="{_escape(route)}"}} {series.errors}')
+
+        lines += [
+            "# HELP mubitt_http_request_duration_seconds Time to handle a request, by route template.",
+            "# TYPE mubitt_http_request_duration_seconds histogram",
+        ]
+        for (method, route), series in routes:
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, value in zip(LATENCY_BUCKETS, series.buckets):
+                cumulative += value
+                lines.append(f'mubitt_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'mubitt_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {series.count}')
+            lines.append(f"mubitt_http_request_duration_seconds_sum{{{labels}}} {series.total_seconds:.6f}")
+            lines.append(f"mubitt_http_request_duration_seconds_count{{{labels}}} {series.count}")
+
+        lines += [
+            "# HELP mubitt_unhandled_exceptions_total Exceptions that reached the global handler, by type.",
+            "# TYPE mubitt_unhandled_exceptions_total counter",
+        ]
+        for name, value in sorted(self.unhandled.items()):
+            lines.append(f'mubitt_unhandled_exceptions_total{{exception="{_escape(name)}"}} {value}')
+
+        lines += [
+            "# HELP mubitt_location_reports_total Driver location reports by driver state.",
+            "# TYPE mubitt_location_reports_total counter",
+        ]
+        for state, value in sorted(self.location_reports.items()):
+            lines.append(f'mubitt_location_reports_total{{state="{_escape(state)}"}} {value}')
+
+        for name, help_text, read in self._gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {read()}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding a MetricsRegistry."""
+
+    def __init__(self, app, registry: MetricsRegistry = None):
+        self.app = app
+        self.registry = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        method = scope["method"]
+        in_flight = registry.in_flight
+        in_flight[method] = in_flight.get(method, 0) + 1
+        # Stays 500 if the app fails before starting a response
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            response_status[0] = 500
+            raise
+        finally:
+            route = scope.get("route")
+            registry.observe(
+                method,
+                route.path if route is not None else UNMATCHED_ROUTE,
+                response_status[0],
+                time.perf_counter() - start,
+            )
+            in_flight[method] -= 1
+
+
+metrics = MetricsRegistry()
+
+# Pre-forked workers import the app in the parent; count from the fork instead
+os.register_at_fork(after_in_child=lambda: setattr(metrics, "started_at", time.time()))
@@ -0,0 +1,78 @@
+"""
+Bounded executor for bcrypt work.
+
+bcrypt takes a few hundred milliseconds per call and releases the GIL, so
+running it in a small thread pool keeps the event loop free for other
+requests. Work beyond `workers + max_queue` is rejected immediately rather
+than queued without limit.
+"""
+
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHashingPool:
+    def __init__(self, workers: int = 2, max_queue: int = 32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker."""
+        return max(0, self.pending - self.workers)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(fn, *args)
+        self.pending += 1
+        # The slot is held until the job itself ends: a cancelled caller
+        # (client disconnect) can't stop bcrypt once a worker has picked it up
+        future.add_done_callback(lambda done: self._call_soon(loop, self._finished, done))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # loop already closed at shutdown
+
+    def _finished(self, future: Future):
+        """Release the job's slot; runs on the event loop."""
+        self.pending -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
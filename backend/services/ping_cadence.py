@@ -0,0 +1,120 @@
+"""
+Server-chosen cadence for driver location reports.
+
+Every PUT /drivers/location answers with when the app should report next
+and how far the driver has to move before a report is worth sending. The
+base values depend on the driver's state: a driver heading to a pickup is
+watched live by the passenger and feeds ETAs, while an idle driver parked
+at a taxi rank only needs to be findable. Idle drivers report more often
+where demand is high, since they are the supply the next match is made
+from.
+
+When the write-behind ingest backlog grows past LOCATION_CADENCE_SHED_START
+of its capacity, every interval and distance is stretched, up to
+LOCATION_CADENCE_MAX_STRETCH times at a full queue, so the fleet backs off
+before pings have to be dropped. Stretched intervals stay under a per-state
+ceiling, and for drivers who must stay findable under half the fleet index's
+stale threshold, so one late ping doesn't drop them from search. Reports are
+counted per driver state in the request metrics.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from services.fleet_index import DRIVER_EN_ROUTE, DRIVER_IDLE, DRIVER_IN_TRIP, DRIVER_OFFLINE, fleet_index
+from services.location_ingest import LocationIngest, location_ingest
+from services.metrics import MetricsRegistry, metrics
+from services.surge import SurgeEngine, surge_engine
+
+LOCATION_CADENCE_SHED_START = float(os.getenv("LOCATION_CADENCE_SHED_START", 0.25))
+LOCATION_CADENCE_MAX_STRETCH = float(os.getenv("LOCATION_CADENCE_MAX_STRETCH", 4.0))
+
+
+@dataclass(frozen=True)
+class StateCadence:
+    interval_seconds: float
+    min_displacement_meters: float
+    max_interval_seconds: float
+
+
+DEFAULT_CADENCE: Dict[str, StateCadence] = {
+    # Should not be reporting at all; a slow heartbeat in case the app disagrees
+    DRIVER_OFFLINE: StateCadence(300, 500, 900),
+    # Capped by the fleet's stale threshold instead (PingCadence.max_online_interval)
+    DRIVER_IDLE: StateCadence(20, 75, float("inf")),
+    DRIVER_EN_ROUTE: StateCadence(4, 15, 12),
+    DRIVER_IN_TRIP: StateCadence(6, 25, 20),
+}
+
+# Applied to idle drivers by the zone's demand level in the surge snapshot
+IDLE_DEMAND_FACTORS = {"low": 1.5, "medium": 1.0, "high": 0.5}
+
+
+@dataclass(frozen=True)
+class Cadence:
+    next_report_in_seconds: int
+    min_displacement_meters: int
+
+
+class PingCadence:
+    def __init__(
+        self,
+        ingest: LocationIngest = location_ingest,
+        surge: SurgeEngine = surge_engine,
+        registry: MetricsRegistry = metrics,
+        cadence: Dict[str, StateCadence] = DEFAULT_CADENCE,
+        shed_start: float = LOCATION_CADENCE_SHED_START,
+        max_stretch: float = LOCATION_CADENCE_MAX_STRETCH,
+        stale_after_seconds: float = fleet_index.stale_after_seconds,
+    ):
+        self.ingest = ingest
+        self.surge = surge
+        self.registry = registry
+        self.cadence = cadence
+        self.shed_start = shed_start
+        self.max_stretch = max_stretch
+        self.max_online_interval = stale_after_seconds / 2
+
+    def stretch(self) -> float:
+        """1.0 until the ingest backlog passes `shed_start`, then linear up to `max_stretch` when full."""
+        load = self.ingest.pending / max(1, self.ingest.max_pending)
+        if load <= self.shed_start:
+            return 1.0
+        overload = min(1.0, (load - self.shed_start) / max(1e-9, 1.0 - self.shed_start))
+        return 1.0 + (self.max_stretch - 1.0) * overload
+
+    def advise(self, driver_state: str, zone_id: Optional[str] = None) -> Cadence:
+        """Cadence for a report just received from a driver in `driver_state`."""
+        self.registry.count_location_report(driver_state)
+        base = self.cadence.get(driver_state, self.cadence[DRIVER_IDLE])
+
+        interval = base.interval_seconds
+        if driver_state == DRIVER_IDLE and zone_id is not None:
+            zone = self.surge.snapshot.zones.get(zone_id)
+            if zone is not None:
+                interval *= IDLE_DEMAND_FACTORS.get(zone.demand, 1.0)
+
+        ceiling = base.max_interval_seconds
+        if driver_state != DRIVER_OFFLINE:
+            ceiling = min(ceiling, self.max_online_interval)
+
+        stretch = self.stretch()
+        return Cadence(
+            next_report_in_seconds=max(1, round(min(interval * stretch, ceiling))),
+            min_displacement_meters=round(base.min_displacement_meters * stretch),
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "stretch": round(self.stretch(), 2),
+            "reports_by_state": dict(self.registry.location_reports),
+        }
+
+
+ping_cadence = PingCadence()
+metrics.add_gauge(
+    "mubitt_location_cadence_stretch",
+    "Factor applied to location report intervals because of ingest backlog.",
+    ping_cadence.stretch,
+)
@@ -0,0 +1,351 @@
+"""
+In-memory place search for pickup/dropoff autocomplete.
+
+Landmarks, references and addresses from past trips are indexed by a token
+prefix trie (type-ahead) and a trigram index (typos, mid-word matches).
+Text is folded to lowercase ASCII, so "Martín" and "martin" match. Results
+are ranked by match quality, popularity and distance to the user, and new
+trip addresses are added as trips are created.
+
+A passenger's free-text reference for a past-trip address ("portón verde")
+is private: it is neither indexed nor shown to anyone else. Past-trip
+places are capped at PLACES_MAX_HISTORY; beyond it the least recently used
+one is forgotten.
+"""
+
+import heapq
+import math
+import os
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from database import SessionLocal
+from models.trip import Location, Trip
+from services.geo import haversine_distance
+
+# A past-trip address is shown to other passengers only after this many
+# different passengers used it (keeps home addresses private)
+PLACES_MIN_SHARED_USERS = int(os.getenv("PLACES_MIN_SHARED_USERS", 3))
+
+PLACES_HISTORY_TRIPS = int(os.getenv("PLACES_HISTORY_TRIPS", 20000))
+PLACES_MAX_HISTORY = int(os.getenv("PLACES_MAX_HISTORY", 50000))
+
+MIN_QUERY_LENGTH = 2
+# Short prefixes can match thousands of places; only the best by text and
+# popularity are scored for distance
+MAX_SCORED_CANDIDATES = 200
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+# Ranking weights
+MATCH_WEIGHT = 0.6
+POPULARITY_WEIGHT = 0.25
+PROXIMITY_WEIGHT = 0.15
+PROXIMITY_SCALE_KM = 3.0
+
+# Seeded places count as this many uses
+SEED_POPULARITY = 50
+
+
+def fold(text: str) -> str:
+    """Lowercase, accent-free, punctuation as spaces."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    cleaned = "".join(char if char.isalnum() else " " for char in stripped.lower())
+    return " ".join(cleaned.split())
+
+
+def trigrams(folded: str) -> Set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Place:
+    id: int
+    name: str
+    address: str
+    latitude: float
+    longitude: float
+    category: Optional[str] = None
+    reference: Optional[str] = None  # public, seeded places only
+    source: str = "history"  # landmark | history
+    popularity: int = 0
+    users: Set[str] = field(default_factory=set)
+    # Each passenger's own reference for this address
+    user_references: Dict[str, str] = field(default_factory=dict)
+    trigrams: Set[str] = field(default_factory=set)
+
+    @property
+    def shared(self) -> bool:
+        """Visible to every passenger, not only to those who went there."""
+        return self.source != "history" or len(self.users) >= PLACES_MIN_SHARED_USERS
+
+    def reference_for(self, user_id: Optional[str]) -> Optional[str]:
+        """Reference to show this user: their own one, else the public one."""
+        return self.user_references.get(user_id) or self.reference
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[int] = set()
+
+
+class PlaceIndex:
+    def __init__(self, max_history: int = PLACES_MAX_HISTORY):
+        self.max_history = max_history
+        self._places: List[Optional[Place]] = []
+        self._free_ids: List[int] = []
+        self._by_key: Dict[Tuple[str, float, float], int] = {}
+        self._root = _TrieNode()
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._user_places: Dict[str, Set[int]] = {}
+        # History place ids, least recently used first
+        self._history: "OrderedDict[int, None]" = OrderedDict()
+        # Per-place columns so ranking large candidate sets is vectorized
+        self._popularity = np.zeros(1024, dtype=np.float64)
+        self._shared = np.zeros(1024, dtype=bool)
+        self._max_popularity = 1
+        self.lookups = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._places) - len(self._free_ids)
+
+    @staticmethod
+    def _key(address: str, latitude: float, longitude: float) -> Tuple[str, float, float]:
+        # Same address within ~100 m is one place
+        return fold(address), round(latitude, 3), round(longitude, 3)
+
+    def add(
+        self,
+        name: str,
+        address: str,
+        latitude: float,
+        longitude: float,
+        *,
+        category: Optional[str] = None,
+        reference: Optional[str] = None,
+        source: str = "history",
+        user_id: Optional[str] = None,
+        uses: int = 1,
+    ) -> Place:
+        """Insert a place, or count another use of an existing one. O(length of its text).
+
+        A history `reference` is kept for `user_id` only; seeded places index theirs.
+        """
+        key = self._key(address, latitude, longitude)
+        place_id = self._by_key.get(key)
+        if place_id is not None:
+            place = self._places[place_id]
+            if source != "history":
+                place.source = source
+                place.name = name
+                place.category = category or place.category
+                self._history.pop(place.id, None)
+        else:
+            place = Place(
+                id=self._free_ids.pop() if self._free_ids else len(self._places),
+                name=name, address=address, latitude=latitude, longitude=longitude, category=category,
+                reference=reference if source != "history" else None, source=source,
+            )
+            if place.id == len(self._places):
+                self._places.append(place)
+            else:
+                self._places[place.id] = place
+            self._by_key[key] = place.id
+            self._index(place)
+
+        place.popularity += uses
+        if user_id is not None:
+            place.users.add(user_id)
+            self._user_places.setdefault(user_id, set()).add(place.id)
+            if source == "history" and reference:
+                place.user_references[user_id] = reference
+        self._max_popularity = max(self._max_popularity, place.popularity)
+
+        if place.id >= len(self._popularity):
+            self._popularity = np.concatenate([self._popularity, np.zeros_like(self._popularity)])
+            self._shared = np.concatenate([self._shared, np.zeros_like(self._shared)])
+        self._popularity[place.id] = place.popularity
+        self._shared[place.id] = place.shared
+
+        if place.source == "history":
+            self._history[place.id] = None
+            self._history.move_to_end(place.id)
+            while len(self._history) > self.max_history:
+                self._remove(self._places[self._history.popitem(last=False)[0]])
+        return place
+
+    @staticmethod
+    def _text(place: Place) -> str:
+        return fold(" ".join(filter(None, (place.name, place.address, place.reference))))
+
+    def _index(self, place: Place):
+        text = self._text(place)
+        for token in set(text.split()):
+            node = self._root
+            for char in token:
+                node = node.children.setdefault(char, _TrieNode())
+                node.ids.add(place.id)
+        place.trigrams = trigrams(text)
+        for gram in place.trigrams:
+            self._trigrams.setdefault(gram, set()).add(place.id)
+
+    def _remove(self, place: Place):
+        """Forget a place; its id is reused by the next new one."""
+        for token in set(self._text(place).split()):
+            path = [self._root]
+            for char in token:
+                path.append(path[-1].children[char])
+                path[-1].ids.discard(place.id)
+            # Prune branches no place goes through any more
+            for depth in range(len(token), 0, -1):
+                if path[depth].ids or path[depth].children:
+                    break
+                del path[depth - 1].children[token[depth - 1]]
+        for gram in place.trigrams:
+            ids = self._trigrams[gram]
+            ids.discard(place.id)
+            if not ids:
+                del self._trigrams[gram]
+        for user_id in place.users:
+            own = self._user_places.get(user_id)
+            if own is not None:
+                own.discard(place.id)
+                if not own:
+                    del self._user_places[user_id]
+        del self._by_key[self._key(place.address, place.latitude, place.longitude)]
+        self._places[place.id] = None
+        self._popularity[place.id] = 0
+        self._shared[place.id] = False
+        self._free_ids.append(place.id)
+        self.evicted += 1
+
+    def _prefix_ids(self, token: str) -> Set[int]:
+        node = self._root
+        for char in token:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def _trigram_matches(self, folded: str) -> Dict[int, float]:
+        query_grams = trigrams(folded)
+        shared: Dict[int, int] = {}
+        for gram in query_grams:
+            for place_id in self._trigrams.get(gram, ()):
+                shared[place_id] = shared.get(place_id, 0) + 1
+        matches = {}
+        for place_id, count in shared.items():
+            # Containment of the query in the place text, forgiving long addresses
+            similarity = count / len(query_grams)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                matches[place_id] = similarity
+        return matches
+
+    def search(
+        self,
+        query: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        limit: int = 8,
+        user_id: Optional[str] = None,
+    ) -> List[Tuple[Place, Optional[float]]]:
+        """Best places for a partial query as (place, distance km or None)."""
+        self.lookups += 1
+        folded = fold(query)
+        if len(folded) < MIN_QUERY_LENGTH:
+            return []
+
+        # Every typed word must prefix-match some word of the place
+        tokens = folded.split()
+        ids = self._prefix_ids(tokens[0])
+        for token in tokens[1:]:
+            if not ids:
+                break
+            ids = ids & self._prefix_ids(token)
+        candidates = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        match = np.ones(len(candidates))
+
+        if len(candidates) < limit:
+            extra = {place_id: similarity for place_id, similarity in self._trigram_matches(folded).items() if place_id not in ids}
+            candidates = np.concatenate([candidates, np.fromiter(extra.keys(), dtype=np.int64, count=len(extra))])
+            match = np.concatenate([match, np.fromiter(extra.values(), dtype=np.float64, count=len(extra)) * 0.9])
+
+        visible = self._shared[candidates]
+        own = self._user_places.get(user_id) if user_id is not None else None
+        if own:
+            visible |= np.isin(candidates, np.fromiter(own, dtype=np.int64, count=len(own)))
+        candidates, match = candidates[visible], match[visible]
+
+        scores = MATCH_WEIGHT * match + POPULARITY_WEIGHT * np.log1p(self._popularity[candidates]) / math.log1p(self._max_popularity)
+        if len(candidates) > MAX_SCORED_CANDIDATES:
+            top = np.argpartition(-scores, MAX_SCORED_CANDIDATES)[:MAX_SCORED_CANDIDATES]
+            candidates, scores = candidates[top], scores[top]
+
+        scored = []
+        for place_id, score in zip(candidates.tolist(), scores.tolist()):
+            place = self._places[place_id]
+            distance = None
+            if latitude is not None and longitude is not None:
+                distance = haversine_distance(latitude, longitude, place.latitude, place.longitude)
+                score += PROXIMITY_WEIGHT / (1 + distance / PROXIMITY_SCALE_KM)
+            scored.append((score, -place_id, place, distance))
+
+        best = heapq.nlargest(limit, scored, key=lambda item: item[:2])
+        return [(place, distance) for _, _, place, distance in best]
+
+    def add_many(self, places: Iterable[dict], source: str) -> int:
+        count = 0
+        for place in places:
+            self.add(
+                place["name"], place["address"], place["latitude"], place["longitude"],
+                category=place.get("category"), source=source, uses=SEED_POPULARITY,
+            )
+            count += 1
+        return count
+
+    def stats(self) -> Dict:
+        return {
+            "places": len(self),
+            "history_places": len(self._history),
+            "max_history": self.max_history,
+            "evicted": self.evicted,
+            "users": len(self._user_places),
+            "trigrams": len(self._trigrams),
+            "lookups": self.lookups,
+        }
+
+
+place_index = PlaceIndex()
+
+
+async def load_trip_history(index: PlaceIndex = place_index, trips: int = PLACES_HISTORY_TRIPS) -> int:
+    """Index pickup and dropoff addresses of the most recent trips."""
+    recent = (
+        select(Trip.id)
+        .order_by(Trip.created_at.desc())
+        .limit(trips)
+        .subquery()
+    )
+    loaded = 0
+    async with SessionLocal() as db:
+        for location_column in (Trip.pickup_location_id, Trip.dropoff_location_id):
+            rows = await db.stream(
+                select(Location.address, Location.reference, Location.latitude, Location.longitude, Trip.passenger_id)
+                .join(Trip, location_column == Location.id)
+                .where(Trip.id.in_(select(recent.c.id)))
+                .execution_options(yield_per=1000)
+            )
+            async for address, reference, latitude, longitude, passenger_id in rows:
+                index.add(address, address, latitude, longitude, reference=reference, user_id=passenger_id)
+                loaded += 1
+    return loaded
@@ -0,0 +1,224 @@
+"""
+Opt-in statistical profiler for live requests.
+
+ProfilerMiddleware picks requests to profile: while `enabled`, a random
+`sample_rate` fraction of those whose path matches `route_pattern` (all
+paths when unset); and, enabled or not, any request carrying
+`X-Mubitt-Profile: <PROFILER_HEADER_TOKEN>`, if that token is set. While
+at least one picked request is in flight, a daemon thread snapshots the
+event loop thread's stack every `interval_ms` with `sys._current_frames()`.
+A snapshot counts for a request only if that request's middleware frame is
+on the stack, i.e. the request is running on the loop right then, so the
+result is on-CPU time per route; time spent awaiting the database or in
+worker threads shows up in the latency histograms instead. The sampler needs
+the GIL, so while the loop is busy it gets at most one snapshot per
+`sys.getswitchinterval()` (5 ms by default).
+
+Stacks are aggregated in memory as collapsed stacks ("route;frame;frame N"),
+ready for flamegraph.pl or speedscope. Settings can be changed at runtime
+through `configure`; like every service here, state is per worker.
+"""
+
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Dict, Optional, Pattern, Tuple
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0.01))
+PROFILER_ROUTE_PATTERN = os.getenv("PROFILER_ROUTE_PATTERN", "")  # regex on the request path
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+# Distinct stacks kept; further new stacks are only counted as dropped
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", 20000))
+# Value of X-Mubitt-Profile that forces profiling; the header is ignored when empty.
+# Deliberately not ADMIN_TOKEN: it travels on ordinary client requests
+PROFILER_HEADER_TOKEN = os.getenv("PROFILER_HEADER_TOKEN", "")
+
+PROFILE_HEADER = b"x-mubitt-profile"
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+def _frame_label(code) -> str:
+    """`api/trips.py:search_drivers`; library frames keep only the path from the package dir."""
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = filename[len(_BACKEND_DIR):]
+    else:
+        marker = filename.rfind("-packages" + os.sep)
+        if marker >= 0:
+            filename = filename[marker + len("-packages" + os.sep):]
+    return f"{filename}:{code.co_qualname}"
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        enabled: bool = PROFILER_ENABLED,
+        sample_rate: float = PROFILER_SAMPLE_RATE,
+        route_pattern: str = PROFILER_ROUTE_PATTERN,
+        interval_ms: float = PROFILER_INTERVAL_MS,
+        max_stacks: int = PROFILER_MAX_STACKS,
+        header_token: str = PROFILER_HEADER_TOKEN,
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.route_pattern: Optional[Pattern] = re.compile(route_pattern) if route_pattern else None
+        self.interval_ms = interval_ms
+        self.max_stacks = max_stacks
+        self.header_token = header_token.encode()
+        # Middleware frame of each request being profiled -> its ASGI scope
+        self._active: Dict[object, dict] = {}
+        self._threads = set()
+        self._wake = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._stacks: Dict[Tuple, int] = {}
+        self.profiled_requests = 0
+        self.snapshots = 0
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = time.time()
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        route_pattern: Optional[str] = None,
+        interval_ms: Optional[float] = None,
+    ):
+        """Change settings in place; `route_pattern=""` profiles every path again."""
+        if route_pattern is not None:
+            self.route_pattern = re.compile(route_pattern) if route_pattern else None
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        if enabled is not None:
+            self.enabled = enabled
+
+    def reset(self):
+        self._stacks = {}
+        self.profiled_requests = 0
+        self.snapshots = 0
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = time.time()
+
+    def should_profile(self, scope) -> bool:
+        if self.header_token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.header_token):
+                    return True
+        if not self.enabled:
+            return False
+        if self.route_pattern is not None and self.route_pattern.search(scope["path"]) is None:
+            return False
+        return random.random() < self.sample_rate
+
+    async def profile(self, app, scope, receive, send):
+        """Run the request with this frame marked as the root of its samples."""
+        frame = sys._getframe()
+        self._threads.add(threading.get_ident())
+        self._active[frame] = scope
+        self.profiled_requests += 1
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name="mubitt-profiler", daemon=True)
+            self._sampler.start()
+        self._wake.set()
+        try:
+            await app(scope, receive, send)
+        finally:
+            del self._active[frame]
+            if not self._active:
+                self._wake.clear()
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            self._take_snapshot()
+            time.sleep(self.interval_ms / 1000)
+
+    def _take_snapshot(self):
+        active = self._active
+        frames = sys._current_frames()
+        self.snapshots += 1
+        for thread_id in tuple(self._threads):
+            frame = frames.get(thread_id)
+            codes = []
+            while frame is not None and frame not in active:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if frame is None:
+                # Thread is in the event loop or another, unprofiled request
+                continue
+            scope = active.get(frame)
+            if scope is None:
+                continue
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else None, tuple(reversed(codes)))
+            stacks = self._stacks
+            if key in stacks:
+                stacks[key] += 1
+            elif len(stacks) < self.max_stacks:
+                stacks[key] = 1
+            else:
+                self.dropped += 1
+                continue
+            self.samples += 1
+
+    def collapsed(self, route_filter: Optional[str] = None) -> str:
+        """Aggregated samples as collapsed stacks, heaviest first; root frame is "METHOD route"."""
+        totals: Dict[str, int] = {}
+        labels: Dict[object, str] = {}
+        for (method, route, codes), count in list(self._stacks.items()):
+            root = f"{method} {route or 'unmatched'}"
+            if route_filter is not None and route_filter not in root:
+                continue
+            frames = [root]
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code).replace(";", ":")
+                frames.append(label)
+            line = ";".join(frames)
+            totals[line] = totals.get(line, 0) + count
+        return "".join(f"{line} {count}\n" for line, count in sorted(totals.items(), key=lambda item: -item[1]))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "route_pattern": self.route_pattern.pattern if self.route_pattern is not None else None,
+            "interval_ms": self.interval_ms,
+            "header_trigger": bool(self.header_token),
+            "profiled_requests": self.profiled_requests,
+            "in_flight": len(self._active),
+            "snapshots": self.snapshots,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks),
+            "dropped_samples": self.dropped,
+            "collecting_seconds": round(time.time() - self.started_at, 1),
+            "pid": os.getpid(),
+        }
+
+
+class ProfilerMiddleware:
+    """ASGI middleware handing picked requests to a SamplingProfiler; two attribute checks when off."""
+
+    def __init__(self, app, sampling_profiler: SamplingProfiler = None):
+        self.app = app
+        self.profiler = sampling_profiler or profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope["type"] == "http" and (profiler.enabled or profiler.header_token) and profiler.should_profile(scope):
+            await profiler.profile(self.app, scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,101 @@
+"""
+Cache of computed routes keyed by origin/destination grid cells.
+
+Quotes along the same corridor land in the same ~100 m cells and reuse one
+route. Entries live until the end of the time-of-day traffic bucket they
+were computed in, so a route quoted in the midday lull is never reused in
+the evening peak.
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from services.geo import KM_PER_DEGREE_LAT, SAN_JUAN_TZ, km_per_degree_lng
+from services.routing import Route
+from services.ttl_cache import TTLCache
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 20000))
+ROUTE_CACHE_CELL_METERS = float(os.getenv("ROUTE_CACHE_CELL_METERS", 100))
+
+# Local hours where San Juan traffic changes character (morning rush,
+# midday, siesta, afternoon, evening rush, night)
+TRAFFIC_BUCKET_STARTS = (0, 7, 10, 13, 16, 20, 23)
+
+# Cells are sized at the city's latitude so keys don't depend on the point
+REFERENCE_LATITUDE = -31.54
+
+CellKey = Tuple[int, int, int, int]
+
+
+def seconds_until_bucket_end(now: Optional[float] = None) -> float:
+    """Seconds until the current traffic bucket ends."""
+    now = time.time() if now is None else now
+    local = datetime.fromtimestamp(now, SAN_JUAN_TZ)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = (local - midnight).total_seconds()
+    for start_hour in TRAFFIC_BUCKET_STARTS[1:] + (24,):
+        if elapsed < start_hour * 3600:
+            return start_hour * 3600 - elapsed
+    return 24 * 3600 - elapsed
+
+
+class RouteCache(TTLCache):
+    """Bounded LRU of routes keyed by quantized (origin, destination)."""
+
+    def __init__(self, max_size: int = ROUTE_CACHE_SIZE, cell_meters: float = ROUTE_CACHE_CELL_METERS):
+        super().__init__(max_size)
+        self.cell_meters = cell_meters
+        self._lat_step = cell_meters / (KM_PER_DEGREE_LAT * 1000)
+        self._lng_step = cell_meters / (km_per_degree_lng(REFERENCE_LATITUDE) * 1000)
+        self.warmed = 0
+
+    def key(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float) -> CellKey:
+        return (
+            int(from_lat // self._lat_step), int(from_lng // self._lng_step),
+            int(to_lat // self._lat_step), int(to_lng // self._lng_step),
+        )
+
+    def put_route(self, key: CellKey, route: Route):
+        """Keep a route until the current traffic bucket ends."""
+        now = time.time()
+        self.put(key, route, now + seconds_until_bucket_end(now))
+
+    def get_or_compute(
+        self,
+        from_lat: float,
+        from_lng: float,
+        to_lat: float,
+        to_lng: float,
+        compute: Callable[[float, float, float, float], Optional[Route]],
+    ) -> Optional[Route]:
+        """Cached route for the cell pair, computing (and caching) it on a miss."""
+        key = self.key(from_lat, from_lng, to_lat, to_lng)
+        route = self.get(key)
+        if route is None:
+            route = compute(from_lat, from_lng, to_lat, to_lng)
+            if route is not None:
+                self.put_route(key, route)
+        return route
+
+    def warm(
+        self,
+        pairs: Iterable[Tuple[float, float, float, float]],
+        compute: Callable[[float, float, float, float], Optional[Route]],
+    ) -> int:
+        """Precompute routes for known corridors; returns how many were stored."""
+        stored = 0
+        for from_lat, from_lng, to_lat, to_lng in pairs:
+            route = compute(from_lat, from_lng, to_lat, to_lng)
+            if route is not None:
+                self.put_route(self.key(from_lat, from_lng, to_lat, to_lng), route)
+                stored += 1
+        self.warmed += stored
+        return stored
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "cell_meters": self.cell_meters, "warmed": self.warmed}
+
+
+route_cache = RouteCache()
@@ -0,0 +1,606 @@
+"""
+Offline road-network routing.
+
+An OSM XML extract of Gran San Juan (ROAD_NETWORK_PATH) is reduced to a
+junction graph held in flat numpy arrays and preprocessed into contraction
+hierarchies, so a point-to-point query is two small upward Dijkstra searches.
+The preprocessed graph is cached next to the extract as .npz. Trip endpoints
+are snapped to the nearest street segment through a uniform grid.
+
+Until the graph is loaded, or when ROAD_NETWORK_PATH is unset, callers get
+None and fall back to the straight-line estimate.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.geo import KM_PER_DEGREE_LAT, km_per_degree_lng
+
+logger = logging.getLogger(__name__)
+
+ROAD_NETWORK_PATH = os.getenv("ROAD_NETWORK_PATH")  # .osm XML extract
+ROUTING_SNAP_MAX_METERS = float(os.getenv("ROUTING_SNAP_MAX_METERS", 500))
+
+# Bump when the cached .npz layout or preprocessing changes
+ROUTING_CACHE_VERSION = 1
+
+# Typical urban speeds (km/h) when a way has no usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 80, "motorway_link": 50,
+    "trunk": 60, "trunk_link": 40,
+    "primary": 45, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 30,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15,
+}
+ONEWAY_BY_DEFAULT = {"motorway", "motorway_link"}
+
+SNAP_CELL_METERS = 250.0
+
+# Witness searches give up after settling this many nodes (adds a few
+# redundant shortcuts, never wrong answers)
+WITNESS_SETTLE_LIMIT = 60
+
+_MAXSPEED = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(mph)?")
+
+
+@dataclass(frozen=True)
+class Route:
+    distance_km: float
+    duration_seconds: float
+
+
+def _way_speed_kmh(highway: str, maxspeed: Optional[str]) -> float:
+    if maxspeed:
+        match = _MAXSPEED.match(maxspeed)
+        if match:
+            speed = float(match.group(1))
+            # "0" and similar mean unknown, and would divide by zero later
+            if speed > 0:
+                return speed * 1.609 if match.group(2) else speed
+    return HIGHWAY_SPEEDS_KMH[highway]
+
+
+def _way_directions(highway: str, tags: Dict[str, str]) -> Tuple[bool, bool]:
+    """(forward allowed, backward allowed) along the way's node order."""
+    oneway = tags.get("oneway", "")
+    if oneway in ("yes", "true", "1"):
+        return True, False
+    if oneway == "-1":
+        return False, True
+    if oneway == "no":
+        return True, True
+    if tags.get("junction") in ("roundabout", "circular") or highway in ONEWAY_BY_DEFAULT:
+        return True, False
+    return True, True
+
+
+def parse_osm(path: str):
+    """Drivable ways and the coordinates of every node they use."""
+    coords: Dict[str, Tuple[float, float]] = {}
+    ways = []
+    for _, element in ET.iterparse(path, events=("end",)):
+        if element.tag == "node":
+            coords[element.get("id")] = (float(element.get("lat")), float(element.get("lon")))
+            element.clear()
+        elif element.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+            highway = tags.get("highway")
+            if (
+                highway in HIGHWAY_SPEEDS_KMH
+                and tags.get("access") not in ("no", "private")
+                and tags.get("motor_vehicle") != "no"
+            ):
+                refs = [nd.get("ref") for nd in element.iter("nd")]
+                forward, backward = _way_directions(highway, tags)
+                ways.append((refs, _way_speed_kmh(highway, tags.get("maxspeed")), forward, backward))
+            element.clear()
+    return coords, ways
+
+
+def _segment_meters(lat1, lng1, lat2, lng2) -> float:
+    mid_lat = (lat1 + lat2) / 2
+    dy = (lat2 - lat1) * KM_PER_DEGREE_LAT * 1000
+    dx = (lng2 - lng1) * km_per_degree_lng(mid_lat) * 1000
+    return math.hypot(dx, dy)
+
+
+def build_network(coords, ways) -> Dict[str, np.ndarray]:
+    """Junction graph: chains of street segments between junctions.
+
+    A junction is any node shared by two ways or ending one; everything in
+    between only shapes the street and is kept for snapping, not routing.
+    """
+    usage: Dict[str, int] = {}
+    for refs, _, _, _ in ways:
+        refs = [ref for ref in refs if ref in coords]
+        for ref in refs:
+            usage[ref] = usage.get(ref, 0) + 1
+        if refs:
+            # Way endpoints always split chains
+            usage[refs[0]] = usage.get(refs[0], 0) + 1
+            usage[refs[-1]] = usage.get(refs[-1], 0) + 1
+
+    node_index: Dict[str, int] = {}
+    node_lat: List[float] = []
+    node_lng: List[float] = []
+
+    def junction(ref: str) -> int:
+        index = node_index.get(ref)
+        if index is None:
+            index = node_index[ref] = len(node_lat)
+            lat, lng = coords[ref]
+            node_lat.append(lat)
+            node_lng.append(lng)
+        return index
+
+    chain_u, chain_v, chain_len, chain_time, chain_fwd, chain_bwd = [], [], [], [], [], []
+    seg = {key: [] for key in ("lat1", "lng1", "lat2", "lng2", "chain", "off_m", "off_s", "len_m", "time_s")}
+
+    for refs, speed_kmh, forward, backward in ways:
+        refs = [ref for ref in refs if ref in coords]
+        if len(refs) < 2:
+            continue
+        meters_per_second = speed_kmh / 3.6
+        start = 0
+        for i in range(1, len(refs)):
+            if usage[refs[i]] < 2 and i != len(refs) - 1:
+                continue
+            chain_id = len(chain_u)
+            length = travel = 0.0
+            for j in range(start, i):
+                (lat1, lng1), (lat2, lng2) = coords[refs[j]], coords[refs[j + 1]]
+                meters = _segment_meters(lat1, lng1, lat2, lng2)
+                seconds = meters / meters_per_second
+                for key, value in zip(seg, (lat1, lng1, lat2, lng2, chain_id, length, travel, meters, seconds)):
+                    seg[key].append(value)
+                length += meters
+                travel += seconds
+            chain_u.append(junction(refs[start]))
+            chain_v.append(junction(refs[i]))
+            chain_len.append(length)
+            chain_time.append(travel)
+            chain_fwd.append(forward)
+            chain_bwd.append(backward)
+            start = i
+
+    network = {
+        "node_lat": np.array(node_lat, dtype=np.float64),
+        "node_lng": np.array(node_lng, dtype=np.float64),
+        "chain_u": np.array(chain_u, dtype=np.int32),
+        "chain_v": np.array(chain_v, dtype=np.int32),
+        "chain_len_m": np.array(chain_len, dtype=np.float64),
+        "chain_time_s": np.array(chain_time, dtype=np.float64),
+        "chain_fwd": np.array(chain_fwd, dtype=bool),
+        "chain_bwd": np.array(chain_bwd, dtype=bool),
+    }
+    for key, values in seg.items():
+        network["seg_" + key] = np.array(values, dtype=np.int32 if key == "chain" else np.float64)
+    return network
+
+
+def directed_edges(network) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(src, dst, seconds, meters) for every drivable direction of every chain."""
+    fwd, bwd = network["chain_fwd"], network["chain_bwd"]
+    u, v = network["chain_u"], network["chain_v"]
+    src = np.concatenate([u[fwd], v[bwd]])
+    dst = np.concatenate([v[fwd], u[bwd]])
+    seconds = np.concatenate([network["chain_time_s"][fwd], network["chain_time_s"][bwd]])
+    meters = np.concatenate([network["chain_len_m"][fwd], network["chain_len_m"][bwd]])
+    keep = src != dst
+    return src[keep], dst[keep], seconds[keep], meters[keep]
+
+
+def contract_hierarchy(node_count: int, src, dst, seconds, meters) -> Dict[str, np.ndarray]:
+    """Contraction hierarchies: node order plus upward search graphs in CSR form.
+
+    Nodes are contracted cheapest-first by edge difference (lazy updates).
+    Each contracted node keeps its edges to still-uncontracted neighbours as
+    its upward edges; shortcuts carry both travel time and length.
+    """
+    out: List[Dict[int, Tuple[float, float]]] = [dict() for _ in range(node_count)]
+    inn: List[Dict[int, Tuple[float, float]]] = [dict() for _ in range(node_count)]
+    for u, v, t, m in zip(src.tolist(), dst.tolist(), seconds.tolist(), meters.tolist()):
+        if v not in out[u] or t < out[u][v][0]:
+            out[u][v] = (t, m)
+            inn[v][u] = (t, m)
+
+    contracted = [False] * node_count
+    deleted_neighbours = [0] * node_count
+    # Depth in the hierarchy so far; keeps contraction spread evenly over the map
+    level = [0] * node_count
+
+    def witness_distances(source: int, skip: int, limit: float) -> Dict[int, float]:
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < WITNESS_SETTLE_LIMIT:
+            d, node = heapq.heappop(heap)
+            if d > limit:
+                break
+            if d > dist[node]:
+                continue
+            settled += 1
+            for neighbour, (t, _) in out[node].items():
+                if neighbour == skip or contracted[neighbour]:
+                    continue
+                nd = d + t
+                if nd < dist.get(neighbour, math.inf):
+                    dist[neighbour] = nd
+                    heapq.heappush(heap, (nd, neighbour))
+        return dist
+
+    def shortcuts_for(x: int):
+        shortcuts = []
+        targets = [(w, tm) for w, tm in out[x].items() if not contracted[w]]
+        if not targets:
+            return shortcuts
+        max_out = max(t for _, (t, _) in targets)
+        for u, (t_in, m_in) in inn[x].items():
+            if contracted[u]:
+                continue
+            dist = witness_distances(u, x, t_in + max_out)
+            for w, (t_out, m_out) in targets:
+                if w == u:
+                    continue
+                via = t_in + t_out
+                if dist.get(w, math.inf) > via:
+                    shortcuts.append((u, w, via, m_in + m_out))
+        return shortcuts
+
+    def priority(x: int, shortcuts) -> int:
+        degree = sum(1 for w in out[x] if not contracted[w]) + sum(1 for u in inn[x] if not contracted[u])
+        return 2 * (len(shortcuts) - degree) + deleted_neighbours[x] + level[x]
+
+    heap = [(priority(x, shortcuts_for(x)), x) for x in range(node_count)]
+    heapq.heapify(heap)
+
+    rank = np.zeros(node_count, dtype=np.int32)
+    up_fwd: List[List[Tuple[int, float, float]]] = [[] for _ in range(node_count)]
+    up_bwd: List[List[Tuple[int, float, float]]] = [[] for _ in range(node_count)]
+    order = 0
+    while heap:
+        _, x = heapq.heappop(heap)
+        if contracted[x]:
+            continue
+        shortcuts = shortcuts_for(x)
+        current = priority(x, shortcuts)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, x))
+            continue
+
+        for u, w, t, m in shortcuts:
+            if w not in out[u] or t < out[u][w][0]:
+                out[u][w] = (t, m)
+                inn[w][u] = (t, m)
+        for w, (t, m) in out[x].items():
+            if not contracted[w]:
+                up_fwd[x].append((w, t, m))
+                deleted_neighbours[w] += 1
+                level[w] = max(level[w], level[x] + 1)
+        for u, (t, m) in inn[x].items():
+            if not contracted[u]:
+                up_bwd[x].append((u, t, m))
+                deleted_neighbours[u] += 1
+                level[u] = max(level[u], level[x] + 1)
+        contracted[x] = True
+        rank[x] = order
+        order += 1
+
+    hierarchy = {"rank": rank}
+    for name, adjacency in (("up_fwd", up_fwd), ("up_bwd", up_bwd)):
+        hierarchy[name + "_ptr"] = np.cumsum([0] + [len(edges) for edges in adjacency]).astype(np.int64)
+        flat = [edge for edges in adjacency for edge in edges]
+        hierarchy[name + "_to"] = np.array([e[0] for e in flat], dtype=np.int32)
+        hierarchy[name + "_s"] = np.array([e[1] for e in flat], dtype=np.float64)
+        hierarchy[name + "_m"] = np.array([e[2] for e in flat], dtype=np.float64)
+    return hierarchy
+
+
+class SegmentGrid:
+    """Uniform grid over street segments for nearest-segment snapping."""
+
+    def __init__(self, network, cell_meters: float = SNAP_CELL_METERS):
+        lat0 = float(np.mean(network["node_lat"])) if len(network["node_lat"]) else 0.0
+        self.cell_meters = cell_meters
+        self.meters_per_deg_lat = KM_PER_DEGREE_LAT * 1000
+        self.meters_per_deg_lng = km_per_degree_lng(lat0) * 1000
+        self.x1 = network["seg_lng1"] * self.meters_per_deg_lng
+        self.y1 = network["seg_lat1"] * self.meters_per_deg_lat
+        self.dx = network["seg_lng2"] * self.meters_per_deg_lng - self.x1
+        self.dy = network["seg_lat2"] * self.meters_per_deg_lat - self.y1
+
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        min_cx = np.floor(np.minimum(self.x1, self.x1 + self.dx) / cell_meters).astype(np.int64)
+        max_cx = np.floor(np.maximum(self.x1, self.x1 + self.dx) / cell_meters).astype(np.int64)
+        min_cy = np.floor(np.minimum(self.y1, self.y1 + self.dy) / cell_meters).astype(np.int64)
+        max_cy = np.floor(np.maximum(self.y1, self.y1 + self.dy) / cell_meters).astype(np.int64)
+        for segment, (ax, bx, ay, by) in enumerate(zip(min_cx.tolist(), max_cx.tolist(), min_cy.tolist(), max_cy.tolist())):
+            for cx in range(ax, bx + 1):
+                for cy in range(ay, by + 1):
+                    cells.setdefault((cx, cy), []).append(segment)
+        self._cells = {cell: np.array(ids, dtype=np.int64) for cell, ids in cells.items()}
+
+    def nearest(self, latitude: float, longitude: float, max_meters: float) -> Optional[Tuple[int, float, float]]:
+        """(segment, position along it in 0..1, distance in meters) or None."""
+        px = longitude * self.meters_per_deg_lng
+        py = latitude * self.meters_per_deg_lat
+        cx, cy = int(px // self.cell_meters), int(py // self.cell_meters)
+        max_ring = max(1, math.ceil(max_meters / self.cell_meters))
+        ring = 1
+        while True:
+            ids = [
+                self._cells[(cx + i, cy + j)]
+                for i in range(-ring, ring + 1)
+                for j in range(-ring, ring + 1)
+                if (cx + i, cy + j) in self._cells
+            ]
+            if ids:
+                candidates = np.concatenate(ids)
+                dx, dy = self.dx[candidates], self.dy[candidates]
+                length_sq = np.maximum(dx * dx + dy * dy, 1e-9)
+                t = np.clip(((px - self.x1[candidates]) * dx + (py - self.y1[candidates]) * dy) / length_sq, 0.0, 1.0)
+                dist = np.hypot(self.x1[candidates] + t * dx - px, self.y1[candidates] + t * dy - py)
+                best = int(np.argmin(dist))
+                # Anything closer than the searched ring's inner edge is final
+                if dist[best] <= ring * self.cell_meters or ring >= max_ring:
+                    if dist[best] > max_meters:
+                        return None
+                    return int(candidates[best]), float(t[best]), float(dist[best])
+            elif ring >= max_ring:
+                return None
+            ring = max_ring if ring < max_ring else ring + 1
+
+
+class RoadRouter:
+    """Shortest-time routes over a contracted road network."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.node_count = len(arrays["node_lat"])
+        # Python lists: scalar access to numpy arrays is slow in the query loop
+        self._chain_u = arrays["chain_u"].tolist()
+        self._chain_v = arrays["chain_v"].tolist()
+        self._chain_len = arrays["chain_len_m"].tolist()
+        self._chain_time = arrays["chain_time_s"].tolist()
+        self._chain_fwd = arrays["chain_fwd"].tolist()
+        self._chain_bwd = arrays["chain_bwd"].tolist()
+        self._seg_chain = arrays["seg_chain"].tolist()
+        self._seg_off_m = arrays["seg_off_m"].tolist()
+        self._seg_off_s = arrays["seg_off_s"].tolist()
+        self._seg_len_m = arrays["seg_len_m"].tolist()
+        self._seg_time_s = arrays["seg_time_s"].tolist()
+        self._up_fwd = self._adjacency("up_fwd")
+        self._up_bwd = self._adjacency("up_bwd")
+        self.grid = SegmentGrid(arrays)
+
+    def _adjacency(self, name: str) -> List[List[Tuple[int, float, float]]]:
+        ptr = self.arrays[name + "_ptr"].tolist()
+        edges = list(zip(
+            self.arrays[name + "_to"].tolist(),
+            self.arrays[name + "_s"].tolist(),
+            self.arrays[name + "_m"].tolist(),
+        ))
+        return [edges[ptr[node]:ptr[node + 1]] for node in range(self.node_count)]
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadRouter":
+        start = time.perf_counter()
+        network = build_network(*parse_osm(path))
+        parsed = time.perf_counter()
+        hierarchy = contract_hierarchy(len(network["node_lat"]), *directed_edges(network))
+        logger.info(
+            "Road network: %d junctions, %d segments (parsed %.1fs, contracted %.1fs)",
+            len(network["node_lat"]), len(network["seg_chain"]),
+            parsed - start, time.perf_counter() - parsed,
+        )
+        return cls({**network, **hierarchy})
+
+    def save(self, path: str, source_stamp: Tuple[int, int]):
+        """Write the cache to a temporary file and rename it into place, so readers never see half of it."""
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as temp_file:
+                np.savez_compressed(
+                    temp_file,
+                    cache_version=np.array([ROUTING_CACHE_VERSION]),
+                    source_stamp=np.array(source_stamp, dtype=np.int64),
+                    **self.arrays,
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def _read_cache(cache_path: str, stamp: Tuple[int, int]) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays of a current cache file; None when missing, stale or unreadable."""
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path) as cached:
+                if (
+                    int(cached["cache_version"][0]) != ROUTING_CACHE_VERSION
+                    or tuple(cached["source_stamp"].tolist()) != stamp
+                ):
+                    return None
+                return {key: cached[key] for key in cached.files if key not in ("cache_version", "source_stamp")}
+        except Exception:
+            logger.warning("Unreadable routing cache %s, rebuilding it", cache_path, exc_info=True)
+            return None
+
+    @classmethod
+    def load_or_build(cls, osm_path: str) -> "RoadRouter":
+        """Preprocessed graph from the .npz cache, rebuilt when the extract changed."""
+        stat = os.stat(osm_path)
+        stamp = (stat.st_size, int(stat.st_mtime))
+        cache_path = osm_path + ".routing.npz"
+        arrays = cls._read_cache(cache_path, stamp)
+        if arrays is not None:
+            return cls(arrays)
+        router = cls.from_osm(osm_path)
+        try:
+            router.save(cache_path, stamp)
+        except OSError:
+            # Still routable; the next start just preprocesses again
+            logger.warning("Could not write routing cache %s", cache_path, exc_info=True)
+        return router
+
+    def snap(self, latitude: float, longitude: float, max_meters: float = ROUTING_SNAP_MAX_METERS):
+        """(chain, meters along it, seconds along it) of the nearest street point."""
+        hit = self.grid.nearest(latitude, longitude, max_meters)
+        if hit is None:
+            return None
+        segment, t, _ = hit
+        return (
+            self._seg_chain[segment],
+            self._seg_off_m[segment] + t * self._seg_len_m[segment],
+            self._seg_off_s[segment] + t * self._seg_time_s[segment],
+        )
+
+    def _query(self, sources, targets) -> Tuple[float, float]:
+        """Bidirectional upward search from seeded (node, seconds, meters) lists."""
+        times = ({}, {})
+        lengths = ({}, {})
+        heaps = ([], [])
+        for side, seeds in ((0, sources), (1, targets)):
+            for node, seconds, meters in seeds:
+                if seconds < times[side].get(node, math.inf):
+                    times[side][node] = seconds
+                    lengths[side][node] = meters
+                    heapq.heappush(heaps[side], (seconds, node))
+        graphs = (self._up_fwd, self._up_bwd)
+        best_s = best_m = math.inf
+        inf = math.inf
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while heaps[0] or heaps[1]:
+            # Expand the side with the smaller frontier key
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            heap = heaps[side]
+            seconds, node = heappop(heap)
+            if seconds >= best_s:
+                # Every remaining key on this side is worse too
+                heap.clear()
+                continue
+            side_times = times[side]
+            if seconds > side_times[node]:
+                continue
+            meters = lengths[side][node]
+            other = times[1 - side].get(node)
+            if other is not None and seconds + other < best_s:
+                best_s = seconds + other
+                best_m = meters + lengths[1 - side][node]
+            # Stall-on-demand: a higher node already reaches this one faster,
+            # so nothing found from here can be on a shortest path
+            stalled = False
+            for higher, edge_s, _ in graphs[1 - side][node]:
+                if side_times.get(higher, inf) + edge_s < seconds:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            side_lengths = lengths[side]
+            for neighbour, edge_s, edge_m in graphs[side][node]:
+                candidate = seconds + edge_s
+                if candidate < side_times.get(neighbour, inf):
+                    side_times[neighbour] = candidate
+                    side_lengths[neighbour] = meters + edge_m
+                    heappush(heap, (candidate, neighbour))
+        return best_s, best_m
+
+    def route(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float) -> Optional[Route]:
+        origin = self.snap(from_lat, from_lng)
+        destination = self.snap(to_lat, to_lng)
+        if origin is None or destination is None:
+            return None
+
+        chain_o, meters_o, seconds_o = origin
+        chain_d, meters_d, seconds_d = destination
+        best = (math.inf, math.inf)
+
+        # Both points on the same street stretch, in a drivable direction
+        if chain_o == chain_d:
+            if self._chain_fwd[chain_o] and meters_d >= meters_o:
+                best = (seconds_d - seconds_o, meters_d - meters_o)
+            elif self._chain_bwd[chain_o] and meters_d <= meters_o:
+                best = (seconds_o - seconds_d, meters_o - meters_d)
+
+        sources = []
+        if self._chain_fwd[chain_o]:
+            sources.append((self._chain_v[chain_o], self._chain_time[chain_o] - seconds_o, self._chain_len[chain_o] - meters_o))
+        if self._chain_bwd[chain_o]:
+            sources.append((self._chain_u[chain_o], seconds_o, meters_o))
+        targets = []
+        if self._chain_fwd[chain_d]:
+            targets.append((self._chain_u[chain_d], seconds_d, meters_d))
+        if self._chain_bwd[chain_d]:
+            targets.append((self._chain_v[chain_d], self._chain_time[chain_d] - seconds_d, self._chain_len[chain_d] - meters_d))
+
+        found = self._query(sources, targets)
+        if found[0] < best[0]:
+            best = found
+        if math.isinf(best[0]):
+            return None
+        return Route(distance_km=best[1] / 1000, duration_seconds=best[0])
+
+
+class RouteProvider:
+    """Road routes once the network is loaded; None means 'use the fallback'."""
+
+    def __init__(self, network_path: Optional[str] = ROAD_NETWORK_PATH):
+        self.network_path = network_path
+        self.router: Optional[RoadRouter] = None
+        self.state = "disabled" if not network_path else "pending"
+        self.routed = 0
+        self.fallbacks = 0
+        self.load_seconds = 0.0
+
+    async def load(self):
+        """Load (or preprocess) the network off the event loop; started at app startup."""
+        if not self.network_path:
+            return
+        self.state = "loading"
+        start = time.perf_counter()
+        try:
+            self.router = await asyncio.to_thread(RoadRouter.load_or_build, self.network_path)
+        except Exception:
+            self.state = "failed"
+            logger.exception("Could not load road network from %s", self.network_path)
+            return
+        self.load_seconds = round(time.perf_counter() - start, 2)
+        self.state = "ready"
+
+    def route(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float) -> Optional[Route]:
+        route = self.router.route(from_lat, from_lng, to_lat, to_lng) if self.router is not None else None
+        if route is None:
+            self.fallbacks += 1
+        else:
+            self.routed += 1
+        return route
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "junctions": self.router.node_count if self.router is not None else 0,
+            "load_seconds": self.load_seconds,
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+        }
+
+
+route_provider = RouteProvider()
@@ -0,0 +1,556 @@
+"""
+Live driver positions in shared memory, for pre-forked workers.
+
+A driver's `PUT /drivers/location` lands on one worker while a passenger's
+`search-drivers` may land on another, so with several workers each one's
+private FleetIndex only sees part of the fleet. SharedFleetTable keeps the
+same data in one `multiprocessing.shared_memory` block created before the
+fork, with the same interface as FleetIndex, so every worker reads the whole
+fleet straight from the mapped columns: no copies, no IPC round trip.
+
+Layout: fixed-size columns (structure of arrays) indexed by driver slot, plus
+an open-addressing hash index from driver id to slot. Slots are handed out in
+order, so periodic scans only cover `[0, used)`. A driver's slot keeps their
+offline state after they go offline, and is handed to a new driver once they
+have been offline for FLEET_RECLAIM_AFTER_SECONDS; size the table for the
+drivers seen within that long.
+
+Radius queries go through a per-process index of slots sorted by grid cell,
+so they only read the cells around the pickup. Writers append every driver
+that changes cell to a shared ring of movers; a query reads the movers since
+its index was built along with the cells, and the index is rebuilt once too
+many have piled up. Candidates are then checked against the live columns, so
+a slot listed under an old cell is never returned by mistake.
+
+Each slot has a sequence counter (seqlock). A writer makes it odd, writes
+the fields, then makes it even again; a reader copies the fields between two
+reads of the counter and retries rows where the counter was odd or moved.
+Writers take one of a few striped process-shared locks (two workers may get
+pings from the same driver); readers never lock. Store order is relied on as
+on x86-64, which is what we deploy on.
+"""
+
+import math
+import multiprocessing
+import os
+import time
+import zlib
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.fleet_index import (
+    DEFAULT_CELL_SIZE_DEG,
+    DEFAULT_STALE_AFTER_SECONDS,
+    DRIVER_EN_ROUTE,
+    DRIVER_IDLE,
+    DRIVER_IN_TRIP,
+    DRIVER_OFFLINE,
+    DriverPosition,
+)
+from services.geo import KM_PER_DEGREE_LAT, haversine_distance_array, km_per_degree_lng
+
+FLEET_SHARED_SLOTS = int(os.getenv("FLEET_SHARED_SLOTS", 16384))
+FLEET_WRITE_LOCKS = 16
+# Longer than drivers.ACTIVE_DRIVER_CACHE_SECONDS, so no worker still takes
+# pings from a driver whose offline state was forgotten
+FLEET_RECLAIM_AFTER_SECONDS = float(os.getenv("FLEET_RECLAIM_AFTER_SECONDS", 900))
+
+# Ring of slots that changed cell; each process rebuilds its cell index
+# after MOVERS_REBUILD of them, well before the ring wraps
+RECLAIM_SCAN_INTERVAL_SECONDS = 1.0
+
+MOVERS_SLOTS = 4096
+MOVERS_REBUILD = 256
+
+# Fits a uuid4 string, which is what user ids are
+DRIVER_ID_BYTES = 36
+
+# Driver state codes in the status column; a fresh slot has none yet (idle)
+STATUS_UNSET = 0
+STATUS_CODES = {DRIVER_OFFLINE: 1, DRIVER_IDLE: 2, DRIVER_EN_ROUTE: 3, DRIVER_IN_TRIP: 4}
+STATUS_NAMES = {code: state for state, code in STATUS_CODES.items()}
+STATUS_OFFLINE = STATUS_CODES[DRIVER_OFFLINE]
+STATUS_IDLE = STATUS_CODES[DRIVER_IDLE]
+
+NO_ZONE = -1
+NO_CELL = np.iinfo(np.int64).min
+EMPTY_INDEX = -1
+
+# Column name -> dtype; the header holds the used-slot and mover counters
+_HEADER_BYTES = 64
+_COLUMNS = (
+    ("seq", np.uint64),
+    ("latitude", np.float64),
+    ("longitude", np.float64),
+    ("updated_at", np.float64),  # last ping, or when the driver went offline
+    ("cell", np.int64),
+    ("zone", np.int16),
+    ("status", np.uint8),
+    ("driver_id", f"S{DRIVER_ID_BYTES}"),
+)
+
+
+def _layout(slots: int) -> Tuple[Dict[str, Tuple[int, np.dtype]], int, int, int]:
+    """Byte offset and dtype of every column, offsets of the hash index and movers ring, and total size."""
+    offsets = {}
+    offset = _HEADER_BYTES
+    for name, dtype in _COLUMNS:
+        dtype = np.dtype(dtype)
+        offsets[name] = (offset, dtype)
+        offset += dtype.itemsize * slots
+        offset = (offset + 63) // 64 * 64
+    index_offset = offset
+    movers_offset = index_offset + 4 * _index_size(slots)
+    return offsets, index_offset, movers_offset, movers_offset + 4 * MOVERS_SLOTS
+
+
+def _cell_key(i: int, j: int) -> int:
+    """Cells ordered by row, then column: each row of a bounding box is one key range."""
+    return (i << 32) + (j + (1 << 31))
+
+
+def _index_size(slots: int) -> int:
+    """Power of two at least twice the slot count, keeping probes short."""
+    return 1 << max(4, (2 * slots - 1).bit_length())
+
+
+class SharedFleetTable:
+    """FleetIndex-compatible fleet table in shared memory."""
+
+    def __init__(
+        self,
+        memory: shared_memory.SharedMemory,
+        slots: int,
+        zone_ids: Sequence[str],
+        insert_lock,
+        move_lock,
+        write_locks: Sequence,
+        owner: bool,
+        cell_size_deg: float = DEFAULT_CELL_SIZE_DEG,
+        stale_after_seconds: float = DEFAULT_STALE_AFTER_SECONDS,
+        reclaim_after_seconds: float = FLEET_RECLAIM_AFTER_SECONDS,
+    ):
+        self.memory = memory
+        self.slots = slots
+        self.zone_ids = list(zone_ids)
+        self.cell_size_deg = cell_size_deg
+        self.stale_after_seconds = stale_after_seconds
+        self.reclaim_after_seconds = reclaim_after_seconds
+        self._zone_codes = {zone_id: code for code, zone_id in enumerate(self.zone_ids)}
+        self._insert_lock = insert_lock
+        self._move_lock = move_lock
+        self._write_locks = list(write_locks)
+        self._creator_pid = os.getpid() if owner else None
+
+        offsets, index_offset, movers_offset, _ = _layout(slots)
+        buffer = memory.buf
+        self._used = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=0)
+        self._moves = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=8)
+        columns = {
+            name: np.ndarray((slots,), dtype=dtype, buffer=buffer, offset=offset)
+            for name, (offset, dtype) in offsets.items()
+        }
+        self._seq = columns["seq"]
+        self._latitude = columns["latitude"]
+        self._longitude = columns["longitude"]
+        self._updated_at = columns["updated_at"]
+        self._cell = columns["cell"]
+        self._zone = columns["zone"]
+        self._status = columns["status"]
+        self._driver_ids = columns["driver_id"]
+        self._index = np.ndarray((_index_size(slots),), dtype=np.int32, buffer=buffer, offset=index_offset)
+        self._movers = np.ndarray((MOVERS_SLOTS,), dtype=np.int32, buffer=buffer, offset=movers_offset)
+        # Typed memoryviews over the same bytes: storing one scalar through
+        # them is several times cheaper than through numpy
+        self._views = {
+            name: buffer[offset:offset + dtype.itemsize * slots].cast(dtype.char)
+            for name, (offset, dtype) in offsets.items()
+            if name != "driver_id"
+        }
+        self._index_mask = len(self._index) - 1
+        # Checked against the slot's driver id on use: slots can be reclaimed
+        self._slot_cache: Dict[str, int] = {}
+        # This process's slots sorted by cell, and the mover count it reflects
+        self._cell_slots = np.empty(0, dtype=np.int32)
+        self._cell_keys = np.empty(0, dtype=np.int64)
+        self._cell_index_moves = -1
+        self.torn_reads = 0
+        self.full_rejections = 0
+        self.reclaimed = 0
+        self._next_reclaim_scan = 0.0
+        self.cell_index_rebuilds = 0
+
+    @classmethod
+    def create(cls, slots: int = FLEET_SHARED_SLOTS, zone_ids: Sequence[str] = (), **kwargs) -> "SharedFleetTable":
+        """New zeroed table; create it before forking workers so they all map the same block."""
+        _, _, _, size = _layout(slots)
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        context = multiprocessing.get_context("fork")
+        table = cls(
+            memory,
+            slots,
+            zone_ids,
+            insert_lock=context.Lock(),
+            move_lock=context.Lock(),
+            write_locks=[context.Lock() for _ in range(FLEET_WRITE_LOCKS)],
+            owner=True,
+            **kwargs,
+        )
+        table._index[:] = EMPTY_INDEX
+        table._cell[:] = NO_CELL
+        return table
+
+    def close(self):
+        """Unmap the block; the creating process also removes it."""
+        owner = os.getpid() == self._creator_pid
+        # Views must go before the mapping can be closed
+        for view in self._views.values():
+            view.release()
+        self._views = {}
+        self._used = self._moves = self._seq = self._latitude = self._longitude = None
+        self._updated_at = self._cell = self._zone = self._status = self._driver_ids = None
+        self._index = self._movers = None
+        self.memory.close()
+        if owner:
+            self.memory.unlink()
+
+    # Slot lookup
+
+    @staticmethod
+    def _key(driver_id: str) -> bytes:
+        key = driver_id.encode()
+        if len(key) > DRIVER_ID_BYTES:
+            raise ValueError(f"driver id longer than {DRIVER_ID_BYTES} bytes: {driver_id!r}")
+        return key
+
+    def _find(self, key: bytes) -> Tuple[int, int]:
+        """(slot or EMPTY_INDEX, index position where the probe stopped)."""
+        index = self._index
+        position = zlib.crc32(key) & self._index_mask
+        while True:
+            slot = int(index[position])
+            if slot == EMPTY_INDEX or self._driver_ids[slot] == key:
+                return slot, position
+            position = (position + 1) & self._index_mask
+
+    def _unindex(self, position: int):
+        """Empty a hash index position, shifting later entries of the probe run back (no tombstones)."""
+        index = self._index
+        mask = self._index_mask
+        hole = position
+        probe = (hole + 1) & mask
+        while True:
+            slot = int(index[probe])
+            if slot == EMPTY_INDEX:
+                break
+            home = zlib.crc32(self._driver_ids[slot]) & mask
+            # Movable unless its home lies cyclically in (hole, probe]
+            if (probe - home) & mask >= (probe - hole) & mask:
+                index[hole] = slot
+                hole = probe
+            probe = (probe + 1) & mask
+        index[hole] = EMPTY_INDEX
+
+    def _reclaimable_slot(self) -> Optional[int]:
+        """A slot whose driver has been offline long enough to forget, if any."""
+        now = time.time()
+        if now < self._next_reclaim_scan:
+            return None
+        used = int(self._used[0])
+        candidates = np.flatnonzero(
+            (self._status[:used] == STATUS_OFFLINE) & (self._updated_at[:used] < now - self.reclaim_after_seconds)
+        )
+        if not len(candidates):
+            # O(fleet): don't repeat it for every new driver of a burst
+            self._next_reclaim_scan = now + RECLAIM_SCAN_INTERVAL_SECONDS
+            return None
+        return int(candidates[0])
+
+    def _allocate(self, key: bytes, position: int) -> Optional[int]:
+        """Slot for a new driver; call with the insert lock held and `position` from `_find(key)`."""
+        slot = self._reclaimable_slot()
+        if slot is not None:
+            _, old_position = self._find(self._driver_ids[slot])
+            self._unindex(old_position)
+            # The shift may have moved entries into the new key's probe run
+            _, position = self._find(key)
+            self._write(slot, (
+                ("latitude", 0.0),
+                ("longitude", 0.0),
+                ("updated_at", 0.0),
+                ("cell", NO_CELL),
+                ("zone", NO_ZONE),
+                ("status", STATUS_UNSET),
+            ))
+            self.reclaimed += 1
+        else:
+            slot = int(self._used[0])
+            if slot >= self.slots:
+                self.full_rejections += 1
+                return None
+            self._used[0] = slot + 1
+        self._driver_ids[slot] = key
+        # Published last: readers that find the index entry see the full key
+        self._index[position] = slot
+        return slot
+
+    def _slot(self, driver_id: str, create: bool = False) -> Optional[int]:
+        key = self._key(driver_id)
+        slot = self._slot_cache.get(driver_id)
+        if slot is not None and self._driver_ids[slot] == key:
+            return slot
+        slot, _ = self._find(key)
+        if slot == EMPTY_INDEX:
+            if not create:
+                return None
+            with self._insert_lock:
+                # Another worker may have added it since the unlocked probe
+                slot, position = self._find(key)
+                if slot == EMPTY_INDEX:
+                    slot = self._allocate(key, position)
+                    if slot is None:
+                        return None
+        if len(self._slot_cache) >= 2 * self.slots:
+            # Reclaimed drivers' entries would otherwise pile up
+            self._slot_cache.clear()
+        self._slot_cache[driver_id] = slot
+        return slot
+
+    # FleetIndex interface
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._status[:int(self._used[0])] >= STATUS_IDLE))
+
+    def __contains__(self, driver_id: str) -> bool:
+        slot = self._slot(driver_id)
+        return slot is not None and self._status[slot] >= STATUS_IDLE
+
+    def _cell_for(self, latitude: float, longitude: float):
+        return (
+            math.floor(latitude / self.cell_size_deg),
+            math.floor(longitude / self.cell_size_deg),
+        )
+
+    def _write(self, slot: int, fields):
+        """Store `(column name, value)` pairs as one seqlock-protected write."""
+        views = self._views
+        seq = views["seq"]
+        with self._write_locks[slot % len(self._write_locks)]:
+            seq[slot] += 1
+            for name, value in fields:
+                views[name][slot] = value
+            seq[slot] += 1
+
+    def update(
+        self,
+        driver_id: str,
+        latitude: float,
+        longitude: float,
+        timestamp: Optional[float] = None,
+        zone_id: Optional[str] = None,
+    ) -> Optional[DriverPosition]:
+        """Insert or move a driver. None for drivers who went offline, or if the table is full."""
+        updated_at = time.time() if timestamp is None else timestamp
+        slot = self._slot(driver_id, create=True)
+        if slot is None:
+            return None
+        cell = self._cell_for(latitude, longitude)
+        cell_key = _cell_key(*cell)
+        views = self._views
+        seq = views["seq"]
+        with self._write_locks[slot % len(self._write_locks)]:
+            # Read under the lock: another worker may be changing the state
+            status = views["status"][slot]
+            if status == STATUS_OFFLINE:
+                return None
+            moved = views["cell"][slot] != cell_key
+            seq[slot] += 1
+            views["latitude"][slot] = float(latitude)
+            views["longitude"][slot] = float(longitude)
+            views["updated_at"][slot] = float(updated_at)
+            views["cell"][slot] = cell_key
+            views["zone"][slot] = self._zone_codes.get(zone_id, NO_ZONE)
+            views["status"][slot] = status if status != STATUS_UNSET else STATUS_IDLE
+            seq[slot] += 1
+        if moved:
+            self._record_move(slot)
+        return DriverPosition(driver_id, latitude, longitude, updated_at, cell, zone_id)
+
+    def _record_move(self, slot: int):
+        """Tell every process's cell index that `slot` is in a new cell; after the cell is written."""
+        with self._move_lock:
+            moves = int(self._moves[0])
+            self._movers[moves % MOVERS_SLOTS] = slot
+            self._moves[0] = moves + 1
+
+    def remove(self, driver_id: str) -> bool:
+        """Mark a driver offline until set back online (the slot stays theirs)."""
+        slot = self._slot(driver_id, create=True)
+        if slot is None:
+            return False
+        was_online = self._status[slot] >= STATUS_IDLE
+        # Offline since now: the slot can be reclaimed once that is long ago
+        self._write(slot, (("status", STATUS_OFFLINE), ("updated_at", time.time())))
+        return bool(was_online)
+
+    def state(self, driver_id: str) -> str:
+        slot = self._slot(driver_id)
+        # One byte: always read whole, no sequence check needed
+        code = self._views["status"][slot] if slot is not None else STATUS_UNSET
+        return STATUS_NAMES.get(code, DRIVER_IDLE)
+
+    def set_state(self, driver_id: str, state: str):
+        if state == DRIVER_OFFLINE:
+            self.remove(driver_id)
+            return
+        slot = self._slot(driver_id, create=True)
+        if slot is not None:
+            self._write(slot, (("status", STATUS_CODES[state]),))
+
+    def _read(self, rows: np.ndarray):
+        """Consistent copies of (latitude, longitude, updated_at, zone, status) for `rows`."""
+        seq = self._seq
+        while True:
+            before = seq[rows]
+            values = (
+                self._latitude[rows],
+                self._longitude[rows],
+                self._updated_at[rows],
+                self._zone[rows],
+                self._status[rows],
+            )
+            torn = ((before & 1) != 0) | (seq[rows] != before)
+            if not torn.any():
+                return values
+            self.torn_reads += int(torn.sum())
+
+    def _positions(self, rows: np.ndarray, values) -> List[DriverPosition]:
+        latitudes, longitudes, updated_at, zones, _ = values
+        driver_ids = self._driver_ids[rows]
+        zone_ids = self.zone_ids
+        return [
+            DriverPosition(
+                driver_id.decode(),
+                latitude,
+                longitude,
+                timestamp,
+                self._cell_for(latitude, longitude),
+                zone_ids[zone] if zone != NO_ZONE else None,
+            )
+            for driver_id, latitude, longitude, timestamp, zone in zip(
+                driver_ids.tolist(), latitudes.tolist(), longitudes.tolist(), updated_at.tolist(), zones.tolist()
+            )
+        ]
+
+    def _live(self, rows: np.ndarray, values) -> np.ndarray:
+        """Mask of `rows` that are online and not stale."""
+        _, _, updated_at, _, status = values
+        return (status >= STATUS_IDLE) & (updated_at >= time.time() - self.stale_after_seconds)
+
+    def get(self, driver_id: str) -> Optional[DriverPosition]:
+        slot = self._slot(driver_id)
+        if slot is None:
+            return None
+        rows = np.array([slot])
+        values = self._read(rows)
+        # Offline, or a state was set before the first ping
+        if values[4][0] < STATUS_IDLE or values[2][0] == 0:
+            return None
+        return self._positions(rows, values)[0]
+
+    def live_positions(self) -> List[DriverPosition]:
+        """Every non-stale position. O(fleet), meant for periodic ticks."""
+        rows = np.arange(int(self._used[0]))
+        values = self._read(rows)
+        live = self._live(rows, values)
+        return self._positions(rows[live], tuple(column[live] for column in values))
+
+    def count_by_zone(self) -> Dict[str, int]:
+        """Online (non-stale) drivers per zone. O(fleet), meant for periodic ticks."""
+        rows = np.arange(int(self._used[0]))
+        values = self._read(rows)
+        zones = values[3][self._live(rows, values) & (values[3] != NO_ZONE)]
+        counts = np.bincount(zones, minlength=len(self.zone_ids))
+        return {self.zone_ids[code]: int(count) for code, count in enumerate(counts) if count}
+
+    def _rebuild_cell_index(self):
+        # Moves counted before the cells are read; later ones come from the ring
+        moves = int(self._moves[0])
+        used = int(self._used[0])
+        cells = self._cell[:used].copy()
+        order = np.argsort(cells, kind="stable")
+        self._cell_slots = order.astype(np.int32)
+        self._cell_keys = cells[order]
+        self._cell_index_moves = moves
+        self.cell_index_rebuilds += 1
+
+    def _rows_near(self, latitude: float, longitude: float, lat_span: float, lng_span: float) -> np.ndarray:
+        """Slots in the cells of a bounding box, plus drivers that moved since the index was built."""
+        moves = int(self._moves[0])
+        if moves - self._cell_index_moves > MOVERS_REBUILD or self._cell_index_moves < 0:
+            self._rebuild_cell_index()
+        min_i, min_j = self._cell_for(latitude - lat_span, longitude - lng_span)
+        max_i, max_j = self._cell_for(latitude + lat_span, longitude + lng_span)
+        rows = np.arange(min_i, max_i + 1)
+        starts = np.searchsorted(self._cell_keys, _cell_key(rows, min_j), side="left")
+        ends = np.searchsorted(self._cell_keys, _cell_key(rows, max_j), side="right")
+        rows = np.concatenate([self._cell_slots[start:end] for start, end in zip(starts.tolist(), ends.tolist())])
+        moves = int(self._moves[0])
+        if moves > self._cell_index_moves:
+            movers = self._movers[np.arange(self._cell_index_moves, moves) % MOVERS_SLOTS]
+            # A mover may also still be listed under its new cell
+            rows = np.unique(np.concatenate((rows, movers)))
+        return rows
+
+    def _around(self, latitude: float, longitude: float, radius_km: float):
+        """(positions, distances) of live drivers within `radius_km`, unsorted."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        lng_span = radius_km / max(km_per_degree_lng(latitude), 1e-6)
+        rows = self._rows_near(latitude, longitude, lat_span, lng_span)
+        values = self._read(rows)
+        distances = haversine_distance_array(latitude, longitude, values[0], values[1])
+        keep = self._live(rows, values) & (distances <= radius_km)
+        return rows[keep], tuple(column[keep] for column in values), distances[keep]
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[DriverPosition, float]]:
+        """Drivers within `radius_km` of a point, nearest first."""
+        rows, values, distances = self._around(latitude, longitude, radius_km)
+        order = np.argsort(distances, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        positions = self._positions(rows[order], tuple(column[order] for column in values))
+        return list(zip(positions, distances[order].tolist()))
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        max_radius_km: float = 15.0,
+    ) -> List[Tuple[DriverPosition, float]]:
+        """The `k` nearest drivers within `max_radius_km`, nearest first."""
+        if k <= 0:
+            return []
+        return self.within_radius(latitude, longitude, max_radius_km, limit=k)
+
+    def stats(self) -> Dict:
+        used = int(self._used[0])
+        return {
+            "backend": "shared_memory",
+            "slots": self.slots,
+            "used_slots": used,
+            "online": len(self),
+            "bytes": self.memory.size,
+            "torn_reads_retried": self.torn_reads,
+            "full_rejections": self.full_rejections,
+            "reclaimed": self.reclaimed,
+            "cell_index_rebuilds": self.cell_index_rebuilds,
+        }
@@ -0,0 +1,233 @@
+"""
+Surge counters and snapshots in shared memory, for pre-forked workers.
+
+Supply is sampled from the shared fleet table, so it covers the whole fleet.
+With a private SurgeEngine per worker, each one would weigh only the trip
+requests it happened to receive against that fleet, diluting pressure and
+surge N times, and would number its snapshots on its own. SharedSurgeEngine
+keeps the request and supply windows and the published snapshot in one
+`multiprocessing.shared_memory` block created before the fork, with the same
+interface as SurgeEngine.
+
+Every worker counts requests into the same window. Ticks fall on wall-clock
+boundaries: all workers wake together and the first one to take the lock
+computes and publishes the snapshot, the others see it was done and only
+pick up the new snapshot id. One process-shared lock guards the block; it is
+taken once per trip request and for a few hundred numbers per tick.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.surge import (
+    MINUTES_PER_TRIP,
+    SURGE_TICK_SECONDS,
+    SURGE_WINDOW_SECONDS,
+    SurgeSnapshot,
+    ZoneSurge,
+    compute_zone_surge,
+)
+from services.zones import SAN_JUAN_ZONES, Zone
+
+logger = logging.getLogger(__name__)
+
+DEMAND_LEVELS = ("low", "medium", "high")
+
+# Slots of the counters array
+TICKED_INTERVAL = 0  # last wall-clock tick number computed by any worker
+SNAPSHOT_ID = 1      # written last, so a changed id means a complete snapshot
+RING_HEAD = 2
+RING_FILLED = 3
+
+
+def _buckets(tick_seconds: float, window_seconds: float) -> int:
+    return max(1, int(round(window_seconds / tick_seconds)))
+
+
+def _layout(zones: int, buckets: int) -> Tuple[Dict[str, Tuple[int, np.dtype, Tuple[int, ...]]], int]:
+    """Byte offset, dtype and shape of every array, and the total size."""
+    arrays = (
+        ("counters", np.int64, (4,)),
+        ("created_at", np.float64, (1,)),
+        ("requests", np.int64, (zones, buckets)),
+        ("supply", np.int64, (zones, buckets)),
+        ("surge_factor", np.float64, (zones,)),
+        ("demand", np.uint8, (zones,)),
+        ("zone_requests", np.int64, (zones,)),
+        ("online_drivers", np.float64, (zones,)),
+    )
+    layout = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        dtype = np.dtype(dtype)
+        layout[name] = (offset, dtype, shape)
+        offset += dtype.itemsize * int(np.prod(shape))
+        offset = (offset + 63) // 64 * 64
+    return layout, offset
+
+
+class SharedSurgeEngine:
+    """SurgeEngine-compatible counters and snapshots in shared memory."""
+
+    def __init__(
+        self,
+        memory: shared_memory.SharedMemory,
+        lock,
+        owner: bool,
+        zones: List[Zone] = SAN_JUAN_ZONES,
+        tick_seconds: float = SURGE_TICK_SECONDS,
+        window_seconds: float = SURGE_WINDOW_SECONDS,
+        supply_source: Optional[Callable[[], Dict[str, int]]] = None,
+    ):
+        self.memory = memory
+        self.zones = zones
+        self.tick_seconds = tick_seconds
+        self.window_seconds = window_seconds
+        self.supply_source = supply_source
+        self.buckets = _buckets(tick_seconds, window_seconds)
+        self._zone_codes = {zone.id: code for code, zone in enumerate(zones)}
+        self._lock = lock
+        self._creator_pid = os.getpid() if owner else None
+
+        layout, _ = _layout(len(zones), self.buckets)
+        arrays = {
+            name: np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()
+        }
+        self._counters = arrays["counters"]
+        self._created_at = arrays["created_at"]
+        self._requests = arrays["requests"]
+        self._supply = arrays["supply"]
+        self._surge_factor = arrays["surge_factor"]
+        self._demand = arrays["demand"]
+        self._zone_requests = arrays["zone_requests"]
+        self._online_drivers = arrays["online_drivers"]
+        # This worker's copy of the latest snapshot, rebuilt when the id moves
+        self._latest = self._read_snapshot()
+
+    @classmethod
+    def create(
+        cls,
+        zones: List[Zone] = SAN_JUAN_ZONES,
+        tick_seconds: float = SURGE_TICK_SECONDS,
+        window_seconds: float = SURGE_WINDOW_SECONDS,
+        **kwargs,
+    ) -> "SharedSurgeEngine":
+        """New engine with empty windows; create it before forking workers so they all map the same block."""
+        _, size = _layout(len(zones), _buckets(tick_seconds, window_seconds))
+        memory = shared_memory.SharedMemory(create=True, size=size)  # zero-filled
+        engine = cls(
+            memory,
+            multiprocessing.get_context("fork").Lock(),
+            owner=True,
+            zones=zones,
+            tick_seconds=tick_seconds,
+            window_seconds=window_seconds,
+            **kwargs,
+        )
+        engine._counters[RING_FILLED] = 1  # as RingCounter: cold starts aren't diluted
+        engine._surge_factor[:] = 1.0
+        engine._created_at[0] = time.time()
+        engine._latest = engine._read_snapshot()
+        return engine
+
+    def close(self):
+        """Unmap the block; the creating process also removes it."""
+        owner = os.getpid() == self._creator_pid
+        self._counters = self._created_at = self._requests = self._supply = None
+        self._surge_factor = self._demand = self._zone_requests = self._online_drivers = None
+        self.memory.close()
+        if owner:
+            self.memory.unlink()
+
+    def _read_snapshot(self) -> SurgeSnapshot:
+        """Copy the published snapshot out of shared memory; call under the lock once workers run."""
+        zones = {
+            zone.id: ZoneSurge(
+                surge_factor=float(self._surge_factor[code]),
+                demand=DEMAND_LEVELS[self._demand[code]],
+                requests=int(self._zone_requests[code]),
+                online_drivers=float(self._online_drivers[code]),
+            )
+            for code, zone in enumerate(self.zones)
+        }
+        return SurgeSnapshot(id=int(self._counters[SNAPSHOT_ID]), created_at=float(self._created_at[0]), zones=zones)
+
+    @property
+    def snapshot(self) -> SurgeSnapshot:
+        """Latest snapshot published by any worker."""
+        if self._counters[SNAPSHOT_ID] != self._latest.id:
+            with self._lock:
+                self._latest = self._read_snapshot()
+        return self._latest
+
+    def record_request(self, zone_id: str):
+        """Count a trip request in a zone, for every worker's next tick."""
+        code = self._zone_codes.get(zone_id)
+        if code is not None:
+            with self._lock:
+                self._requests[code, self._counters[RING_HEAD]] += 1
+
+    def tick(self, interval: Optional[int] = None) -> SurgeSnapshot:
+        """Sample supply, recompute every zone's surge and publish a new snapshot.
+
+        With `interval` (the wall-clock tick number) only the first caller
+        for that interval ticks; the rest get the snapshot it published.
+        """
+        counters = self._counters
+        if interval is not None and counters[TICKED_INTERVAL] >= interval:
+            return self.snapshot
+        online = self.supply_source() if self.supply_source is not None else {}
+        trips_per_driver = (self.window_seconds / 60.0) / MINUTES_PER_TRIP
+
+        with self._lock:
+            if interval is not None:
+                if counters[TICKED_INTERVAL] >= interval:
+                    self._latest = self._read_snapshot()
+                    return self._latest
+                counters[TICKED_INTERVAL] = interval
+            head = int(counters[RING_HEAD])
+            filled = int(counters[RING_FILLED])
+            for code, zone in enumerate(self.zones):
+                self._supply[code, head] = online.get(zone.id, 0)
+                zone_surge = compute_zone_surge(
+                    zone,
+                    int(self._requests[code].sum()),
+                    float(self._supply[code].sum()) / filled,
+                    trips_per_driver,
+                )
+                self._surge_factor[code] = zone_surge.surge_factor
+                self._demand[code] = DEMAND_LEVELS.index(zone_surge.demand)
+                self._zone_requests[code] = zone_surge.requests
+                self._online_drivers[code] = zone_surge.online_drivers
+
+            head = (head + 1) % self.buckets
+            counters[RING_HEAD] = head
+            counters[RING_FILLED] = min(filled + 1, self.buckets)
+            self._requests[:, head] = 0
+            self._supply[:, head] = 0
+
+            self._created_at[0] = time.time()
+            counters[SNAPSHOT_ID] += 1
+            self._latest = self._read_snapshot()
+        return self._latest
+
+    async def run(self):
+        """Tick on wall-clock boundaries so workers wake together; one of them ticks."""
+        while True:
+            await asyncio.sleep(self.tick_seconds - time.time() % self.tick_seconds)
+            try:
+                # Rounded: a worker may wake a hair before the boundary
+                self.tick(interval=round(time.time() / self.tick_seconds))
+            except Exception:
+                logger.exception("Surge tick failed")
+
+    def stats(self) -> Dict:
+        return {"backend": "shared_memory", "snapshot_id": int(self._counters[SNAPSHOT_ID]), "bytes": self.memory.size}
@@ -0,0 +1,180 @@
+"""
+Supply/demand surge engine.
+
+Trip requests and online drivers are counted per zone in fixed-size ring
+buffers. A background tick recomputes capped surge factors and publishes an
+immutable snapshot, so fare quotes only read a dict. Quoted surge is kept
+for booking by the signed fare quote, not by looking old snapshots up.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from services.fleet_index import fleet_index
+from services.zones import SAN_JUAN_ZONES, Zone
+
+logger = logging.getLogger(__name__)
+
+SURGE_TICK_SECONDS = float(os.getenv("SURGE_TICK_SECONDS", 15))
+SURGE_WINDOW_SECONDS = float(os.getenv("SURGE_WINDOW_SECONDS", 600))
+SURGE_SHARED = os.getenv("SURGE_SHARED", "false").lower() == "true"
+
+# Mubitt caps surge at 1.5x (Uber goes up to 3x)
+MAX_SURGE_FACTOR = 1.5
+SURGE_STEP = 0.05
+
+# Surge added per unit of demand pressure above 1.0, before zone sensitivity
+SURGE_SLOPE = 0.5
+
+# A driver can serve about one trip every 20 minutes in Gran San Juan
+MINUTES_PER_TRIP = 20.0
+
+
+class RingCounter:
+    """Sliding window of per-tick counts with O(1) add and rotate."""
+
+    def __init__(self, buckets: int):
+        self._counts = [0] * buckets
+        self._head = 0
+        self._filled = 1  # buckets holding data so far, so cold starts aren't diluted
+        self.total = 0
+
+    def add(self, amount: int = 1):
+        self._counts[self._head] += amount
+        self.total += amount
+
+    def set(self, value: int):
+        """Overwrite the current bucket (gauges sampled once per tick)."""
+        self.total += value - self._counts[self._head]
+        self._counts[self._head] = value
+
+    def rotate(self):
+        """Advance to a fresh bucket, dropping the oldest one from the window."""
+        self._head = (self._head + 1) % len(self._counts)
+        self._filled = min(self._filled + 1, len(self._counts))
+        self.total -= self._counts[self._head]
+        self._counts[self._head] = 0
+
+    def mean(self) -> float:
+        return self.total / self._filled
+
+
+@dataclass(frozen=True)
+class ZoneSurge:
+    surge_factor: float
+    demand: str
+    requests: int
+    online_drivers: float
+
+
+@dataclass(frozen=True)
+class SurgeSnapshot:
+    id: int
+    created_at: float
+    zones: Dict[str, ZoneSurge]
+
+    def surge_factor(self, zone_id: str) -> float:
+        zone = self.zones.get(zone_id)
+        return zone.surge_factor if zone is not None else 1.0
+
+
+def _demand_level(pressure: float) -> str:
+    if pressure < 0.5:
+        return "low"
+    if pressure < 1.0:
+        return "medium"
+    return "high"
+
+
+def compute_zone_surge(zone: Zone, requests: int, drivers: float, trips_per_driver: float) -> ZoneSurge:
+    """Capped surge for a zone from its windowed requests and mean online drivers."""
+    pressure = requests / (max(drivers, 1.0) * trips_per_driver)
+    surge = 1.0 + zone.surge_sensitivity * SURGE_SLOPE * max(0.0, pressure - 1.0)
+    surge = min(MAX_SURGE_FACTOR, round(surge / SURGE_STEP) * SURGE_STEP)
+    return ZoneSurge(
+        surge_factor=round(surge, 2),
+        demand=_demand_level(pressure),
+        requests=requests,
+        online_drivers=round(drivers, 1),
+    )
+
+
+class SurgeEngine:
+    """Per-zone sliding-window counters and periodically published surge snapshots."""
+
+    def __init__(
+        self,
+        zones: List[Zone] = SAN_JUAN_ZONES,
+        tick_seconds: float = SURGE_TICK_SECONDS,
+        window_seconds: float = SURGE_WINDOW_SECONDS,
+        supply_source: Optional[Callable[[], Dict[str, int]]] = None,
+    ):
+        self.zones = zones
+        self.tick_seconds = tick_seconds
+        self.window_seconds = window_seconds
+        self.supply_source = supply_source
+        buckets = max(1, int(round(window_seconds / tick_seconds)))
+        self._requests = {zone.id: RingCounter(buckets) for zone in zones}
+        self._supply = {zone.id: RingCounter(buckets) for zone in zones}
+        self._latest = SurgeSnapshot(
+            id=0,
+            created_at=time.time(),
+            zones={zone.id: ZoneSurge(1.0, "low", 0, 0.0) for zone in zones},
+        )
+
+    @property
+    def snapshot(self) -> SurgeSnapshot:
+        """Latest published snapshot."""
+        return self._latest
+
+    def record_request(self, zone_id: str):
+        """Count a trip request in a zone. O(1)."""
+        counter = self._requests.get(zone_id)
+        if counter is not None:
+            counter.add()
+
+    def tick(self) -> SurgeSnapshot:
+        """Sample supply, recompute every zone's surge and publish a new snapshot."""
+        online = self.supply_source() if self.supply_source is not None else {}
+        trips_per_driver = (self.window_seconds / 60.0) / MINUTES_PER_TRIP
+
+        zones = {}
+        for zone in self.zones:
+            requests = self._requests[zone.id]
+            supply = self._supply[zone.id]
+            supply.set(online.get(zone.id, 0))
+            zones[zone.id] = compute_zone_surge(zone, requests.total, supply.mean(), trips_per_driver)
+            requests.rotate()
+            supply.rotate()
+
+        snapshot = SurgeSnapshot(id=self._latest.id + 1, created_at=time.time(), zones=zones)
+        self._latest = snapshot
+        return snapshot
+
+    async def run(self):
+        """Tick forever; started as a background task at app startup."""
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Surge tick failed")
+
+    def stats(self) -> Dict:
+        return {"backend": "process", "snapshot_id": self._latest.id}
+
+
+def _create_surge_engine():
+    if not SURGE_SHARED:
+        return SurgeEngine(supply_source=fleet_index.count_by_zone)
+    from services.shared_surge import SharedSurgeEngine
+    return SharedSurgeEngine.create(supply_source=fleet_index.count_by_zone)
+
+
+# Supply comes from the fleet table, so with forked workers demand and
+# snapshots must be shared too or every worker would dilute surge N times
+surge_engine = _create_surge_engine()
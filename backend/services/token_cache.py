@@ -0,0 +1,28 @@
+"""
+Cache of already-verified JWT access tokens.
+"""
+
+import hashlib
+from typing import Dict, Optional
+
+from services.ttl_cache import TTLCache
+
+
+class TokenCache(TTLCache):
+    """Bounded LRU of decoded principals keyed by token digest, valid until the token's `exp`."""
+
+    def __init__(self, max_size: int = 10000):
+        super().__init__(max_size)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Principal for a token verified earlier, or None on miss/expiry."""
+        principal = super().get(self._key(token))
+        return dict(principal) if principal is not None else None
+
+    def put(self, token: str, principal: Dict, expires_at: float):
+        """Remember a verified token until `expires_at` (Unix time)."""
+        super().put(self._key(token), dict(principal), expires_at)
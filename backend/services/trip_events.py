@@ -0,0 +1,110 @@
+"""
+In-process fan-out of trip events to WebSocket subscribers.
+
+Every connection gets its own bounded queue. Publishing never waits: when a
+slow phone's queue is full the oldest pending event is dropped, so one bad
+connection cannot hold up the others.
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+TRIP_EVENTS_QUEUE_SIZE = int(os.getenv("TRIP_EVENTS_QUEUE_SIZE", 32))
+
+
+class Subscription:
+    def __init__(self, trip_id: str, queue_size: int):
+        self.trip_id = trip_id
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, event: dict) -> bool:
+        """Enqueue without blocking; returns False if an older event had to be dropped."""
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait(event)
+        return not dropped
+
+
+class TripEventBroker:
+    def __init__(self, queue_size: int = TRIP_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # Driver (user id) -> trip they are serving, for routing position pings
+        self._driver_trips: Dict[str, str] = {}
+        self._trip_drivers: Dict[str, str] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, trip_id: str) -> Subscription:
+        subscription = Subscription(trip_id, self.queue_size)
+        self._subscribers.setdefault(trip_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.trip_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.trip_id]
+
+    def publish(self, trip_id: str, event: dict):
+        subscribers = self._subscribers.get(trip_id)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscription in subscribers:
+            if not subscription.offer(event):
+                self.dropped += 1
+
+    def publish_status(self, trip_id: str, status: str, **fields):
+        self.publish(trip_id, {
+            "type": "trip_status",
+            "trip_id": trip_id,
+            "status": status,
+            "at": datetime.utcnow().isoformat(),
+            **fields,
+        })
+
+    def publish_driver_position(self, driver_user_id: str, latitude: float, longitude: float):
+        """Forward a driver's ping to the trip they are serving, if any."""
+        trip_id = self._driver_trips.get(driver_user_id)
+        if trip_id is None:
+            return
+        self.publish(trip_id, {
+            "type": "driver_position",
+            "trip_id": trip_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "at": datetime.utcnow().isoformat(),
+        })
+
+    def assign_driver(self, trip_id: str, driver_user_id: str):
+        self._driver_trips[driver_user_id] = trip_id
+        self._trip_drivers[trip_id] = driver_user_id
+
+    def release_trip(self, trip_id: str):
+        driver_user_id = self._trip_drivers.pop(trip_id, None)
+        if driver_user_id is not None and self._driver_trips.get(driver_user_id) == trip_id:
+            del self._driver_trips[driver_user_id]
+
+    def trip_for_driver(self, driver_user_id: str) -> Optional[str]:
+        return self._driver_trips.get(driver_user_id)
+
+    def stats(self) -> Dict:
+        return {
+            "trips_watched": len(self._subscribers),
+            "connections": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "drivers_on_trip": len(self._driver_trips),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+trip_events = TripEventBroker()
@@ -0,0 +1,121 @@
+"""
+Trip lifecycle as a validated state machine.
+
+Every transition is a single conditional UPDATE (`WHERE status IN (...)`,
+plus driver conditions) that also bumps `Trip.version`. The row-level write
+is the only synchronization: when several drivers race to accept the same
+trip exactly one UPDATE matches, and everybody else learns it immediately
+from the row count instead of waiting on a lock.
+
+Claiming a trip also requires the driver to be online and free. The UPDATE
+checks both, and a unique partial index on (driver_id) over active trips
+stops one driver from winning two claims that race each other.
+"""
+
+from typing import Dict, Optional, Set
+
+from sqlalchemy import exists, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models.driver import Driver
+from models.trip import ACTIVE_STATUSES, Trip, TripStatus
+
+ALLOWED_TRANSITIONS: Dict[TripStatus, Set[TripStatus]] = {
+    TripStatus.PENDING: {TripStatus.DRIVER_ASSIGNED, TripStatus.CANCELLED},
+    TripStatus.DRIVER_ASSIGNED: {TripStatus.DRIVER_ARRIVING, TripStatus.IN_PROGRESS, TripStatus.CANCELLED},
+    TripStatus.DRIVER_ARRIVING: {TripStatus.IN_PROGRESS, TripStatus.CANCELLED},
+    TripStatus.IN_PROGRESS: {TripStatus.COMPLETED},
+    TripStatus.COMPLETED: set(),
+    TripStatus.CANCELLED: set(),
+}
+
+
+class TripNotFound(Exception):
+    pass
+
+
+class DriverUnavailable(Exception):
+    def __init__(self, driver_id: Optional[str]):
+        self.driver_id = driver_id
+        super().__init__("Driver is offline or already has an active trip")
+
+
+class TransitionConflict(Exception):
+    def __init__(self, current: Optional[TripStatus], target: TripStatus):
+        self.current = current
+        self.target = target
+        current_text = current.value if current is not None else "unknown"
+        super().__init__(f"Trip is {current_text}, cannot move to {target.value}")
+
+
+def sources_for(target: TripStatus) -> Set[TripStatus]:
+    """Statuses from which `target` can be reached."""
+    return {source for source, targets in ALLOWED_TRANSITIONS.items() if target in targets}
+
+
+async def transition_trip(
+    db: AsyncSession,
+    trip_id: str,
+    target: TripStatus,
+    *,
+    driver_id: Optional[str] = None,
+    assign_driver: bool = False,
+    passenger_id: Optional[str] = None,
+    **values,
+):
+    """Move a trip to `target` with one compare-and-set UPDATE.
+
+    `driver_id` restricts the update to the driver assigned to the trip, or,
+    with `assign_driver=True`, claims an unassigned trip for that driver if
+    they are online and have no other active trip. `passenger_id` restricts
+    it to the trip's passenger. Extra keyword arguments are written in the
+    same statement. The caller commits.
+    Returns the trip's driver id as written by the update, so callers never
+    act on a driver read before a concurrent accept.
+    Raises TripNotFound, TransitionConflict or DriverUnavailable when no row
+    matched.
+    """
+    sources = sources_for(target)
+    conditions = [Trip.id == trip_id, Trip.status.in_(sources)]
+    if assign_driver:
+        other_trip = aliased(Trip)
+        conditions += [
+            Trip.driver_id.is_(None),
+            exists().where(Driver.id == driver_id, Driver.is_active.is_(True)),
+            ~exists().where(other_trip.driver_id == driver_id, other_trip.status.in_(ACTIVE_STATUSES)),
+        ]
+        values["driver_id"] = driver_id
+    elif driver_id is not None:
+        conditions.append(Trip.driver_id == driver_id)
+    if passenger_id is not None:
+        conditions.append(Trip.passenger_id == passenger_id)
+
+    statement = (
+        update(Trip)
+        .where(*conditions)
+        .values(status=target, version=Trip.version + 1, **values)
+        .returning(Trip.driver_id)
+        .execution_options(synchronize_session=False)
+    )
+    if assign_driver:
+        try:
+            # Savepoint: a concurrent claim by the same driver only undoes this one
+            async with db.begin_nested():
+                result = await db.execute(statement)
+        except IntegrityError:
+            raise DriverUnavailable(driver_id)
+    else:
+        result = await db.execute(statement)
+    updated = result.first()
+    if updated is not None:
+        return updated.driver_id
+
+    # Lost the race (or the caller isn't the assigned driver): report why
+    current = await db.scalar(select(Trip.status).where(Trip.id == trip_id))
+    if current is None:
+        raise TripNotFound(trip_id)
+    if assign_driver and current in sources:
+        raise DriverUnavailable(driver_id)
+    raise TransitionConflict(current, target)
@@ -0,0 +1,258 @@
+"""
+San Juan pricing zones.
+
+Zones are department polygons (GeoJSON, data/san_juan_zones.geojson by
+default). A raster grid over their bounding box is precomputed: cells fully
+inside one polygon resolve by array lookup, and only cells crossed by a
+polygon edge run exact point-in-polygon tests. Points outside every polygon
+fall back to the nearest zone reference point, so every coordinate has a zone.
+
+The bundled polygons are simplified outlines; point ZONES_GEOJSON_PATH at
+surveyed department boundaries to replace them.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.geo import km_per_degree_lng, KM_PER_DEGREE_LAT
+
+ZONES_GEOJSON_PATH = os.getenv(
+    "ZONES_GEOJSON_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "san_juan_zones.geojson"),
+)
+
+# ~250 m cells: a few thousand cells cover Gran San Juan
+ZONE_GRID_CELL_DEG = 0.0025
+
+# Grid cell codes besides zone indices
+OUTSIDE = -1
+BOUNDARY = -2
+
+
+@dataclass(frozen=True)
+class Zone:
+    id: str
+    name: str
+    latitude: float  # reference point of the zone
+    longitude: float
+    surge_sensitivity: float  # how strongly demand pressure moves the surge factor
+
+
+SAN_JUAN_ZONES: List[Zone] = [
+    Zone("centro", "Centro", -31.5375, -68.5289, 1.0),
+    Zone("desamparados", "Desamparados", -31.5370, -68.5640, 0.8),
+    Zone("rivadavia", "Rivadavia", -31.5310, -68.5960, 0.9),
+    Zone("chimbas", "Chimbas", -31.4930, -68.5290, 0.7),
+    Zone("rawson", "Rawson", -31.5800, -68.5380, 0.8),
+    Zone("pocito", "Pocito", -31.6480, -68.5760, 0.6),
+]
+
+ZONES_BY_ID = {zone.id: zone for zone in SAN_JUAN_ZONES}
+
+_LNG_SCALE = km_per_degree_lng(-31.54) / KM_PER_DEGREE_LAT
+
+
+def points_in_polygon(lats: np.ndarray, lngs: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    """Even-odd rule for many points against one closed (lat, lng) ring."""
+    inside = np.zeros(len(lats), dtype=bool)
+    lat1, lng1 = ring[:-1, 0], ring[:-1, 1]
+    lat2, lng2 = ring[1:, 0], ring[1:, 1]
+    for a_lat, a_lng, b_lat, b_lng in zip(lat1, lng1, lat2, lng2):
+        if a_lat == b_lat:
+            continue
+        crosses = (a_lat > lats) != (b_lat > lats)
+        lng_at = a_lng + (lats - a_lat) * (b_lng - a_lng) / (b_lat - a_lat)
+        inside ^= crosses & (lngs < lng_at)
+    return inside
+
+
+def _point_in_ring(latitude: float, longitude: float, ring: List[List[float]]) -> bool:
+    inside = False
+    for (a_lat, a_lng), (b_lat, b_lng) in zip(ring, ring[1:]):
+        if (a_lat > latitude) != (b_lat > latitude):
+            if longitude < a_lng + (latitude - a_lat) * (b_lng - a_lng) / (b_lat - a_lat):
+                inside = not inside
+    return inside
+
+
+def load_zone_polygons(path: str) -> Dict[str, List[np.ndarray]]:
+    """Zone id -> closed (lat, lng) rings from a GeoJSON FeatureCollection."""
+    with open(path, encoding="utf-8") as source:
+        collection = json.load(source)
+    polygons: Dict[str, List[np.ndarray]] = {}
+    for feature in collection["features"]:
+        zone_id = feature["properties"]["zone_id"]
+        geometry = feature["geometry"]
+        shells = (
+            [geometry["coordinates"][0]] if geometry["type"] == "Polygon"
+            else [polygon[0] for polygon in geometry["coordinates"]]
+        )
+        for shell in shells:
+            ring = np.array([(lat, lng) for lng, lat in shell], dtype=np.float64)
+            if not np.array_equal(ring[0], ring[-1]):
+                ring = np.vstack([ring, ring[:1]])
+            polygons.setdefault(zone_id, []).append(ring)
+    return polygons
+
+
+class ZoneResolver:
+    """Coordinate -> zone id through a precomputed raster over the zone polygons."""
+
+    def __init__(
+        self,
+        zones: Sequence[Zone],
+        polygons: Dict[str, List[np.ndarray]],
+        cell_deg: float = ZONE_GRID_CELL_DEG,
+    ):
+        self.zones = list(zones)
+        self.zone_ids = np.array([zone.id for zone in self.zones], dtype=object)
+        self.cell_deg = cell_deg
+        self._ref_lat = np.array([zone.latitude for zone in self.zones])
+        self._ref_lng = np.array([zone.longitude for zone in self.zones])
+        # (zone index, ring) for every polygon of a known zone
+        index_by_id = {zone.id: i for i, zone in enumerate(self.zones)}
+        self._rings = [
+            (index_by_id[zone_id], ring)
+            for zone_id, rings in polygons.items() if zone_id in index_by_id
+            for ring in rings
+        ]
+        self._ring_lists = [ring.tolist() for _, ring in self._rings]
+        self._build_grid()
+
+    def _build_grid(self):
+        if not self._rings:
+            self.rows = self.cols = 0
+            self.grid = np.full((0, 0), OUTSIDE, dtype=np.int16)
+            self._cell_rings = {}
+            self.boundary_cells = 0
+            return
+
+        points = np.vstack([ring for _, ring in self._rings])
+        self.min_lat, self.min_lng = points.min(axis=0)
+        max_lat, max_lng = points.max(axis=0)
+        self.rows = int(np.ceil((max_lat - self.min_lat) / self.cell_deg)) + 1
+        self.cols = int(np.ceil((max_lng - self.min_lng) / self.cell_deg)) + 1
+
+        # Cells any polygon edge passes through (plus their neighbours, to be safe at corners)
+        boundary = np.zeros((self.rows, self.cols), dtype=bool)
+        self._cell_rings: Dict[Tuple[int, int], List[int]] = {}
+        for ring_index, (_, ring) in enumerate(self._rings):
+            touched = np.zeros((self.rows, self.cols), dtype=bool)
+            for (a_lat, a_lng), (b_lat, b_lng) in zip(ring[:-1], ring[1:]):
+                steps = int(max(abs(b_lat - a_lat), abs(b_lng - a_lng)) / (self.cell_deg / 4)) + 2
+                rows = ((np.linspace(a_lat, b_lat, steps) - self.min_lat) // self.cell_deg).astype(np.int64)
+                cols = ((np.linspace(a_lng, b_lng, steps) - self.min_lng) // self.cell_deg).astype(np.int64)
+                for d_row in (-1, 0, 1):
+                    for d_col in (-1, 0, 1):
+                        r = np.clip(rows + d_row, 0, self.rows - 1)
+                        c = np.clip(cols + d_col, 0, self.cols - 1)
+                        touched[r, c] = True
+            boundary |= touched
+            for row, col in zip(*np.nonzero(touched)):
+                self._cell_rings.setdefault((int(row), int(col)), []).append(ring_index)
+
+        # Interior cells take the zone containing their centre
+        centre_rows, centre_cols = np.mgrid[0:self.rows, 0:self.cols]
+        centre_lat = (self.min_lat + (centre_rows + 0.5) * self.cell_deg).ravel()
+        centre_lng = (self.min_lng + (centre_cols + 0.5) * self.cell_deg).ravel()
+        grid = np.full(self.rows * self.cols, OUTSIDE, dtype=np.int16)
+        for zone_index, ring in self._rings:
+            grid[points_in_polygon(centre_lat, centre_lng, ring)] = zone_index
+        grid = grid.reshape(self.rows, self.cols)
+        grid[boundary] = BOUNDARY
+        self.grid = grid
+        self.boundary_cells = int(boundary.sum())
+
+    def _cell_codes(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        codes = np.full(len(lats), OUTSIDE, dtype=np.int16)
+        if not self.rows:
+            return codes
+        rows = np.floor((lats - self.min_lat) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lngs - self.min_lng) / self.cell_deg).astype(np.int64)
+        in_grid = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        codes[in_grid] = self.grid[rows[in_grid], cols[in_grid]]
+        return codes
+
+    def _nearest_reference_one(self, latitude: float, longitude: float) -> str:
+        best = min(
+            self.zones,
+            key=lambda zone: (latitude - zone.latitude) ** 2 + ((longitude - zone.longitude) * _LNG_SCALE) ** 2,
+        )
+        return best.id
+
+    def _nearest_reference(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        d_lat = lats[:, None] - self._ref_lat[None, :]
+        d_lng = (lngs[:, None] - self._ref_lng[None, :]) * _LNG_SCALE
+        return np.argmin(d_lat * d_lat + d_lng * d_lng, axis=1)
+
+    def resolve_indices(self, lats: Sequence[float], lngs: Sequence[float]) -> np.ndarray:
+        """Zone index for each point; exact tests only where a cell is ambiguous."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        result = self._cell_codes(lats, lngs).astype(np.int64)
+
+        pending = np.flatnonzero(result == BOUNDARY)
+        if len(pending):
+            result[pending] = OUTSIDE
+            for zone_index, ring in self._rings:
+                unresolved = pending[result[pending] == OUTSIDE]
+                if not len(unresolved):
+                    break
+                inside = points_in_polygon(lats[unresolved], lngs[unresolved], ring)
+                result[unresolved[inside]] = zone_index
+
+        outside = np.flatnonzero(result == OUTSIDE)
+        if len(outside):
+            result[outside] = self._nearest_reference(lats[outside], lngs[outside])
+        return result
+
+    def resolve_many(self, lats: Sequence[float], lngs: Sequence[float]) -> List[str]:
+        """Zone ids for arrays of points."""
+        return self.zone_ids[self.resolve_indices(lats, lngs)].tolist()
+
+    def resolve(self, latitude: float, longitude: float) -> str:
+        """Zone id for one point; O(1) except on boundary cells."""
+        if self.rows:
+            row = int((latitude - self.min_lat) // self.cell_deg)
+            col = int((longitude - self.min_lng) // self.cell_deg)
+            if 0 <= row < self.rows and 0 <= col < self.cols:
+                code = int(self.grid[row, col])
+                if code >= 0:
+                    return self.zones[code].id
+                # Boundary cell: exact test against only the polygons crossing it
+                for ring_index in self._cell_rings.get((row, col), ()):
+                    zone_index, ring = self._rings[ring_index]
+                    if _point_in_ring(latitude, longitude, self._ring_lists[ring_index]):
+                        return self.zones[zone_index].id
+        return self._nearest_reference_one(latitude, longitude)
+
+    def stats(self) -> Dict:
+        return {
+            "zones": len(self.zones),
+            "polygons": len(self._rings),
+            "grid_cells": self.rows * self.cols,
+            "boundary_cells": self.boundary_cells,
+        }
+
+
+def _load_resolver(path: Optional[str]) -> ZoneResolver:
+    polygons = load_zone_polygons(path) if path and os.path.exists(path) else {}
+    return ZoneResolver(SAN_JUAN_ZONES, polygons)
+
+
+zone_resolver = _load_resolver(ZONES_GEOJSON_PATH)
+
+
+def resolve_zone(latitude: float, longitude: float) -> str:
+    """Id of the zone containing the coordinate (nearest zone if outside all)."""
+    return zone_resolver.resolve(latitude, longitude)
+
+
+def resolve_zones(latitudes: Sequence[float], longitudes: Sequence[float]) -> List[str]:
+    """Bulk resolve_zone."""
+    return zone_resolver.resolve_many(latitudes, longitudes)
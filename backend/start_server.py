@@ -2,43 +2,278 @@
 """
 Mubitt Backend Server Starter
 Starts the FastAPI server with proper configuration
+
+SERVER_MODE=development (default): one uvicorn process, auto-reload on by default.
+SERVER_MODE=production: the app is imported once, then WEB_CONCURRENCY worker
+processes (default: 1) are forked from it and share one listening socket.
+Raise it only with the per-worker state listed by the self-check in mind;
+batched dispatch refuses to start with more than one worker. Tables, the
+place index and the road network are loaded in the parent before forking, so
+workers inherit them copy-on-write instead of each building its own.
+SIGTERM/SIGINT are forwarded to the workers, which stop accepting and drain
+in-flight requests before running the shutdown hooks. A worker that dies
+after starting is replaced; one whose startup hooks fail stops the whole
+server with a non-zero exit.
 """
 
 import uvicorn
+import asyncio
+import gc
 import os
+import signal
 import sys
+import time
 from pathlib import Path
 
+# Production tuning
+KEEP_ALIVE_SECONDS = int(os.getenv("KEEP_ALIVE_SECONDS", 75))  # above typical load balancer idle timeouts
+BACKLOG = int(os.getenv("BACKLOG", 2048))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+LIMIT_CONCURRENCY = int(os.getenv("LIMIT_CONCURRENCY", 0))  # per worker, 503 beyond it; 0 = unlimited
+RESPAWN_DELAY_SECONDS = 1.0
+STARTUP_FAILED = 3  # worker exit code: never served, so a replacement would fail the same way
+
+def module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+def available_cpus():
+    """CPUs this process may run on (affinity mask, e.g. a container's cpuset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def kernel_somaxconn():
+    """Kernel cap on the listen backlog, when readable."""
+    try:
+        return int(Path("/proc/sys/net/core/somaxconn").read_text())
+    except (OSError, ValueError):
+        return None
+
+def print_self_check(production, workers, loop, http, access_log):
+    """Effective concurrency configuration, plus warnings for settings that fight each other."""
+    from api.auth import PASSWORD_HASH_WORKERS
+    from database import DB_MAX_OVERFLOW, DB_POOL_SIZE, IS_SQLITE
+    from services.dispatch import dispatcher
+    from services.fleet_index import fleet_index
+    from services.surge import surge_engine
+
+    cpus = available_cpus()
+    somaxconn = kernel_somaxconn()
+    print("🩺 Self-check")
+    print(f"🧵 Workers: {workers} (CPU cores: {cpus})")
+    print(f"⚙️  Event loop: {loop} | HTTP parser: {http}")
+    if production:
+        capped = f", kernel caps at {somaxconn}" if somaxconn is not None and somaxconn < BACKLOG else ""
+        print(f"📥 Backlog: {BACKLOG}{capped} | Keep-alive: {KEEP_ALIVE_SECONDS}s")
+        print(f"🛑 Graceful drain: {GRACEFUL_TIMEOUT}s | Per-worker limit: {LIMIT_CONCURRENCY or 'none'}")
+    print(f"🗄️  DB pool: {DB_POOL_SIZE}+{DB_MAX_OVERFLOW} per worker, up to {(DB_POOL_SIZE + DB_MAX_OVERFLOW) * workers} connections")
+    print(f"🔐 bcrypt threads: {PASSWORD_HASH_WORKERS} per worker, {PASSWORD_HASH_WORKERS * workers} total")
+    print(f"📝 Access log: {access_log}")
+    print(f"🚗 Fleet positions: {fleet_index.stats()['backend']}")
+    print(f"📈 Surge counters: {surge_engine.stats()['backend']}")
+
+    if production and loop != "uvloop":
+        print("⚠️  uvloop not installed, using the asyncio event loop")
+    if production and http != "httptools":
+        print("⚠️  httptools not installed, using the h11 parser")
+    if workers > 1 and IS_SQLITE:
+        print("⚠️  SQLite with several workers: writes are serialized on one file")
+    if workers > 1 and fleet_index.stats()["backend"] != "shared_memory":
+        print("⚠️  Fleet positions are per worker; search-drivers only sees pings sent to the same worker")
+    if workers > 1 and surge_engine.stats()["backend"] != "shared_memory":
+        print("⚠️  Surge demand is per worker; each worker only counts the trip requests it receives")
+    if workers > 1:
+        print("⚠️  Trip WebSockets are per worker; a status change handled by another worker is not pushed")
+        print("⚠️  Places learned from new trips are per worker until the next restart")
+    if workers > cpus:
+        print(f"⚠️  More workers than CPU cores ({workers} > {cpus})")
+
+def run_development(host, port, log_level):
+    reload = os.getenv("RELOAD", "true").lower() == "true"
+    print(f"🔄 Reload: {reload}")
+    print_self_check(False, 1, "auto", "auto", True)
+    print("=" * 50)
+
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        reload=reload,
+        log_level=log_level,
+        access_log=True
+    )
+
+async def preload():
+    """Create tables, index places and load the road network once before forking; leave no open connections."""
+    from database import engine, init_db
+    from main import load_places
+    from services.routing import route_provider
+
+    await init_db()
+    await load_places()
+    # Also the only process that builds and writes the routing cache
+    await route_provider.load()
+    await engine.dispose()
+
+def release_shared_memory():
+    """Remove the shared blocks created before the fork."""
+    from services.fleet_index import fleet_index
+    from services.surge import surge_engine
+
+    for table in (fleet_index, surge_engine):
+        if hasattr(table, "close"):
+            table.close()
+
+def serve_worker(config, sock):
+    """Body of a forked worker; never returns."""
+    # Parent's forwarding handlers; uvicorn installs its own when serving
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(config)
+    code = 0
+    try:
+        server.run(sockets=[sock])
+    except BaseException:
+        code = 1
+    if not server.started:
+        code = STARTUP_FAILED
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+def spawn_worker(config, sock):
+    # Otherwise pending output is printed again by the child
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        serve_worker(config, sock)
+    return pid
+
+def run_production(host, port, log_level):
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    loop = "uvloop" if module_available("uvloop") else "asyncio"
+    http = "httptools" if module_available("httptools") else "h11"
+    access_log = os.getenv("ACCESS_LOG", "false").lower() == "true"
+
+    # Workers must see each other's driver pings and trip requests; both
+    # tables are created at import, so before the fork
+    if workers > 1:
+        os.environ.setdefault("FLEET_SHARED", "true")
+        os.environ.setdefault("SURGE_SHARED", "true")
+
+    # Preload: import the app and load its data once so workers share it copy-on-write
+    from main import app
+    from services.dispatch import dispatcher
+    if workers > 1 and dispatcher.enabled:
+        print(f"❌ DISPATCH_MODE=batched needs WEB_CONCURRENCY=1; {workers} workers would race for the same trips")
+        release_shared_memory()
+        sys.exit(1)
+    asyncio.run(preload())
+
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        loop=loop,
+        http=http,
+        reload=False,
+        log_level=log_level,
+        access_log=access_log,
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        limit_concurrency=LIMIT_CONCURRENCY or None,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+    )
+    sock = config.bind_socket()
+    sock.set_inheritable(True)
+
+    print_self_check(True, workers, loop, http, access_log)
+    print("=" * 50)
+
+    # Objects loaded so far are never collected; keeps the collector from
+    # touching (and so copying) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+    stopping = False
+    failed = False
+
+    def forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for _ in range(workers):
+        children.add(spawn_worker(config, sock))
+    print(f"👷 Forked {workers} workers: {sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if code == STARTUP_FAILED:
+            # Exit so the platform's restart policy and health check see it
+            print(f"❌ Worker {pid} failed during startup, stopping the server")
+            failed = True
+            forward(signal.SIGTERM, None)
+            continue
+        print(f"💥 Worker {pid} exited with status {code}, replacing it")
+        time.sleep(RESPAWN_DELAY_SECONDS)
+        if not stopping:
+            children.add(spawn_worker(config, sock))
+
+    sock.close()
+    release_shared_memory()
+    if failed:
+        sys.exit(1)
+    print("\n🛑 All workers drained, server stopped")
+
 def main():
     # Add the backend directory to Python path
     backend_dir = Path(__file__).parent
     sys.path.insert(0, str(backend_dir))
-    
+
     # Configuration
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
-    reload = os.getenv("RELOAD", "true").lower() == "true"
+    production = os.getenv("SERVER_MODE", "development").lower() == "production"
     log_level = os.getenv("LOG_LEVEL", "info")
-    
+
     print(f"🚀 Starting Mubitt API Server...")
+    print(f"🏭 Mode: {'production' if production else 'development'}")
     print(f"📍 Host: {host}")
     print(f"🔌 Port: {port}")
-    print(f"🔄 Reload: {reload}")
     print(f"📊 Log Level: {log_level}")
     print(f"📚 Docs: http://{host}:{port}/docs")
     print(f"🔍 ReDoc: http://{host}:{port}/redoc")
     print(f"🏥 Health: http://{host}:{port}/health")
     print("=" * 50)
-    
+
     try:
-        uvicorn.run(
-            "main:app",
-            host=host,
-            port=port,
-            reload=reload,
-            log_level=log_level,
-            access_log=True
-        )
+        if production:
+            run_production(host, port, log_level)
+        else:
+            run_development(host, port, log_level)
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
@@ -46,4 +281,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()